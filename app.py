@@ -17,6 +17,8 @@ except ImportError:
     sanitize_input = lambda x: x
     validate_jwt_claims = lambda f: f
 from routes import register_blueprints
+from services.notifications import start_notification_evaluator
+from services.events import init_events
 import os
 import logging
 from logging.handlers import RotatingFileHandler
@@ -113,6 +115,9 @@ def create_app(config_class=Config):
     # Initialize Sentry if configured
     init_sentry(app)
 
+    # Deliver live dashboard events across workers
+    init_events(app)
+
     # Log startup
     app.logger.info('ERP System startup')
     
@@ -195,6 +200,8 @@ app = create_app()
 
 if __name__ == '__main__':
     app.logger.info('🌟 Starting ERP System directly...')
+    # Single process server, so the in-process evaluator can be used when enabled
+    start_notification_evaluator(app)
     app.run(
         host='0.0.0.0',
         port=int(os.environ.get('PORT', 8005)),
@@ -46,6 +46,12 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'uploads'
     ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx'}
+
+    # Background exports
+    EXPORT_FOLDER = os.environ.get('EXPORT_FOLDER') or 'exports'
+    EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS') or 2)
+    EXPORT_RETENTION_HOURS = 24
+    EXPORT_JOB_TIMEOUT_MINUTES = 120
     
     # Rate limiting
     RATELIMIT_STORAGE_URL = os.environ.get('REDIS_URL') or 'memory://'
@@ -67,6 +73,59 @@ class Config:
     # Cache Configuration
     CACHE_TYPE = 'simple'
     CACHE_DEFAULT_TIMEOUT = 300
+    DASHBOARD_CACHE_TIMEOUT = 60
+    PIVOT_CACHE_TIMEOUT = 300
+    PROFITABILITY_CACHE_TIMEOUT = 300
+    SUBSCRIPTION_ANALYTICS_CACHE_TIMEOUT = 3600
+    SUBSCRIPTION_COHORTS_CACHE_TIMEOUT = 86400
+    CASH_FLOW_CACHE_TIMEOUT = 300
+
+    # Currency reports are converted to, and how long each process keeps the exchange rates
+    BASE_CURRENCY = 'SAR'
+    EXCHANGE_RATE_CACHE_TIMEOUT = 300
+
+    # Days between an expense's approval and its reimbursement, used by the cash flow projection
+    EXPENSE_REIMBURSEMENT_DAYS = 14
+
+    # VAT percentage applied by billing runs
+    INVOICE_TAX_RATE = 15
+
+    # Subscription billing run (days after the billing date before overdue, overdue days before pausing,
+    # days before the billing date to remind, subscriptions per commit)
+    SUBSCRIPTION_GRACE_DAYS = 3
+    SUBSCRIPTION_PAUSE_AFTER_DAYS = 30
+    SUBSCRIPTION_REMINDER_DAYS = 7
+    SUBSCRIPTION_BILLING_CHUNK_SIZE = 5000
+
+    # Working time used for utilization (weekday numbers, Monday is 0)
+    WORKING_WEEKDAYS = (6, 0, 1, 2, 3)  # Sunday to Thursday
+    EMPLOYMENT_DAILY_HOURS = {
+        'full_time': 8,
+        'part_time': 4,
+        'contract': 8,
+        'intern': 4
+    }
+    
+    # Notifications (seconds between evaluator runs). The in-process evaluator is only started by
+    # `python app.py` when enabled; multi-worker deployments run scripts/evaluate_notifications.py --loop
+    NOTIFICATION_EVALUATOR_INTERVAL = int(os.environ.get('NOTIFICATION_EVALUATOR_INTERVAL') or 600)
+    NOTIFICATION_EVALUATOR_ENABLED = os.environ.get('NOTIFICATION_EVALUATOR_ENABLED', 'False').lower() == 'true'
+
+    # Live dashboard events (Redis relays events between workers, in-process when unset)
+    EVENTS_REDIS_URL = os.environ.get('EVENTS_REDIS_URL')
+    EVENTS_KEEPALIVE_SECONDS = 15
+    EVENTS_STREAM_TOKEN_SECONDS = 600  # Lifetime of a stream token, the stream closes when it expires
+    # Open streams per worker process. Each one holds a request thread for as long as the
+    # dashboard is open, so the default 0 turns streaming off (dashboards poll every 5 minutes
+    # and stop asking for stream tokens), which is what sync workers need. The drop in
+    # dashboard requests only happens with threaded or async workers, e.g.
+    # `gunicorn -k gthread --threads 32` or `-k gevent`, EVENTS_MAX_STREAMS set below the
+    # worker's concurrency and EVENTS_REDIS_URL set when there is more than one worker
+    EVENTS_MAX_STREAMS = int(os.environ.get('EVENTS_MAX_STREAMS') or 0)
+
+    # Concurrent dashboard queries (worker threads shared by all requests, seconds before partial results)
+    FANOUT_WORKERS = int(os.environ.get('FANOUT_WORKERS') or 4)
+    FANOUT_TIMEOUT_SECONDS = 5
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -74,6 +133,7 @@ class DevelopmentConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DEV_DATABASE_URL') or 'sqlite:///erp_dev.db'
     SQLALCHEMY_ECHO = True
     LOG_LEVEL = 'DEBUG'
+    EVENTS_MAX_STREAMS = 10  # The development server is threaded
 
 class ProductionConfig(Config):
     """Production configuration with enhanced security"""
@@ -143,6 +203,9 @@ class ProductionConfig(Config):
     CACHE_REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/1'
     CACHE_DEFAULT_TIMEOUT = 300
     CACHE_KEY_PREFIX = 'erp_cache:'
+
+    # Live dashboard events relayed through Redis
+    EVENTS_REDIS_URL = os.environ.get('EVENTS_REDIS_URL') or os.environ.get('REDIS_URL') or 'redis://localhost:6379/2'
     
     # Security Configuration
     BCRYPT_LOG_ROUNDS = 12  # Higher cost for production
@@ -154,6 +217,7 @@ class ProductionConfig(Config):
     ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx', 'xls', 'xlsx'}
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     UPLOAD_FOLDER = '/app/uploads'
+    EXPORT_FOLDER = os.environ.get('EXPORT_FOLDER') or '/app/exports'
     
     # Monitoring and Error Tracking
     SENTRY_DSN = os.environ.get('SENTRY_DSN')
@@ -7,6 +7,13 @@ from .timetrack import TimeTrack
 from .expense import Expense
 from .invoice import Invoice
 from .subscription import ClientSubscription, SubscriptionPayment
+from .export_job import ExportJob
+from .period_snapshot import PeriodSnapshot
+from .activity_event import ActivityEvent
+from .notification import Notification, NotificationCounter
+from .timetrack_daily import TimeTrackDaily
+from .number_sequence import NumberSequence
+from .exchange_rate import ExchangeRate
 
 __all__ = [
     'User',
@@ -18,5 +25,13 @@ __all__ = [
     'Expense',
     'Invoice',
     'ClientSubscription',
-    'SubscriptionPayment'
+    'SubscriptionPayment',
+    'ExportJob',
+    'PeriodSnapshot',
+    'ActivityEvent',
+    'Notification',
+    'NotificationCounter',
+    'TimeTrackDaily',
+    'NumberSequence',
+    'ExchangeRate'
 ] 
\ No newline at end of file
@@ -0,0 +1,45 @@
+from datetime import datetime
+from extensions import db
+
+class ActivityEvent(db.Model):
+    """Append-only feed of domain events shown as recent activities"""
+
+    __tablename__ = 'activity_events'
+    __table_args__ = (
+        db.Index('ix_activity_events_created_at_id', 'created_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Event
+    event_type = db.Column(db.String(50), nullable=False)  # project_created, subscription_created, payment_received, task_completed
+    entity_type = db.Column(db.String(50), nullable=False)  # project, subscription, payment, task
+    entity_id = db.Column(db.Integer, nullable=False)
+
+    # Denormalized text so the feed needs no joins
+    title = db.Column(db.String(300), nullable=False)
+    description = db.Column(db.String(500))
+    amount = db.Column(db.Numeric(12, 2))
+
+    # Foreign Keys
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        """Convert activity event to dictionary"""
+        return {
+            'id': self.id,
+            'type': self.event_type,
+            'entity_type': self.entity_type,
+            'entity_id': self.entity_id,
+            'title': self.title,
+            'description': self.description,
+            'amount': float(self.amount) if self.amount is not None else None,
+            'user_id': self.user_id,
+            'timestamp': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<ActivityEvent {self.event_type} {self.entity_type}:{self.entity_id}>'
@@ -1,5 +1,7 @@
 from datetime import datetime
 from extensions import db
+from sqlalchemy import case, and_, func
+from sqlalchemy.ext.hybrid import hybrid_property
 
 class Client(db.Model):
     """Client model for managing both company and individual clients"""
@@ -68,7 +70,7 @@ class Client(db.Model):
     # Relationships - commented out to avoid conflicts
     # Relationships are handled by other models' backref definitions
     
-    @property
+    @hybrid_property
     def display_name(self):
         """Get appropriate display name based on client type"""
         if self.client_type == 'individual':
@@ -78,6 +80,16 @@ class Client(db.Model):
         else:  # company
             return self.company_name or self.name
     
+    @display_name.expression
+    def display_name(cls):
+        """SQL version of display_name so reports can select it without loading clients"""
+        return case(
+            (and_(cls.client_type == 'individual', cls.first_name != '', cls.last_name != ''),
+             cls.first_name + ' ' + cls.last_name),
+            (cls.client_type == 'individual', cls.name),
+            else_=func.coalesce(func.nullif(cls.company_name, ''), cls.name)
+        )
+    
     @property
     def full_name(self):
         """Get full name for individuals or company name for companies"""
@@ -93,35 +105,46 @@ class Client(db.Model):
         """Check if client is a company"""
         return self.client_type == 'company'
     
+    # Figures loaded in bulk by services.client_aggregates.attach_client_aggregates
+    _aggregates = None
+    
+    def get_aggregates(self):
+        """Project, invoice, subscription and payment figures, loaded once per instance"""
+        if self._aggregates is None:
+            from services.client_aggregates import get_client_aggregates
+            self._aggregates = get_client_aggregates([self.id])[self.id]
+        return self._aggregates
+    
     @property
     def total_project_value(self):
         """Calculate total value of all projects for this client"""
-        # Return 0 for now to avoid database query issues
-        return 0
+        return self.get_aggregates()['total_project_value']
     
     @property
     def active_projects_count(self):
         """Count active projects for this client"""
-        # Return 0 for now to avoid relationship issues
-        return 0
+        return self.get_aggregates()['active_projects_count']
     
     @property
     def completed_projects_count(self):
         """Count completed projects for this client"""
-        # Return 0 for now to avoid relationship issues
-        return 0
+        return self.get_aggregates()['completed_projects_count']
     
     @property
     def outstanding_invoices(self):
         """Get unpaid invoices for this client"""
-        # Return empty list for now to avoid relationship issues
-        return []
+        from models.invoice import Invoice
+        from services.aging import RECEIVABLE_STATUSES
+        return Invoice.query.filter(
+            Invoice.client_id == self.id,
+            Invoice.status.in_(RECEIVABLE_STATUSES),
+            Invoice.total_amount > func.coalesce(Invoice.paid_amount, 0)
+        ).order_by(Invoice.due_date).all()
     
     @property
     def outstanding_amount(self):
         """Calculate total outstanding amount"""
-        # Return 0 for now to avoid calculation issues
-        return 0
+        return self.get_aggregates()['outstanding_amount']
     
     def get_project_history(self):
         """Get chronological list of projects"""
@@ -182,7 +205,10 @@ class Client(db.Model):
             # Timestamps
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'last_contact_date': self.last_contact_date.isoformat() if self.last_contact_date else None
+            'last_contact_date': self.last_contact_date.isoformat() if self.last_contact_date else None,
+            
+            # Figures, only when loaded in bulk
+            **({'summary': self._aggregates} if self._aggregates is not None else {})
         }
     
     def __repr__(self):
@@ -93,17 +93,9 @@ class Employee(db.Model):
     
     def get_total_hours_this_month(self):
         """Get total hours tracked this month"""
-        try:
-            from sqlalchemy import func, extract
-            from models.timetrack import TimeTrack
-            today = datetime.now()
-            return db.session.query(func.sum(TimeTrack.hours)).filter(
-                TimeTrack.employee_id == self.id,
-                extract('year', TimeTrack.date) == today.year,
-                extract('month', TimeTrack.date) == today.month
-            ).scalar() or 0
-        except:
-            return 0
+        from services.time_facts import get_employee_hours
+        today = datetime.now().date()
+        return get_employee_hours(self.id, today.replace(day=1), today)
     
     def to_dict(self):
         """Convert employee to dictionary"""
@@ -0,0 +1,36 @@
+from datetime import datetime
+from extensions import db
+
+class ExchangeRate(db.Model):
+    """Value of one unit of a currency in the base currency, from a date on"""
+
+    __tablename__ = 'exchange_rates'
+    __table_args__ = (
+        db.UniqueConstraint('currency', 'rate_date', name='uq_exchange_rates_currency_date'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    currency = db.Column(db.String(3), nullable=False)
+    rate_date = db.Column(db.Date, nullable=False)
+    rate = db.Column(db.Numeric(18, 8), nullable=False)  # Base currency per unit
+    source = db.Column(db.String(50))  # manual, bank, api
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """Convert exchange rate to dictionary"""
+        return {
+            'id': self.id,
+            'currency': self.currency,
+            'rate_date': self.rate_date.isoformat() if self.rate_date else None,
+            'rate': float(self.rate),
+            'source': self.source,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<ExchangeRate {self.currency} {self.rate_date} = {self.rate}>'
@@ -20,7 +20,7 @@ class Expense(db.Model):
     total_amount = db.Column(db.Numeric(12, 2))  # amount + tax
     
     # Date Information
-    expense_date = db.Column(db.Date, nullable=False)
+    expense_date = db.Column(db.Date, nullable=False, index=True)
     
     # Status and Approval
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected, reimbursed
@@ -34,9 +34,10 @@ class Expense(db.Model):
     receipt_file = db.Column(db.String(500))  # File path for receipt image/PDF
     
     # Foreign Keys
-    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'))
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), index=True)
     employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=False)
     approved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), index=True)  # Set when billed to the client
     
     # Approval Details
     approved_at = db.Column(db.DateTime)
@@ -107,6 +108,7 @@ class Expense(db.Model):
             'status': self.status,
             'is_reimbursable': self.is_reimbursable,
             'is_billable_to_client': self.is_billable_to_client,
+            'invoice_id': self.invoice_id,
             'receipt_number': self.receipt_number,
             'vendor': self.vendor,
             'payment_method': self.payment_method,
@@ -0,0 +1,79 @@
+from datetime import datetime
+import json
+from extensions import db
+
+class ExportJob(db.Model):
+    """Background report export job"""
+
+    __tablename__ = 'export_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Request
+    export_type = db.Column(db.String(50), nullable=False)  # financial, clients
+    params = db.Column(db.Text)  # JSON encoded export parameters
+    job_key = db.Column(db.String(64), nullable=False, index=True)  # Hash of type + params for de-duplication
+
+    # Progress
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, running, completed, failed, expired
+    processed_rows = db.Column(db.Integer, default=0)
+    total_rows = db.Column(db.Integer)
+    error_message = db.Column(db.Text)
+
+    # Result
+    file_path = db.Column(db.String(500))
+    file_name = db.Column(db.String(255))
+    file_size = db.Column(db.Integer)
+
+    # Foreign Keys
+    requested_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Heartbeat of running jobs
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime)
+
+    @property
+    def params_dict(self):
+        """Decoded export parameters"""
+        return json.loads(self.params) if self.params else {}
+
+    @property
+    def is_active(self):
+        """Check if the job is still waiting or running"""
+        return self.status in ['queued', 'running']
+
+    @property
+    def progress_percentage(self):
+        """Progress percentage when the total row count is known"""
+        if self.status == 'completed':
+            return 100
+        if not self.total_rows:
+            return None
+        return min(99, round((self.processed_rows or 0) / self.total_rows * 100))
+
+    def to_dict(self):
+        """Convert export job to dictionary"""
+        return {
+            'id': self.id,
+            'export_type': self.export_type,
+            'params': self.params_dict,
+            'status': self.status,
+            'processed_rows': self.processed_rows or 0,
+            'total_rows': self.total_rows,
+            'progress_percentage': self.progress_percentage,
+            'error_message': self.error_message,
+            'file_name': self.file_name,
+            'file_size': self.file_size,
+            'requested_by': self.requested_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
+    def __repr__(self):
+        return f'<ExportJob {self.id} {self.export_type} {self.status}>'
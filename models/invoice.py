@@ -5,6 +5,9 @@ class Invoice(db.Model):
     """Invoice model for billing clients"""
     
     __tablename__ = 'invoices'
+    __table_args__ = (
+        db.Index('ix_invoices_status_due_date', 'status', 'due_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -14,7 +17,7 @@ class Invoice(db.Model):
     description = db.Column(db.Text)
     
     # Dates
-    issue_date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date)
+    issue_date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date, index=True)
     due_date = db.Column(db.Date, nullable=False)
     paid_date = db.Column(db.Date)
     
@@ -104,14 +107,10 @@ class Invoice(db.Model):
     
     def generate_invoice_number(self):
         """Generate unique invoice number"""
-        current_year = datetime.now().year
+        from services.numbering import next_number
         
-        # Count invoices this year
-        count = db.session.query(Invoice).filter(
-            db.extract('year', Invoice.created_at) == current_year
-        ).count()
-        
-        self.invoice_number = f"INV-{current_year}-{count + 1:04d}"
+        year = self.issue_date.year if self.issue_date else datetime.now().year
+        self.invoice_number = next_number('invoice', year)
     
     def add_item(self, description, quantity=1, rate=0, amount=None):
         """Add item to invoice"""
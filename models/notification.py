@@ -0,0 +1,61 @@
+from datetime import datetime
+from extensions import db
+
+class Notification(db.Model):
+    """Notification in a user's inbox"""
+
+    __tablename__ = 'notifications'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'dedupe_key', name='uq_notification_user_dedupe_key'),
+        db.Index('ix_notifications_user_read_created', 'user_id', 'is_read', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+
+    # Content
+    type = db.Column(db.String(20), default='info')  # info, warning, success
+    title = db.Column(db.String(200), nullable=False)
+    message = db.Column(db.String(500))
+    action_url = db.Column(db.String(200))
+    priority = db.Column(db.String(20), default='low')  # low, medium, high
+
+    # Identifies the alert so the evaluator creates it only once per user
+    dedupe_key = db.Column(db.String(100), nullable=False, index=True)
+
+    # State
+    is_read = db.Column(db.Boolean, default=False, nullable=False)
+    read_at = db.Column(db.DateTime)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def to_dict(self):
+        """Convert notification to dictionary"""
+        return {
+            'id': self.id,
+            'type': self.type,
+            'title': self.title,
+            'message': self.message,
+            'action_url': self.action_url,
+            'priority': self.priority,
+            'is_read': self.is_read,
+            'read_at': self.read_at.isoformat() if self.read_at else None,
+            'timestamp': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<Notification {self.id} user={self.user_id} {self.dedupe_key}>'
+
+
+class NotificationCounter(db.Model):
+    """Unread notification count of a user, kept up to date incrementally"""
+
+    __tablename__ = 'notification_counters'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    unread_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<NotificationCounter user={self.user_id} unread={self.unread_count}>'
@@ -0,0 +1,24 @@
+from datetime import datetime
+from extensions import db
+
+# Year of sequences that do not restart every year
+NO_YEAR = 0
+
+class NumberSequence(db.Model):
+    """Last number handed out per document type and year"""
+
+    __tablename__ = 'number_sequences'
+    __table_args__ = (
+        db.UniqueConstraint('name', 'year', name='uq_number_sequences_name_year'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False)  # invoice, project_subscription, project_onetime, employee
+    year = db.Column(db.Integer, nullable=False, default=NO_YEAR)
+    last_value = db.Column(db.Integer, nullable=False, default=0)
+
+    # Timestamps
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<NumberSequence {self.name}/{self.year} = {self.last_value}>'
@@ -0,0 +1,87 @@
+from datetime import datetime
+from extensions import db
+
+class PeriodSnapshot(db.Model):
+    """Immutable financial figures of a closed month"""
+
+    __tablename__ = 'period_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('year', 'month', name='uq_period_snapshot_month'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+
+    # Figures for the month
+    total_revenue = db.Column(db.Numeric(12, 2), default=0)
+    subscription_revenue = db.Column(db.Numeric(12, 2), default=0)
+    project_revenue = db.Column(db.Numeric(12, 2), default=0)
+    total_expenses = db.Column(db.Numeric(12, 2), default=0)
+    net_profit = db.Column(db.Numeric(12, 2), default=0)
+    completed_projects = db.Column(db.Integer, default=0)
+
+    # Point-in-time figures as of closing
+    expected_revenue = db.Column(db.Numeric(12, 2), default=0)
+    active_subscriptions = db.Column(db.Integer, default=0)
+    pending_payments = db.Column(db.Numeric(12, 2), default=0)
+
+    # Changes to the month's source rows made after closing
+    has_late_edits = db.Column(db.Boolean, default=False)
+    late_edit_count = db.Column(db.Integer, default=0)
+    last_late_edit_at = db.Column(db.DateTime)
+
+    # Closing
+    closed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    closed_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+
+    @property
+    def period(self):
+        """Month as YYYY-MM"""
+        return f"{self.year}-{self.month:02d}"
+
+    def flag_late_edit(self):
+        """Record that a source row of this month changed after closing"""
+        self.has_late_edits = True
+        self.late_edit_count = (self.late_edit_count or 0) + 1
+        self.last_late_edit_at = datetime.utcnow()
+
+    def to_summary(self):
+        """Figures in the format of calculate_financial_summary"""
+        return {
+            'total_revenue': self.total_revenue,
+            'total_expenses': self.total_expenses,
+            'expected_revenue': self.expected_revenue,
+            'net_profit': self.net_profit,
+            'subscription_revenue': self.subscription_revenue,
+            'project_revenue': self.project_revenue,
+            'active_subscriptions': self.active_subscriptions,
+            'completed_projects': self.completed_projects,
+            'pending_payments': self.pending_payments
+        }
+
+    def to_dict(self):
+        """Convert snapshot to dictionary"""
+        return {
+            'id': self.id,
+            'period': self.period,
+            'year': self.year,
+            'month': self.month,
+            'total_revenue': float(self.total_revenue or 0),
+            'subscription_revenue': float(self.subscription_revenue or 0),
+            'project_revenue': float(self.project_revenue or 0),
+            'total_expenses': float(self.total_expenses or 0),
+            'net_profit': float(self.net_profit or 0),
+            'completed_projects': self.completed_projects or 0,
+            'expected_revenue': float(self.expected_revenue or 0),
+            'active_subscriptions': self.active_subscriptions or 0,
+            'pending_payments': float(self.pending_payments or 0),
+            'has_late_edits': self.has_late_edits,
+            'late_edit_count': self.late_edit_count or 0,
+            'last_late_edit_at': self.last_late_edit_at.isoformat() if self.last_late_edit_at else None,
+            'closed_at': self.closed_at.isoformat() if self.closed_at else None,
+            'closed_by': self.closed_by
+        }
+
+    def __repr__(self):
+        return f'<PeriodSnapshot {self.period}>'
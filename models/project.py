@@ -87,14 +87,14 @@ class Project(db.Model):
     def monthly_revenue(self):
         """Calculate monthly revenue for subscription projects"""
         if self.project_type == 'subscription' and self.monthly_price:
-            return float(self.monthly_price) * self.subscriber_count
+            return float(self.monthly_price * (self.subscriber_count or 0))
         return 0
     
     @property
     def remaining_amount(self):
         """Calculate remaining amount for one-time projects"""
         if self.project_type == 'onetime' and self.total_amount:
-            return float(self.total_amount) - float(self.paid_amount or 0)
+            return float(self.total_amount - (self.paid_amount or 0))
         return 0
     
     @property
@@ -161,25 +161,44 @@ class Project(db.Model):
             return False
         return self.actual_cost > self.budget
     
+    def _update_members(self, kind, **changes):
+        """Change the members of a saved project in SQL, without loading the collection"""
+        from services.memberships import update_members
+        result = update_members(self.id, kind, **changes)
+        db.session.expire(self, ['team_members', 'subscription_clients', 'subscriber_count', 'updated_at'])
+        return result
+    
     def add_team_member(self, employee):
         """Add team member to project"""
-        if employee not in self.team_members:
+        if self.id:
+            self._update_members('team', add=[employee.id])
+        elif employee not in self.team_members:
             self.team_members.append(employee)
     
     def remove_team_member(self, employee):
         """Remove team member from project"""
-        if employee in self.team_members:
+        if self.id:
+            self._update_members('team', remove=[employee.id])
+        elif employee in self.team_members:
             self.team_members.remove(employee)
     
     def add_subscription_client(self, client):
         """Add client to subscription project"""
-        if self.project_type == 'subscription' and client not in self.subscription_clients:
+        if self.project_type != 'subscription':
+            return
+        if self.id:
+            self._update_members('subscribers', add=[client.id])
+        elif client not in self.subscription_clients:
             self.subscription_clients.append(client)
             self.subscriber_count = len(self.subscription_clients)
     
     def remove_subscription_client(self, client):
         """Remove client from subscription project"""
-        if self.project_type == 'subscription' and client in self.subscription_clients:
+        if self.project_type != 'subscription':
+            return
+        if self.id:
+            self._update_members('subscribers', remove=[client.id])
+        elif client in self.subscription_clients:
             self.subscription_clients.remove(client)
             self.subscriber_count = len(self.subscription_clients)
     
@@ -198,9 +217,10 @@ class Project(db.Model):
     def generate_project_code(self):
         """Generate unique project code"""
         if not self.project_code:
-            prefix = 'SUB' if self.project_type == 'subscription' else 'ONE'
-            count = Project.query.filter_by(project_type=self.project_type).count() + 1
-            self.project_code = f"{prefix}-{count:04d}"
+            from services.numbering import next_number
+            
+            sequence = 'project_subscription' if self.project_type == 'subscription' else 'project_onetime'
+            self.project_code = next_number(sequence)
     
     def to_dict(self):
         """Convert project to dictionary with enhanced fields"""
@@ -2,10 +2,20 @@ from datetime import datetime, timedelta
 from extensions import db
 from sqlalchemy import func
 
+# Days between billing dates of each billing cycle
+CYCLE_DAYS = {
+    'monthly': 30,
+    'quarterly': 90,
+    'yearly': 365
+}
+
 class ClientSubscription(db.Model):
     """Client subscription model for managing monthly software subscriptions"""
     
     __tablename__ = 'client_subscriptions'
+    __table_args__ = (
+        db.Index('ix_client_subscriptions_status_next_billing', 'status', 'next_billing_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -40,6 +50,7 @@ class ClientSubscription(db.Model):
     last_payment_date = db.Column(db.Date)
     last_payment_amount = db.Column(db.Numeric(10, 2))
     failed_payment_count = db.Column(db.Integer, default=0)
+    overdue_since = db.Column(db.Date)  # Billing date that went unpaid, set by the billing run
     
     # Notes and metadata
     notes = db.Column(db.Text)
@@ -103,12 +114,8 @@ class ClientSubscription(db.Model):
     
     def calculate_next_billing_date(self):
         """Calculate next billing date based on billing cycle"""
-        if self.billing_cycle == 'monthly':
-            return self.next_billing_date + timedelta(days=30)
-        elif self.billing_cycle == 'quarterly':
-            return self.next_billing_date + timedelta(days=90)
-        elif self.billing_cycle == 'yearly':
-            return self.next_billing_date + timedelta(days=365)
+        if self.billing_cycle in CYCLE_DAYS:
+            return self.next_billing_date + timedelta(days=CYCLE_DAYS[self.billing_cycle])
         return self.next_billing_date
     
     def record_payment(self, amount, payment_date=None):
@@ -121,6 +128,9 @@ class ClientSubscription(db.Model):
         self.total_paid = (self.total_paid or 0) + amount
         self.failed_payment_count = 0
         self.next_billing_date = self.calculate_next_billing_date()
+        self.renewal_reminder_sent = False
+        if self.next_billing_date >= datetime.now().date():
+            self.overdue_since = None
         
         # Reset status if was paused due to failed payments
         if self.status == 'paused':
@@ -146,6 +156,8 @@ class ClientSubscription(db.Model):
         if self.status in ['cancelled', 'paused']:
             self.status = 'active'
             self.failed_payment_count = 0
+            self.overdue_since = None
+            self.renewal_reminder_sent = False
             # Set next billing date to today + billing cycle
             self.next_billing_date = datetime.now().date()
             self.next_billing_date = self.calculate_next_billing_date()
@@ -182,6 +194,8 @@ class ClientSubscription(db.Model):
             'last_payment_date': self.last_payment_date.isoformat() if self.last_payment_date else None,
             'last_payment_amount': float(self.last_payment_amount or 0),
             'failed_payment_count': self.failed_payment_count,
+            'overdue_since': self.overdue_since.isoformat() if self.overdue_since else None,
+            'renewal_reminder_sent': self.renewal_reminder_sent,
             'notes': self.notes,
             'contract_reference': self.contract_reference,
             'is_trial': self.is_trial,
@@ -210,7 +224,7 @@ class SubscriptionPayment(db.Model):
     # Payment details
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     currency = db.Column(db.String(3), default='SAR')
-    payment_date = db.Column(db.Date, nullable=False)
+    payment_date = db.Column(db.Date, nullable=False, index=True)
     payment_method = db.Column(db.String(50))
     
     # Status and references
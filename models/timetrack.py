@@ -9,7 +9,7 @@ class TimeTrack(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     
     # Time Details
-    date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date)
+    date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date, index=True)
     start_time = db.Column(db.Time)
     end_time = db.Column(db.Time)
     hours = db.Column(db.Float, nullable=False)  # Total hours worked
@@ -29,8 +29,9 @@ class TimeTrack(db.Model):
     # Foreign Keys
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'))
-    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False, index=True)
     task_id = db.Column(db.Integer, db.ForeignKey('tasks.id'))
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), index=True)  # Set when billed
     
     # Approval
     approved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -126,6 +127,7 @@ class TimeTrack(db.Model):
             'project_name': self.project.name if self.project else None,
             'task_id': self.task_id,
             'task_title': self.task.title if self.task else None,
+            'invoice_id': self.invoice_id,
             'approved_by': self.approved_by,
             'approver_name': self.approver.full_name if self.approver else None,
             'approved_at': self.approved_at.isoformat() if self.approved_at else None,
@@ -0,0 +1,41 @@
+from datetime import datetime
+from extensions import db
+
+# Stored instead of NULL for entries without an employee or task, so the
+# unique key also deduplicates those rows
+NO_ID = 0
+
+class TimeTrackDaily(db.Model):
+    """Hours logged per employee, project, task and day, kept up to date from time_tracks"""
+
+    __tablename__ = 'time_track_daily'
+    __table_args__ = (
+        db.UniqueConstraint('date', 'employee_id', 'project_id', 'task_id', name='uq_time_track_daily_key'),
+        db.Index('ix_time_track_daily_employee_date', 'employee_id', 'date'),
+        db.Index('ix_time_track_daily_project_date', 'project_id', 'date'),
+        # Covers the per employee and day sums of the utilization report
+        db.Index('ix_time_track_daily_date_employee_hours', 'date', 'employee_id', 'billable_hours', 'non_billable_hours'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Grain (employee_id and task_id are NO_ID when the entries have none)
+    date = db.Column(db.Date, nullable=False)
+    employee_id = db.Column(db.Integer, nullable=False, default=NO_ID)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
+    task_id = db.Column(db.Integer, nullable=False, default=NO_ID)
+
+    # Facts
+    billable_hours = db.Column(db.Float, nullable=False, default=0)
+    non_billable_hours = db.Column(db.Float, nullable=False, default=0)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+
+    # Timestamps
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def total_hours(self):
+        return (self.billable_hours or 0) + (self.non_billable_hours or 0)
+
+    def __repr__(self):
+        return f'<TimeTrackDaily {self.date} employee={self.employee_id} project={self.project_id}>'
@@ -3,6 +3,11 @@ from flask_jwt_extended import jwt_required
 from datetime import datetime
 from extensions import db
 from models.client import Client
+from sqlalchemy import select, func, case, and_
+from models.project import Project
+from models.subscription import ClientSubscription, SubscriptionPayment
+from services.client_aggregates import attach_client_aggregates
+from services.aging import compute_aging, get_aging_invoices
 
 clients_bp = Blueprint('clients', __name__)
 
@@ -56,6 +61,9 @@ def get_clients():
         
         clients = query.order_by(Client.created_at.desc()).all()
         
+        # Project, invoice and subscription figures of all the clients in a few grouped queries
+        attach_client_aggregates(clients)
+        
         current_app.logger.info(f'✅ تم جلب {len(clients)} عميل')
         
         return jsonify({
@@ -92,6 +100,101 @@ def get_client(client_id):
             'message': 'العميل غير موجود'
         }), 404
 
+@clients_bp.route('/<int:client_id>/overview', methods=['GET'])
+@jwt_required()
+def get_client_overview(client_id):
+    """Client with its figures, projects, subscriptions, receivables and recent payments"""
+    try:
+        client = Client.query.get(client_id)
+        if not client:
+            return jsonify({
+                'success': False,
+                'message': 'العميل غير موجود'
+            }), 404
+        
+        attach_client_aggregates([client])
+        
+        projects = db.session.execute(
+            select(
+                Project.id, Project.name, Project.project_code, Project.project_type, Project.status,
+                Project.start_date, Project.end_date, Project.total_amount, Project.paid_amount
+            )
+            .where(Project.client_id == client_id)
+            .order_by(Project.created_at.desc())
+            .limit(50)
+        ).all()
+        
+        subscriptions = db.session.execute(
+            select(
+                ClientSubscription.id, ClientSubscription.project_id, ClientSubscription.subscription_plan,
+                ClientSubscription.monthly_price, ClientSubscription.currency, ClientSubscription.status,
+                ClientSubscription.billing_cycle, ClientSubscription.next_billing_date
+            )
+            .where(ClientSubscription.client_id == client_id)
+            .order_by(ClientSubscription.start_date.desc())
+        ).all()
+        
+        payments = db.session.execute(
+            select(
+                SubscriptionPayment.id, SubscriptionPayment.subscription_id, SubscriptionPayment.amount,
+                SubscriptionPayment.currency, SubscriptionPayment.payment_date, SubscriptionPayment.status
+            )
+            .join(ClientSubscription, ClientSubscription.id == SubscriptionPayment.subscription_id)
+            .where(ClientSubscription.client_id == client_id)
+            .order_by(SubscriptionPayment.payment_date.desc(), SubscriptionPayment.id.desc())
+            .limit(10)
+        ).all()
+        
+        aging = compute_aging(client_id=client_id)
+        open_invoices, invoices_paginated = get_aging_invoices(client_id=client_id, per_page=20)
+        
+        return jsonify({
+            'success': True,
+            'client': client.to_dict(),
+            'projects': [{
+                'id': project.id,
+                'name': project.name,
+                'project_code': project.project_code,
+                'project_type': project.project_type,
+                'status': project.status,
+                'start_date': project.start_date.isoformat() if project.start_date else None,
+                'end_date': project.end_date.isoformat() if project.end_date else None,
+                'total_amount': float(project.total_amount) if project.total_amount else None,
+                'paid_amount': float(project.paid_amount or 0)
+            } for project in projects],
+            'subscriptions': [{
+                'id': subscription.id,
+                'project_id': subscription.project_id,
+                'subscription_plan': subscription.subscription_plan,
+                'monthly_price': float(subscription.monthly_price),
+                'currency': subscription.currency,
+                'status': subscription.status,
+                'billing_cycle': subscription.billing_cycle,
+                'next_billing_date': subscription.next_billing_date.isoformat() if subscription.next_billing_date else None
+            } for subscription in subscriptions],
+            'recent_payments': [{
+                'id': payment.id,
+                'subscription_id': payment.subscription_id,
+                'amount': float(payment.amount),
+                'currency': payment.currency,
+                'payment_date': payment.payment_date.isoformat(),
+                'status': payment.status
+            } for payment in payments],
+            'receivables': {
+                'totals': aging['totals'],
+                'base_totals': aging['base_totals'],
+                'open_invoices': open_invoices,
+                'open_invoices_total': invoices_paginated.total
+            }
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"💥 خطأ في جلب ملخص العميل {client_id}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في جلب ملخص العميل'
+        }), 500
+
 @clients_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_client():
@@ -356,23 +459,25 @@ def delete_client(client_id):
         'contact_admin': 'يرجى الاتصال بالمسؤول إذا كنت تحتاج لحذف هذا العميل'
     }), 422  # Unprocessable Entity
 
+def get_client_counts():
+    """Client counters by status and type in one query"""
+    active = Client.status == 'active'
+    counts = db.session.execute(select(
+        func.count(case((active, 1))).label('total_clients'),
+        func.count(case((and_(active, Client.client_type == 'company'), 1))).label('company_clients'),
+        func.count(case((and_(active, Client.client_type == 'individual'), 1))).label('individual_clients'),
+        func.count(case((Client.status == 'inactive', 1))).label('inactive_clients')
+    )).one()
+    return counts._asdict()
+
 @clients_bp.route('/statistics', methods=['GET'])
 @jwt_required()
 def get_client_statistics():
     """Get client statistics (with authentication)"""
     try:
-        total_clients = Client.query.filter_by(status='active').count()
-        company_clients = Client.query.filter_by(status='active', client_type='company').count()
-        individual_clients = Client.query.filter_by(status='active', client_type='individual').count()
-        
         return jsonify({
             'success': True,
-            'statistics': {
-                'total_clients': total_clients,
-                'company_clients': company_clients,
-                'individual_clients': individual_clients,
-                'inactive_clients': Client.query.filter_by(status='inactive').count()
-            }
+            'statistics': get_client_counts()
         })
         
     except Exception as e:
@@ -386,18 +491,9 @@ def get_client_statistics():
 def get_client_stats():
     """Get client statistics"""
     try:
-        total_clients = Client.query.filter_by(status='active').count()
-        company_clients = Client.query.filter_by(status='active', client_type='company').count()
-        individual_clients = Client.query.filter_by(status='active', client_type='individual').count()
-        
         return jsonify({
             'success': True,
-            'statistics': {
-                'total_clients': total_clients,
-                'company_clients': company_clients,
-                'individual_clients': individual_clients,
-                'inactive_clients': Client.query.filter_by(status='inactive').count()
-            }
+            'statistics': get_client_counts()
         })
         
     except Exception as e:
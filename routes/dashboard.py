@@ -1,9 +1,18 @@
-from flask import Blueprint, request, jsonify, current_app, render_template
+from flask import Blueprint, request, jsonify, current_app, render_template, Response
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime, date, timedelta
-from sqlalchemy import func, extract, and_
+from datetime import datetime, date
+from sqlalchemy import select, func, case, extract, and_
 from extensions import db
-from models import Project, Client, ClientSubscription, SubscriptionPayment, Employee, Task
+from models import Project, Client, ClientSubscription, SubscriptionPayment, Employee, Task, User
+from services.dashboard import get_dashboard_summary
+from services.activity import get_activity_feed
+from services.notifications import get_inbox, get_unread_count, mark_read
+from services.ledger import InvalidCursor
+from services.events import broker, stream_events, create_stream_token, read_stream_token, InvalidStreamToken
+from services.fanout import run_queries, scalar, one, rows
+from services.subscription_analytics import current_mrr_groups
+from services.money import exact_sum, to_major
+from services.exchange_rates import convert_groups, rate_day, base_currency
 import traceback
 
 dashboard_bp = Blueprint('dashboard', __name__)
@@ -19,51 +28,65 @@ def dashboard_page():
 def get_dashboard_statistics():
     """جلب إحصائيات لوحة التحكم الشاملة"""
     try:
-        # إحصائيات المشاريع
-        total_projects = Project.query.count()
-        subscription_projects = Project.query.filter_by(project_type='subscription').count()
-        onetime_projects = Project.query.filter_by(project_type='onetime').count()
-        active_projects = Project.query.filter_by(status='active').count()
-        completed_projects = Project.query.filter_by(status='completed').count()
-        
-        # إحصائيات العملاء
-        total_clients = Client.query.count()
-        active_subscriptions = ClientSubscription.query.filter_by(status='active').count()
-        
-        # حساب العملاء النشطين (لديهم اشتراكات فعالة)
-        active_clients = db.session.query(Client).join(
-            ClientSubscription, Client.id == ClientSubscription.client_id
-        ).filter(ClientSubscription.status == 'active').distinct().count()
-        
-        # الإيرادات الشهرية من الاشتراكات
-        monthly_revenue = db.session.query(
-            func.sum(ClientSubscription.monthly_amount)
-        ).filter(ClientSubscription.status == 'active').scalar() or 0
-        
-        # إجمالي إيرادات الاشتراكات
-        subscription_revenue = db.session.query(
-            func.sum(SubscriptionPayment.amount)
-        ).filter(SubscriptionPayment.status == 'paid').scalar() or 0
-        
+        today = datetime.now().date()
+        # تحويل المدفوعات إلى العملة الأساسية حسب العملة وتاريخ الدفع
+        payment_rate_day = rate_day(SubscriptionPayment.currency, SubscriptionPayment.payment_date)
+
+        # استعلامات مستقلة تنفذ بالتوازي، كل منها على اتصال منفصل
+        results, missing = run_queries({
+            'projects': one(select(
+                func.count(Project.id).label('total'),
+                func.count(case((Project.project_type == 'subscription', 1))).label('subscription'),
+                func.count(case((Project.project_type == 'onetime', 1))).label('onetime'),
+                func.count(case((Project.status == 'active', 1))).label('active'),
+                func.count(case((Project.status == 'completed', 1))).label('completed')
+            )),
+            'total_clients': scalar(select(func.count(Client.id))),
+            'subscriptions': one(select(
+                func.count(ClientSubscription.id).label('active'),
+                func.count(func.distinct(ClientSubscription.client_id)).label('active_clients')
+            ).where(ClientSubscription.status == 'active')),
+            # الإيرادات الشهرية المتكررة لكل عملة
+            'monthly_revenue': rows(current_mrr_groups(today)),
+            'subscription_revenue': rows(
+                select(
+                    SubscriptionPayment.currency,
+                    payment_rate_day,
+                    exact_sum(SubscriptionPayment.amount, SubscriptionPayment.currency)
+                )
+                .where(SubscriptionPayment.status == 'completed')
+                .group_by(SubscriptionPayment.currency, payment_rate_day)
+            )
+        })
+
+        projects = results['projects']
+        subscriptions = results['subscriptions']
+        subscription_revenue, _ = convert_groups(results['subscription_revenue'] or [])
+        subscription_revenue = to_major(subscription_revenue, base_currency())
+        monthly_revenue, _ = convert_groups(results['monthly_revenue'] or [], today)
+        monthly_revenue = to_major(monthly_revenue, base_currency())
+
         statistics = {
-            'total_projects': total_projects,
-            'subscription_projects': subscription_projects,
-            'onetime_projects': onetime_projects,
-            'active_projects': active_projects,
-            'completed_projects': completed_projects,
-            'total_clients': total_clients,
-            'active_clients': active_clients,
-            'active_subscriptions': active_subscriptions,
-            'monthly_revenue': float(monthly_revenue),
-            'subscription_revenue': float(subscription_revenue),
+            'total_projects': projects.total if projects else 0,
+            'subscription_projects': projects.subscription if projects else 0,
+            'onetime_projects': projects.onetime if projects else 0,
+            'active_projects': projects.active if projects else 0,
+            'completed_projects': projects.completed if projects else 0,
+            'total_clients': results['total_clients'] or 0,
+            'active_clients': subscriptions.active_clients if subscriptions else 0,
+            'active_subscriptions': subscriptions.active if subscriptions else 0,
+            'monthly_revenue': monthly_revenue,
+            'subscription_revenue': subscription_revenue,
             'project_revenue': 0,
             'pending_amount': 0,
-            'total_revenue': float(subscription_revenue)
+            'total_revenue': subscription_revenue,
+            'currency': base_currency()
         }
 
         return jsonify({
             'success': True,
-            'statistics': statistics
+            'statistics': statistics,
+            'partial': bool(missing)
         })
 
     except Exception as e:
@@ -73,60 +96,49 @@ def get_dashboard_statistics():
             'message': 'خطأ في جلب الإحصائيات'
         }), 500
 
-@dashboard_bp.route('/dashboard/recent-activities', methods=['GET'])
-def get_recent_activities():
-    """جلب النشاطات الحديثة"""
+@dashboard_bp.route('/summary', methods=['GET'])
+@jwt_required()
+def get_dashboard_summary_data():
+    """ملخص لوحة التحكم: الأعداد وأحدث العناصر والتنبيهات في طلب واحد"""
     try:
-        activities = []
-        
-        # المشاريع الحديثة (آخر 10)
-        recent_projects = Project.query.order_by(Project.created_at.desc()).limit(10).all()
-        for project in recent_projects:
-            activities.append({
-                'type': 'project_created',
-                'title': f'تم إنشاء مشروع جديد: {project.name}',
-                'description': f'مشروع {project.project_type} في فئة {project.category}',
-                'timestamp': project.created_at.isoformat(),
-                'icon': 'fas fa-project-diagram',
-                'color': 'primary'
-            })
+        user = User.query.get(get_jwt_identity())
+        role = user.role if user else 'employee'
         
-        # الاشتراكات الحديثة (آخر 10)
-        recent_subscriptions = ClientSubscription.query.order_by(
-            ClientSubscription.created_at.desc()
-        ).limit(10).all()
-        for subscription in recent_subscriptions:
-            activities.append({
-                'type': 'subscription_created',
-                'title': f'اشتراك جديد: {subscription.client.name}',
-                'description': f'اشتراك في {subscription.project.name} بقيمة {float(subscription.monthly_amount)} ج.م شهرياً',
-                'timestamp': subscription.created_at.isoformat(),
-                'icon': 'fas fa-sync-alt',
-                'color': 'success'
-            })
+        summary = get_dashboard_summary(role, current_app.config.get('DASHBOARD_CACHE_TIMEOUT', 60))
         
-        # الدفعات الحديثة (آخر 10)
-        recent_payments = SubscriptionPayment.query.filter_by(status='paid').order_by(
-            SubscriptionPayment.payment_date.desc()
-        ).limit(10).all()
-        for payment in recent_payments:
-            activities.append({
-                'type': 'payment_received',
-                'title': f'تم استلام دفعة من {payment.subscription.client.name}',
-                'description': f'مبلغ {float(payment.amount)} ج.م لاشتراك {payment.subscription.project.name}',
-                'timestamp': payment.payment_date.isoformat() if payment.payment_date else payment.created_at.isoformat(),
-                'icon': 'fas fa-money-bill',
-                'color': 'info'
-            })
+        return jsonify({
+            'success': True,
+            'summary': summary
+        })
+
+    except Exception as e:
+        current_app.logger.error(f"خطأ في جلب ملخص لوحة التحكم: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'خطأ في جلب ملخص لوحة التحكم'
+        }), 500
+
+@dashboard_bp.route('/dashboard/recent-activities', methods=['GET'])
+def get_recent_activities():
+    """جلب النشاطات الحديثة مع دعم التمرير اللانهائي عبر المؤشر"""
+    try:
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        cursor = request.args.get('cursor')
         
-        # ترتيب النشاطات حسب التاريخ
-        activities.sort(key=lambda x: x['timestamp'], reverse=True)
+        activities, next_cursor = get_activity_feed(limit, cursor)
         
         return jsonify({
             'success': True,
-            'activities': activities[:20]  # أحدث 20 نشاط
+            'activities': activities,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         })
 
+    except InvalidCursor:
+        return jsonify({
+            'success': False,
+            'message': 'مؤشر الصفحة غير صحيح'
+        }), 400
     except Exception as e:
         current_app.logger.error(f"خطأ في جلب النشاطات الحديثة: {str(e)}")
         current_app.logger.error(traceback.format_exc())
@@ -136,76 +148,20 @@ def get_recent_activities():
         }), 500
 
 @dashboard_bp.route('/dashboard/notifications', methods=['GET'])
+@jwt_required()
 def get_notifications():
-    """جلب التنبيهات والإشعارات"""
+    """جلب التنبيهات والإشعارات من صندوق المستخدم"""
     try:
-        notifications = []
-        
-        # الاشتراكات المتأخرة
-        overdue_subscriptions = ClientSubscription.query.filter(
-            and_(
-                ClientSubscription.status == 'active',
-                ClientSubscription.next_billing_date < datetime.now().date()
-            )
-        ).all()
-        
-        if overdue_subscriptions:
-            notifications.append({
-                'type': 'warning',
-                'title': 'اشتراكات متأخرة',
-                'message': f'يوجد {len(overdue_subscriptions)} اشتراك متأخر عن الدفع',
-                'action_url': '/subscriptions?filter=overdue',
-                'priority': 'high',
-                'timestamp': datetime.now().isoformat()
-            })
-        
-        # المشاريع القريبة من الانتهاء
-        upcoming_deadlines = Project.query.filter(
-            and_(
-                Project.status == 'active',
-                Project.end_date != None,
-                Project.end_date <= datetime.now().date() + timedelta(days=7)
-            )
-        ).all()
-        
-        if upcoming_deadlines:
-            notifications.append({
-                'type': 'info',
-                'title': 'مشاريع قريبة من الانتهاء',
-                'message': f'{len(upcoming_deadlines)} مشروع ينتهي خلال الأسبوع القادم',
-                'action_url': '/projects?filter=upcoming',
-                'priority': 'medium',
-                'timestamp': datetime.now().isoformat()
-            })
+        user_id = get_jwt_identity()
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        unread_only = request.args.get('unread') in ['1', 'true']
         
-        # العملاء الجدد (آخر 7 أيام)
-        new_clients = Client.query.filter(
-            Client.created_at >= datetime.now() - timedelta(days=7)
-        ).count()
-        
-        if new_clients > 0:
-            notifications.append({
-                'type': 'success',
-                'title': 'عملاء جدد',
-                'message': f'تم إضافة {new_clients} عميل جديد هذا الأسبوع',
-                'action_url': '/clients',
-                'priority': 'low',
-                'timestamp': datetime.now().isoformat()
-            })
-        
-        # إشعار عام للنظام
-        notifications.append({
-            'type': 'info',
-            'title': 'نظام إدارة المشاريع',
-            'message': 'مرحباً بك في النظام الشامل لإدارة المشاريع والاشتراكات',
-            'action_url': None,
-            'priority': 'low',
-            'timestamp': datetime.now().isoformat()
-        })
+        notifications, unread_count = get_inbox(user_id, limit, unread_only)
 
         return jsonify({
             'success': True,
-            'notifications': notifications
+            'notifications': [notification.to_dict() for notification in notifications],
+            'unread_count': unread_count
         })
 
     except Exception as e:
@@ -216,6 +172,108 @@ def get_notifications():
             'message': 'خطأ في جلب التنبيهات'
         }), 500
 
+@dashboard_bp.route('/dashboard/notifications/read', methods=['POST'])
+@jwt_required()
+def mark_notifications_read():
+    """تعليم التنبيهات كمقروءة (كلها إذا لم تحدد المعرفات)"""
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        notification_ids = data.get('ids')
+        
+        if notification_ids is not None and not isinstance(notification_ids, list):
+            return jsonify({
+                'success': False,
+                'message': 'قائمة المعرفات غير صحيحة'
+            }), 400
+        
+        changed = mark_read(user_id, notification_ids)
+
+        return jsonify({
+            'success': True,
+            'marked': changed,
+            'unread_count': get_unread_count(user_id)
+        })
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"خطأ في تحديث التنبيهات: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'خطأ في تحديث التنبيهات'
+        }), 500
+
+@dashboard_bp.route('/stream-token', methods=['GET'])
+@jwt_required()
+def get_stream_token():
+    """توكن قصير العمر لفتح قناة الأحداث المباشرة فقط"""
+    user = User.query.get(get_jwt_identity())
+    if not user or not user.is_active:
+        return jsonify({
+            'success': False,
+            'message': 'المستخدم غير موجود'
+        }), 401
+
+    # القنوات معطلة على هذا الخادم (EVENTS_MAX_STREAMS = 0)، فلا داعي لإعادة المحاولة
+    max_streams = current_app.config.get('EVENTS_MAX_STREAMS', 0)
+    if max_streams <= 0:
+        return jsonify({
+            'success': False,
+            'message': 'التحديث المباشر معطل على هذا الخادم',
+            'streaming_enabled': False
+        }), 503
+
+    # كل قناة تشغل عاملاً طوال فترة فتحها، وعند بلوغ الحد تستمر اللوحة بالتحديث الدوري
+    if not broker.has_capacity(max_streams):
+        return jsonify({
+            'success': False,
+            'message': 'التحديث المباشر غير متاح حالياً',
+            'streaming_enabled': True
+        }), 503
+
+    return jsonify({
+        'success': True,
+        'token': create_stream_token(user.id),
+        'expires_in': current_app.config.get('EVENTS_STREAM_TOKEN_SECONDS', 600)
+    })
+
+@dashboard_bp.route('/stream', methods=['GET'])
+def dashboard_stream():
+    """قناة أحداث مباشرة (Server-Sent Events) لتحديث لوحة التحكم"""
+    # EventSource لا يدعم الترويسات، لذلك يُرسل توكن القناة (وليس توكن الدخول) في الرابط
+    token = request.args.get('token')
+    if not token:
+        return jsonify({
+            'success': False,
+            'message': 'التوكن مطلوب'
+        }), 401
+
+    try:
+        user_id, expires_at = read_stream_token(token)
+        user = User.query.get(user_id)
+        if not user or not user.is_active:
+            raise InvalidStreamToken('Inactive user')
+    except InvalidStreamToken:
+        return jsonify({
+            'success': False,
+            'message': 'توكن غير صالح'
+        }), 401
+
+    subscriber = broker.subscribe(current_app.config.get('EVENTS_MAX_STREAMS', 0))
+    if subscriber is None:
+        return jsonify({
+            'success': False,
+            'message': 'التحديث المباشر غير متاح حالياً'
+        }), 503
+
+    keepalive = current_app.config.get('EVENTS_KEEPALIVE_SECONDS', 15)
+    response = Response(stream_events(subscriber, user.id, expires_at, keepalive), mimetype='text/event-stream')
+    # Also frees the slot when the client leaves before the stream starts
+    response.call_on_close(lambda: broker.unsubscribe(subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @dashboard_bp.route('/dashboard/chart-data', methods=['GET'])
 def get_chart_data():
     """جلب بيانات الرسوم البيانية"""
@@ -5,7 +5,9 @@ from extensions import db
 from models.employee import Employee
 from models.user import User
 from models.task import Task
-from sqlalchemy import func, extract, and_, or_
+from sqlalchemy import select, func, extract, and_, or_
+from services.fanout import run_queries, scalar, one, rows
+from services.numbering import next_number
 import hashlib
 
 employees_bp = Blueprint('employees', __name__)
@@ -175,10 +177,6 @@ def create_employee():
                 'message': 'البريد الإلكتروني موجود بالفعل في النظام'
             }), 400
 
-        # Generate employee ID
-        employee_count = Employee.query.count()
-        employee_id = f"EMP{employee_count + 1:04d}"
-
         # Check if employee_id is provided and unique
         if 'employee_id' in data and data['employee_id']:
             if Employee.query.filter_by(employee_id=data['employee_id']).first():
@@ -187,6 +185,9 @@ def create_employee():
                     'message': 'رقم الموظف موجود بالفعل'
                 }), 400
             employee_id = data['employee_id']
+        else:
+            # Generate employee ID
+            employee_id = next_number('employee')
 
         # Parse hire date
         try:
@@ -479,43 +480,47 @@ def get_departments():
 def get_employee_statistics():
     """Get comprehensive employee statistics"""
     try:
-        # Basic counts
-        total_employees = Employee.query.filter_by(status='active').count()
-        total_departments = db.session.query(Employee.department).distinct().count()
-        
-        # Employment type breakdown
-        employment_types = db.session.query(
-            Employee.employment_type,
-            func.count(Employee.id).label('count')
-        ).filter(Employee.status == 'active').group_by(Employee.employment_type).all()
-        
-        # Department breakdown
-        departments = db.session.query(
-            Employee.department,
-            func.count(Employee.id).label('count')
-        ).filter(Employee.status == 'active').group_by(Employee.department).all()
-        
-        # Performance statistics
-        avg_performance = db.session.query(
-            func.avg(Employee.performance_rating)
-        ).filter(
-            and_(Employee.status == 'active', Employee.performance_rating.isnot(None))
-        ).scalar() or 0
-        
-        # Recent hires (last 30 days)
+        active = Employee.status == 'active'
         thirty_days_ago = datetime.now().date() - timedelta(days=30)
-        recent_hires = Employee.query.filter(
-            and_(Employee.hire_date >= thirty_days_ago, Employee.status == 'active')
-        ).count()
-        
-        # Salary statistics
-        salary_stats = db.session.query(
-            func.avg(Employee.salary).label('avg_salary'),
-            func.min(Employee.salary).label('min_salary'),
-            func.max(Employee.salary).label('max_salary')
-        ).filter(
-            and_(Employee.status == 'active', Employee.salary.isnot(None))
-        ).first()
+
+        # Independent aggregates run concurrently on separate connections
+        results, missing = run_queries({
+            # Basic counts and recent hires (last 30 days)
+            'total_employees': scalar(select(func.count(Employee.id)).where(active)),
+            'total_departments': scalar(select(func.count(func.distinct(Employee.department)))),
+            'recent_hires': scalar(
+                select(func.count(Employee.id)).where(active, Employee.hire_date >= thirty_days_ago)
+            ),
+            # Employment type and department breakdowns
+            'employment_types': rows(
+                select(Employee.employment_type, func.count(Employee.id).label('count'))
+                .where(active).group_by(Employee.employment_type)
+            ),
+            'departments': rows(
+                select(Employee.department, func.count(Employee.id).label('count'))
+                .where(active).group_by(Employee.department)
+            ),
+            # Performance and salary statistics
+            'avg_performance': scalar(
+                select(func.avg(Employee.performance_rating))
+                .where(active, Employee.performance_rating.isnot(None))
+            ),
+            'salary_stats': one(
+                select(
+                    func.avg(Employee.salary).label('avg_salary'),
+                    func.min(Employee.salary).label('min_salary'),
+                    func.max(Employee.salary).label('max_salary')
+                ).where(active, Employee.salary.isnot(None))
+            )
+        }, defaults={'employment_types': [], 'departments': []})
+
+        total_employees = results['total_employees'] or 0
+        total_departments = results['total_departments'] or 0
+        recent_hires = results['recent_hires'] or 0
+        employment_types = results['employment_types']
+        departments = results['departments']
+        avg_performance = results['avg_performance'] or 0
+        salary_stats = results['salary_stats']
 
         return jsonify({
             'success': True,
@@ -533,11 +538,12 @@ def get_employee_statistics():
                     for dept in departments
                 ],
                 'salary_statistics': {
-                    'average': float(salary_stats.avg_salary) if salary_stats.avg_salary else 0,
-                    'minimum': float(salary_stats.min_salary) if salary_stats.min_salary else 0,
-                    'maximum': float(salary_stats.max_salary) if salary_stats.max_salary else 0
+                    'average': float(salary_stats.avg_salary) if salary_stats and salary_stats.avg_salary else 0,
+                    'minimum': float(salary_stats.min_salary) if salary_stats and salary_stats.min_salary else 0,
+                    'maximum': float(salary_stats.max_salary) if salary_stats and salary_stats.max_salary else 0
                 }
-            }
+            },
+            'partial': bool(missing)
         }), 200
 
     except Exception as e:
@@ -1,7 +1,13 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.exc import IntegrityError
 from extensions import db
 from models.invoice import Invoice
+from models.user import User
+from services.billing import run_billing, BillingRunError, BillingRunConflict
+from services.aging import compute_aging, get_aging_invoices, InvalidAgingBucket
+from services.dashboard import FINANCIAL_ROLES
+from services.exports import parse_report_date
 
 invoices_bp = Blueprint('invoices', __name__)
 
@@ -21,4 +27,129 @@ def get_invoices():
         return jsonify({
             'success': False,
             'message': 'حدث خطأ في جلب الفواتير'
-        }), 500 
\ No newline at end of file
+        }), 500
+
+@invoices_bp.route('/billing-run', methods=['POST'])
+@jwt_required()
+def create_billing_run():
+    """Invoice the unbilled billable time and expenses of a period"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user or user.role not in FINANCIAL_ROLES:
+            return jsonify({
+                'success': False,
+                'message': 'غير مصرح لك بإصدار الفواتير'
+            }), 403
+        
+        data = request.get_json() or {}
+        start_date = parse_report_date(data.get('start_date'))
+        end_date = parse_report_date(data.get('end_date'))
+        if not start_date or not end_date:
+            raise BillingRunError('start_date and end_date are required')
+        
+        result = run_billing(
+            start_date, end_date, user.id,
+            issue_date=parse_report_date(data.get('issue_date')),
+            project_ids=[int(project_id) for project_id in data.get('project_ids') or []],
+            tax_rate=current_app.config.get('INVOICE_TAX_RATE', 15),
+            dry_run=bool(data.get('dry_run'))
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': 'تم إنشاء الفواتير بنجاح' if not result['dry_run'] else 'معاينة دورة الفوترة',
+            'billing_run': result
+        }), 200 if result['dry_run'] else 201
+        
+    except (BillingRunError, ValueError, TypeError) as e:
+        return jsonify({
+            'success': False,
+            'message': 'بيانات دورة الفوترة غير صحيحة',
+            'error': str(e)
+        }), 400
+    except IntegrityError:
+        return jsonify({
+            'success': False,
+            'message': 'تعارض في أرقام الفواتير، يرجى المحاولة مرة أخرى'
+        }), 409
+    except BillingRunConflict as e:
+        return jsonify({
+            'success': False,
+            'message': 'تم تعديل بعض الساعات أو المصروفات أثناء دورة الفوترة، يرجى المحاولة مرة أخرى',
+            'error': str(e)
+        }), 409
+    except Exception as e:
+        print(f"❌ Error running billing: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في إنشاء الفواتير'
+        }), 500 
+
+@invoices_bp.route('/aging', methods=['GET'])
+@jwt_required()
+def get_aging_report():
+    """Accounts receivable of every client by days past due"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user or user.role not in FINANCIAL_ROLES:
+            return jsonify({
+                'success': False,
+                'message': 'غير مصرح لك بعرض هذا التقرير'
+            }), 403
+        
+        return jsonify({
+            'success': True,
+            **compute_aging()
+        }), 200
+        
+    except Exception as e:
+        print(f"❌ Error building aging report: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في إنشاء تقرير أعمار الذمم'
+        }), 500
+
+@invoices_bp.route('/aging/invoices', methods=['GET'])
+@jwt_required()
+def get_aging_invoices_page():
+    """Open invoices behind an aging figure, filtered by client and bucket"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user or user.role not in FINANCIAL_ROLES:
+            return jsonify({
+                'success': False,
+                'message': 'غير مصرح لك بعرض هذا التقرير'
+            }), 403
+        
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 50, type=int), 200)
+        
+        invoices, invoices_paginated = get_aging_invoices(
+            client_id=request.args.get('client_id', type=int),
+            bucket=request.args.get('bucket'),
+            page=page,
+            per_page=per_page
+        )
+        
+        return jsonify({
+            'success': True,
+            'invoices': invoices,
+            'total': invoices_paginated.total,
+            'pages': invoices_paginated.pages,
+            'current_page': page,
+            'per_page': per_page,
+            'has_next': invoices_paginated.has_next,
+            'has_prev': invoices_paginated.has_prev
+        }), 200
+        
+    except InvalidAgingBucket:
+        return jsonify({
+            'success': False,
+            'message': 'فئة العمر غير صحيحة'
+        }), 400
+    except Exception as e:
+        print(f"❌ Error getting aging invoices: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في جلب الفواتير'
+        }), 500
\ No newline at end of file
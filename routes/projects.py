@@ -6,7 +6,12 @@ from models.project import Project
 from models.user import User
 from models.client import Client
 from models.employee import Employee
-from sqlalchemy import func
+from sqlalchemy import select, func, case
+from services.fanout import run_queries, one, rows
+from services.subscription_analytics import current_mrr_groups
+from services.money import exact_sum, to_major
+from services.exchange_rates import convert_groups, base_currency
+from services.memberships import update_members, MembershipError
 
 projects_bp = Blueprint('projects', __name__)
 
@@ -288,7 +293,10 @@ def delete_project(project_id):
             # Handle time tracks if they exist
             try:
                 from models.timetrack import TimeTrack
+                from models.timetrack_daily import TimeTrackDaily
                 TimeTrack.query.filter_by(project_id=project_id).delete()
+                # Bulk deletes skip the ORM events that maintain the daily facts
+                TimeTrackDaily.query.filter_by(project_id=project_id).delete()
             except ImportError:
                 pass  # TimeTrack model doesn't exist
             
@@ -450,46 +458,108 @@ def get_subscribers(project_id):
             'error': str(e)
         }), 500
 
+def _bulk_update_members(project_id, kind, ids_key, message):
+    """Add (POST), remove (DELETE) or replace (PUT) the members of a project from a list of ids"""
+    try:
+        project = Project.query.get_or_404(project_id)
+        
+        if kind == 'subscribers' and project.project_type != 'subscription':
+            return jsonify({
+                'success': False,
+                'message': 'هذا المشروع ليس مشروع اشتراك'
+            }), 400
+        
+        data = request.get_json() or {}
+        ids = data.get(ids_key)
+        if not isinstance(ids, list) or not all(isinstance(member_id, int) and not isinstance(member_id, bool) for member_id in ids):
+            return jsonify({
+                'success': False,
+                'message': f'{ids_key} يجب أن تكون قائمة معرفات'
+            }), 400
+        
+        changes = {'POST': {'add': ids}, 'DELETE': {'remove': ids}, 'PUT': {'replace': ids}}[request.method]
+        result = update_members(project_id, kind, **changes)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': message,
+            'project_id': project_id,
+            **result
+        })
+        
+    except MembershipError as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error updating project {kind}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في تحديث أعضاء المشروع'
+        }), 500
+
+@projects_bp.route('/<int:project_id>/subscribers/bulk', methods=['POST', 'DELETE', 'PUT'])
+@jwt_required()
+def bulk_update_subscribers(project_id):
+    """Add, remove or replace many subscribers of a subscription project at once"""
+    return _bulk_update_members(project_id, 'subscribers', 'client_ids', 'تم تحديث المشتركين بنجاح')
+
+@projects_bp.route('/<int:project_id>/team/bulk', methods=['POST', 'DELETE', 'PUT'])
+@jwt_required()
+def bulk_update_team(project_id):
+    """Add, remove or replace many team members of a project at once"""
+    return _bulk_update_members(project_id, 'team', 'employee_ids', 'تم تحديث فريق المشروع بنجاح')
+
 @projects_bp.route('/statistics', methods=['GET'])
 @jwt_required()
 def get_project_statistics():
     """Get project statistics - Enhanced for subscription/one-time projects"""
     try:
-        # Basic counts
-        total_projects = Project.query.count()
-        subscription_projects = Project.query.filter_by(project_type='subscription').count()
-        onetime_projects = Project.query.filter_by(project_type='onetime').count()
-        active_projects = Project.query.filter_by(status='active').count()
-        completed_projects = Project.query.filter_by(status='completed').count()
-        
-        # Revenue calculations
-        monthly_revenue = db.session.query(
-            func.sum(Project.monthly_price * Project.subscriber_count)
-        ).filter_by(project_type='subscription').scalar() or 0
-        
-        total_onetime_revenue = db.session.query(
-            func.sum(Project.total_amount)
-        ).filter_by(project_type='onetime').scalar() or 0
-        
-        paid_onetime_revenue = db.session.query(
-            func.sum(Project.paid_amount)
-        ).filter_by(project_type='onetime').scalar() or 0
+        # Counts and revenue run concurrently on separate connections
+        results, missing = run_queries({
+            'counts': one(select(
+                func.count(Project.id).label('total'),
+                func.count(case((Project.project_type == 'subscription', 1))).label('subscription'),
+                func.count(case((Project.project_type == 'onetime', 1))).label('onetime'),
+                func.count(case((Project.status == 'active', 1))).label('active'),
+                func.count(case((Project.status == 'completed', 1))).label('completed')
+            )),
+            'monthly_revenue': rows(current_mrr_groups(datetime.now().date())),
+            'onetime_revenue': one(
+                select(
+                    exact_sum(Project.total_amount).label('total'),
+                    exact_sum(Project.paid_amount).label('paid')
+                ).where(Project.project_type == 'onetime')
+            )
+        })
+
+        counts = results['counts']
+        monthly_revenue, _ = convert_groups(results['monthly_revenue'] or [], datetime.now().date())
+        monthly_revenue = to_major(monthly_revenue, base_currency())
+        onetime_revenue = results['onetime_revenue']
+        total_onetime_revenue = onetime_revenue.total if onetime_revenue else 0
+        paid_onetime_revenue = onetime_revenue.paid if onetime_revenue else 0
         
         pending_payments = total_onetime_revenue - paid_onetime_revenue
         
         return jsonify({
             'success': True,
             'statistics': {
-                'total_projects': total_projects,
-                'subscription_projects': subscription_projects,
-                'onetime_projects': onetime_projects,
-                'active_projects': active_projects,
-                'completed_projects': completed_projects,
-                'monthly_revenue': float(monthly_revenue),
-                'total_onetime_revenue': float(total_onetime_revenue),
-                'paid_onetime_revenue': float(paid_onetime_revenue),
-                'pending_payments': float(pending_payments)
-            }
+                'total_projects': counts.total if counts else 0,
+                'subscription_projects': counts.subscription if counts else 0,
+                'onetime_projects': counts.onetime if counts else 0,
+                'active_projects': counts.active if counts else 0,
+                'completed_projects': counts.completed if counts else 0,
+                'monthly_revenue': monthly_revenue,
+                'total_onetime_revenue': to_major(total_onetime_revenue),
+                'paid_onetime_revenue': to_major(paid_onetime_revenue),
+                'pending_payments': to_major(pending_payments)
+            },
+            'partial': bool(missing)
         })
         
     except Exception as e:
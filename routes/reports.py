@@ -1,14 +1,29 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime, timedelta
+from datetime import datetime
 from extensions import db
-from models.subscription import ClientSubscription, SubscriptionPayment
-from models.project import Project
-from models.client import Client
 from models.invoice import Invoice
-from models.expense import Expense
-import io
-import xlsxwriter
+from models.export_job import ExportJob
+from models.period_snapshot import PeriodSnapshot
+from models.user import User
+from models.exchange_rate import ExchangeRate
+from sqlalchemy.exc import IntegrityError
+from services.ledger import iter_transactions, get_transactions_page, InvalidCursor
+from services.excel import send_excel_file
+from services.exports import build_export, parse_report_date, EXPORT_TYPES
+from services.export_jobs import submit_export, get_job_status
+from services.periods import (
+    get_financial_summary as get_financial_summary_for_period,
+    get_monthly_summaries, close_period, PeriodNotFinished, PeriodAlreadyClosed, PeriodMissingRates
+)
+from services.pivot import normalize_query, get_pivot, InvalidPivotQuery, FILTERS
+from services.utilization import compute_utilization
+from services.profitability import get_profitability, summarize, SORT_FIELDS
+from services.cash_flow import get_cash_flow
+from services.exchange_rates import set_rate, base_currency
+from services.dashboard import FINANCIAL_ROLES
+import json
+import os
 
 reports_bp = Blueprint('reports', __name__)
 
@@ -30,15 +45,17 @@ def get_financial_summary():
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        # Get all financial data
-        summary = calculate_financial_summary(start_date, end_date)
+        # Closed months are read from their snapshots
+        summary, snapshots = get_financial_summary_for_period(start_date, end_date)
         
         return jsonify({
             'success': True,
             'summary': summary,
             'period': {
                 'start_date': start_date.isoformat(),
-                'end_date': end_date.isoformat()
+                'end_date': end_date.isoformat(),
+                'closed_months': [snapshot.period for snapshot in snapshots],
+                'has_late_edits': any(snapshot.has_late_edits for snapshot in snapshots)
             }
         }), 200
         
@@ -52,21 +69,48 @@ def get_financial_summary():
 @reports_bp.route('/transactions', methods=['GET'])
 @jwt_required()
 def get_all_transactions():
-    """Get all financial transactions"""
+    """Get all financial transactions.
+
+    With ``limit`` (or ``cursor``) a single page is returned together with
+    ``next_cursor``; otherwise the whole period is streamed as it is read.
+    """
     try:
         # Get query parameters
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         transaction_type = request.args.get('type')  # income, expense, expected
+        status = request.args.get('status')  # paid, pending, expected
+        source = request.args.get('source')  # subscription, project, expense
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit', type=int)
         
-        transactions = get_financial_transactions(start_date, end_date, transaction_type)
+        if limit or cursor:
+            limit = min(max(limit or 100, 1), 1000)
+            transactions, next_cursor = get_transactions_page(
+                parse_report_date(start_date), parse_report_date(end_date),
+                transaction_type, status, source, cursor, limit
+            )
+            
+            return jsonify({
+                'success': True,
+                'transactions': transactions,
+                'total': len(transactions),
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }), 200
         
-        return jsonify({
-            'success': True,
-            'transactions': transactions,
-            'total': len(transactions)
-        }), 200
+        transactions = get_financial_transactions(start_date, end_date, transaction_type, status, source)
         
+        return Response(
+            stream_with_context(stream_transactions_json(transactions)),
+            mimetype='application/json'
+        )
+        
+    except (ValueError, InvalidCursor):
+        return jsonify({
+            'success': False,
+            'message': 'معاملات البحث غير صحيحة'
+        }), 400
     except Exception as e:
         print(f"❌ Error getting transactions: {str(e)}")
         return jsonify({
@@ -82,32 +126,10 @@ def export_excel():
         data = request.get_json()
         export_type = data.get('export_type', 'financial')
         
-        if export_type == 'clients':
-            # Export clients data
-            filters = data.get('filters', {})
-            clients = get_clients_for_export(filters)
-            excel_buffer = create_clients_excel_report(clients)
-            filename = f"clients_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            
-        else:
-            # Export financial data
-            start_date = data.get('start_date')
-            end_date = data.get('end_date')
-            transaction_type = data.get('type')
-            
-            # Get transactions
-            transactions = get_financial_transactions(start_date, end_date, transaction_type)
-            
-            # Create Excel file
-            excel_buffer = create_excel_report(transactions, start_date, end_date)
-            filename = f"financial_report_{start_date}_{end_date}.xlsx"
-        
-        return send_file(
-            excel_buffer,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        excel_path, filename = build_export(export_type, get_export_params(data))
+        
+        # Stream the spooled file back; it is deleted once the response is closed
+        return send_excel_file(excel_path, filename)
         
     except Exception as e:
         print(f"❌ Error exporting Excel: {str(e)}")
@@ -116,6 +138,450 @@ def export_excel():
             'message': 'حدث خطأ في تصدير التقرير'
         }), 500
 
+@reports_bp.route('/exports', methods=['POST'])
+@jwt_required()
+def create_export():
+    """Queue a background Excel export"""
+    try:
+        data = request.get_json() or {}
+        export_type = data.get('export_type', 'financial')
+        
+        if export_type not in EXPORT_TYPES:
+            return jsonify({
+                'success': False,
+                'message': 'نوع التصدير غير صحيح'
+            }), 400
+        
+        params = get_export_params(data)
+        if export_type in ('financial', 'pack'):
+            # Validate dates now rather than failing inside the worker
+            parse_report_date(params.get('start_date'))
+            parse_report_date(params.get('end_date'))
+        
+        job, created = submit_export(export_type, params, get_jwt_identity())
+        
+        return jsonify({
+            'success': True,
+            'created': created,
+            'job': get_job_status(job)
+        }), 202
+        
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'معاملات التصدير غير صحيحة'
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error creating export job: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في إنشاء مهمة التصدير'
+        }), 500
+
+def get_user_export(job_id):
+    """Export job of the current user, any job for admins, None otherwise"""
+    job = db.session.get(ExportJob, job_id)
+    if job is None:
+        return None
+    user_id = get_jwt_identity()
+    if str(job.requested_by) == str(user_id):
+        return job
+    user = db.session.get(User, int(user_id))
+    return job if user and user.role == 'admin' else None
+
+@reports_bp.route('/exports/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_export(job_id):
+    """Get status and progress of an export job"""
+    try:
+        job = get_user_export(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'message': 'مهمة التصدير غير موجودة'
+            }), 404
+        
+        return jsonify({
+            'success': True,
+            'job': get_job_status(job)
+        })
+        
+    except Exception as e:
+        print(f"❌ Error getting export job: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في جلب مهمة التصدير'
+        }), 500
+
+@reports_bp.route('/exports/<int:job_id>/download', methods=['GET'])
+@jwt_required()
+def download_export(job_id):
+    """Download the file of a completed export job"""
+    try:
+        job = get_user_export(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'message': 'مهمة التصدير غير موجودة'
+            }), 404
+        
+        if job.is_active:
+            return jsonify({
+                'success': False,
+                'message': 'لم يكتمل التصدير بعد',
+                'job': get_job_status(job)
+            }), 409
+        
+        if job.status != 'completed' or not job.file_path or not os.path.exists(job.file_path):
+            return jsonify({
+                'success': False,
+                'message': 'ملف التصدير غير متاح'
+            }), 410
+        
+        # Kept on disk until the retention period ends
+        return send_excel_file(job.file_path, job.file_name, delete_after=False)
+        
+    except Exception as e:
+        print(f"❌ Error downloading export: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في تحميل ملف التصدير'
+        }), 500
+
+@reports_bp.route('/periods', methods=['GET'])
+@jwt_required()
+def get_periods():
+    """List closed periods"""
+    try:
+        snapshots = PeriodSnapshot.query.order_by(
+            PeriodSnapshot.year.desc(), PeriodSnapshot.month.desc()
+        ).all()
+        
+        return jsonify({
+            'success': True,
+            'periods': [snapshot.to_dict() for snapshot in snapshots]
+        }), 200
+        
+    except Exception as e:
+        print(f"❌ Error getting periods: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في جلب الفترات المغلقة'
+        }), 500
+
+@reports_bp.route('/periods/close', methods=['POST'])
+@jwt_required()
+def close_financial_period():
+    """Close a finished month, freezing its figures"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user or user.role != 'admin':
+            return jsonify({
+                'success': False,
+                'message': 'ليس لديك صلاحية لإغلاق الفترات المالية'
+            }), 403
+        
+        data = request.get_json() or {}
+        try:
+            year = int(data.get('year'))
+            month = int(data.get('month'))
+            if not 1 <= month <= 12:
+                raise ValueError('Invalid month')
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': 'السنة والشهر مطلوبان'
+            }), 400
+        
+        snapshot = close_period(year, month, user.id)
+        
+        return jsonify({
+            'success': True,
+            'message': 'تم إغلاق الفترة بنجاح',
+            'period': snapshot.to_dict()
+        }), 201
+        
+    except PeriodNotFinished:
+        return jsonify({
+            'success': False,
+            'message': 'لا يمكن إغلاق شهر لم ينته بعد'
+        }), 400
+    except PeriodMissingRates as e:
+        return jsonify({
+            'success': False,
+            'message': 'لا يمكن إغلاق الفترة قبل إدخال أسعار الصرف لجميع العملات',
+            'error': str(e)
+        }), 400
+    except (PeriodAlreadyClosed, IntegrityError):
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'هذه الفترة مغلقة بالفعل'
+        }), 409
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error closing period: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في إغلاق الفترة'
+        }), 500
+
+@reports_bp.route('/pivot', methods=['GET'])
+@jwt_required()
+def get_pivot_report():
+    """Aggregate a source by whitelisted dimensions and measures"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user or user.role not in FINANCIAL_ROLES:
+            return jsonify({
+                'success': False,
+                'message': 'غير مصرح لك بعرض هذا التقرير'
+            }), 403
+        
+        query = normalize_query(
+            request.args.get('source', ''),
+            [d for d in request.args.get('dimensions', '').split(',') if d],
+            [m for m in request.args.get('measures', '').split(',') if m],
+            {key: request.args.get(key) for key in FILTERS if key in request.args},
+            parse_report_date(request.args.get('start_date')),
+            parse_report_date(request.args.get('end_date'))
+        )
+        
+        result = get_pivot(query, current_app.config.get('PIVOT_CACHE_TIMEOUT', 300))
+        
+        return jsonify({
+            'success': True,
+            'query': query,
+            'rows': result['rows'],
+            'truncated': result['truncated'],
+            'currency': result['currency'],
+            'missing_rates': result['missing_rates']
+        }), 200
+        
+    except (InvalidPivotQuery, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'message': 'استعلام غير صالح',
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        print(f"❌ Error building pivot report: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في إنشاء التقرير'
+        }), 500
+
+@reports_bp.route('/utilization', methods=['GET'])
+@jwt_required()
+def get_utilization_report():
+    """Utilization, billable share and overtime of every employee in a date range"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user or user.role not in FINANCIAL_ROLES:
+            return jsonify({
+                'success': False,
+                'message': 'غير مصرح لك بعرض هذا التقرير'
+            }), 403
+        
+        # Default to the current month
+        today = datetime.now().date()
+        start_date = parse_report_date(request.args.get('start_date')) or today.replace(day=1)
+        end_date = parse_report_date(request.args.get('end_date')) or today
+        if start_date > end_date or (end_date - start_date).days > 366 * 5:
+            raise ValueError('Invalid date range')
+        
+        report = compute_utilization(
+            start_date, end_date,
+            current_app.config.get('WORKING_WEEKDAYS', (6, 0, 1, 2, 3)),
+            current_app.config.get('EMPLOYMENT_DAILY_HOURS'),
+            request.args.get('department')
+        )
+        
+        return jsonify({
+            'success': True,
+            'period': {
+                'start_date': start_date.isoformat(),
+                'end_date': end_date.isoformat()
+            },
+            **report
+        }), 200
+        
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'نطاق التاريخ غير صحيح'
+        }), 400
+    except Exception as e:
+        print(f"❌ Error building utilization report: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في إنشاء تقرير الاستغلال'
+        }), 500
+
+@reports_bp.route('/profitability', methods=['GET'])
+@jwt_required()
+def get_profitability_report():
+    """Revenue, cost and margin of every project, sortable by any figure"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user or user.role not in FINANCIAL_ROLES:
+            return jsonify({
+                'success': False,
+                'message': 'غير مصرح لك بعرض هذا التقرير'
+            }), 403
+        
+        start_date = parse_report_date(request.args.get('start_date'))
+        end_date = parse_report_date(request.args.get('end_date'))
+        if start_date and end_date and start_date > end_date:
+            raise ValueError('Invalid date range')
+        
+        sort = request.args.get('sort', 'margin')
+        if sort not in SORT_FIELDS:
+            sort = 'margin'
+        descending = request.args.get('order', 'desc') != 'asc'
+        
+        projects = get_profitability(
+            start_date, end_date,
+            current_app.config.get('PROFITABILITY_CACHE_TIMEOUT', 300)
+        )
+        
+        status = request.args.get('status')
+        project_type = request.args.get('project_type')
+        if status:
+            projects = [project for project in projects if project['status'] == status]
+        if project_type:
+            projects = [project for project in projects if project['project_type'] == project_type]
+        
+        projects = sorted(
+            projects,
+            key=lambda project: (project[sort] or '') if sort == 'name' else project[sort],
+            reverse=descending
+        )
+        
+        return jsonify({
+            'success': True,
+            'period': {
+                'start_date': start_date.isoformat() if start_date else None,
+                'end_date': end_date.isoformat() if end_date else None
+            },
+            'sort': sort,
+            'order': 'desc' if descending else 'asc',
+            'summary': summarize(projects),
+            'projects': projects
+        }), 200
+        
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'نطاق التاريخ غير صحيح'
+        }), 400
+    except Exception as e:
+        print(f"❌ Error building profitability report: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في إنشاء تقرير الربحية'
+        }), 500
+
+@reports_bp.route('/cash-flow', methods=['GET'])
+@jwt_required()
+def get_cash_flow_report():
+    """Expected inflows and outflows of every day for the next 90 days"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user or user.role not in FINANCIAL_ROLES:
+            return jsonify({
+                'success': False,
+                'message': 'غير مصرح لك بعرض هذا التقرير'
+            }), 403
+        
+        days = min(max(request.args.get('days', 90, type=int), 1), 365)
+        cash_flow = get_cash_flow(
+            days=days,
+            reimbursement_days=current_app.config.get('EXPENSE_REIMBURSEMENT_DAYS', 14),
+            timeout=current_app.config.get('CASH_FLOW_CACHE_TIMEOUT', 300)
+        )
+        
+        return jsonify({
+            'success': True,
+            **cash_flow
+        }), 200
+        
+    except Exception as e:
+        print(f"❌ Error building cash flow report: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في إنشاء تقرير التدفق النقدي'
+        }), 500
+
+@reports_bp.route('/exchange-rates', methods=['GET'])
+@jwt_required()
+def get_exchange_rates():
+    """Exchange rates to the base currency, latest first"""
+    try:
+        query = ExchangeRate.query
+        currency = request.args.get('currency')
+        if currency:
+            query = query.filter(ExchangeRate.currency == currency.upper())
+        rates = query.order_by(ExchangeRate.rate_date.desc(), ExchangeRate.currency).limit(500).all()
+        
+        return jsonify({
+            'success': True,
+            'base_currency': base_currency(),
+            'rates': [rate.to_dict() for rate in rates]
+        }), 200
+        
+    except Exception as e:
+        print(f"❌ Error getting exchange rates: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في جلب أسعار الصرف'
+        }), 500
+
+@reports_bp.route('/exchange-rates', methods=['POST'])
+@jwt_required()
+def save_exchange_rate():
+    """Create or update the rate of a currency on a date"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user or user.role not in FINANCIAL_ROLES:
+            return jsonify({
+                'success': False,
+                'message': 'غير مصرح لك بتعديل أسعار الصرف'
+            }), 403
+        
+        data = request.get_json() or {}
+        rate_date = parse_report_date(data.get('rate_date')) or datetime.now().date()
+        exchange_rate = set_rate(
+            str(data.get('currency') or ''),
+            rate_date,
+            data.get('rate'),
+            source=data.get('source', 'manual'),
+            created_by=user.id
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': 'تم حفظ سعر الصرف بنجاح',
+            'exchange_rate': exchange_rate.to_dict()
+        }), 200
+        
+    except (ValueError, ArithmeticError):
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'بيانات سعر الصرف غير صحيحة'
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error saving exchange rate: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في حفظ سعر الصرف'
+        }), 500
+
 @reports_bp.route('/monthly-comparison', methods=['GET'])
 @jwt_required()
 def get_monthly_comparison():
@@ -126,21 +592,14 @@ def get_monthly_comparison():
         comparison_data = []
         today = datetime.now()
         
+        # Months oldest first, ending with the current month
+        months = []
         for i in range(months_count - 1, -1, -1):
-            # Calculate month start and end
-            month_date = today.replace(day=1) - timedelta(days=i * 30)
-            month_start = month_date.replace(day=1)
-            
-            # Calculate next month start
-            if month_start.month == 12:
-                next_month = month_start.replace(year=month_start.year + 1, month=1)
-            else:
-                next_month = month_start.replace(month=month_start.month + 1)
-            
-            month_end = next_month - timedelta(days=1)
-            
-            # Get month summary
-            month_summary = calculate_financial_summary(month_start.date(), month_end.date())
+            year, month = divmod(today.year * 12 + today.month - 1 - i, 12)
+            months.append((year, month + 1))
+        
+        for (year, month), (month_summary, snapshot) in zip(months, get_monthly_summaries(months)):
+            month_start = datetime(year, month, 1)
             
             comparison_data.append({
                 'month': month_start.strftime('%Y-%m'),
@@ -149,7 +608,9 @@ def get_monthly_comparison():
                 'revenue': month_summary['total_revenue'],
                 'expenses': month_summary['total_expenses'],
                 'profit': month_summary['net_profit'],
-                'expected_revenue': month_summary['expected_revenue']
+                'expected_revenue': month_summary['expected_revenue'],
+                'closed': snapshot is not None,
+                'has_late_edits': bool(snapshot and snapshot.has_late_edits)
             })
         
         return jsonify({
@@ -166,232 +627,39 @@ def get_monthly_comparison():
 
 def calculate_financial_summary(start_date, end_date):
     """Calculate comprehensive financial summary for given period"""
-    
-    # Initialize summary
-    summary = {
-        'total_revenue': 0,
-        'total_expenses': 0,
-        'expected_revenue': 0,
-        'net_profit': 0,
-        'subscription_revenue': 0,
-        'project_revenue': 0,
-        'active_subscriptions': 0,
-        'completed_projects': 0,
-        'pending_payments': 0
-    }
-    
-    # Get subscription revenue
-    subscription_payments = SubscriptionPayment.query.filter(
-        SubscriptionPayment.payment_date >= start_date,
-        SubscriptionPayment.payment_date <= end_date,
-        SubscriptionPayment.status == 'completed'
-    ).all()
-    
-    subscription_revenue = sum(payment.amount for payment in subscription_payments)
-    summary['subscription_revenue'] = subscription_revenue
-    summary['total_revenue'] += subscription_revenue
-    
-    # Get project revenue (completed projects)
-    completed_projects = Project.query.filter(
-        Project.created_at >= datetime.combine(start_date, datetime.min.time()),
-        Project.created_at <= datetime.combine(end_date, datetime.max.time()),
-        Project.status == 'completed'
-    ).all()
-    
-    project_revenue = sum(project.budget or 0 for project in completed_projects)
-    summary['project_revenue'] = project_revenue
-    summary['total_revenue'] += project_revenue
-    summary['completed_projects'] = len(completed_projects)
-    
-    # Get expected revenue (active projects not yet completed)
-    active_projects = Project.query.filter(
-        Project.status.in_(['active', 'on_hold']),
-        Project.budget.isnot(None)
-    ).all()
-    
-    expected_revenue = sum(project.budget for project in active_projects)
-    summary['expected_revenue'] = expected_revenue
-    
-    # Get expenses
-    expenses = Expense.query.filter(
-        Expense.expense_date >= start_date,
-        Expense.expense_date <= end_date,
-        Expense.status == 'approved'
-    ).all()
-    
-    total_expenses = sum(expense.amount for expense in expenses)
-    summary['total_expenses'] = total_expenses
-    
-    # Calculate net profit
-    summary['net_profit'] = summary['total_revenue'] - summary['total_expenses']
-    
-    # Get active subscriptions count
-    summary['active_subscriptions'] = ClientSubscription.query.filter_by(status='active').count()
-    
-    # Get pending payments
-    pending_payments = SubscriptionPayment.query.filter_by(status='pending').all()
-    summary['pending_payments'] = sum(payment.amount for payment in pending_payments)
-    
+    summary, _ = get_financial_summary_for_period(start_date, end_date)
     return summary
 
-def get_financial_transactions(start_date=None, end_date=None, transaction_type=None):
-    """Get all financial transactions for the specified period"""
-    
-    transactions = []
-    
-    # Parse dates if provided
-    if start_date:
-        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-    if end_date:
-        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-    
-    # Get subscription payments (income)
-    if not transaction_type or transaction_type == 'income':
-        subscription_query = SubscriptionPayment.query.join(ClientSubscription).join(Client).join(Project)
-        
-        if start_date and end_date:
-            subscription_query = subscription_query.filter(
-                SubscriptionPayment.payment_date >= start_date,
-                SubscriptionPayment.payment_date <= end_date
-            )
-        
-        subscription_payments = subscription_query.all()
-        
-        for payment in subscription_payments:
-            transactions.append({
-                'id': f'sub_pay_{payment.id}',
-                'date': payment.payment_date.isoformat(),
-                'type': 'income',
-                'description': f'دفعة اشتراك - {payment.subscription.subscription_plan}',
-                'client': payment.subscription.client.display_name,
-                'project': payment.subscription.project.name,
-                'amount': float(payment.amount),
-                'status': 'paid' if payment.status == 'completed' else 'pending',
-                'source': 'subscription'
-            })
-    
-    # Get project revenue (income)
-    if not transaction_type or transaction_type == 'income':
-        project_query = Project.query.join(Client, Project.client_id == Client.id, isouter=True)
-        
-        if start_date and end_date:
-            project_query = project_query.filter(
-                Project.created_at >= datetime.combine(start_date, datetime.min.time()),
-                Project.created_at <= datetime.combine(end_date, datetime.max.time())
-            )
-        
-        projects = project_query.all()
-        
-        for project in projects:
-            if project.budget and project.budget > 0:
-                transactions.append({
-                    'id': f'project_{project.id}',
-                    'date': project.created_at.date().isoformat(),
-                    'type': 'income',
-                    'description': f'مشروع: {project.name}',
-                    'client': project.client.display_name if project.client else 'غير محدد',
-                    'project': project.name,
-                    'amount': float(project.budget),
-                    'status': 'paid' if project.status == 'completed' else 'expected',
-                    'source': 'project'
-                })
-    
-    # Get expenses
-    if not transaction_type or transaction_type == 'expense':
-        expense_query = Expense.query
-        
-        if start_date and end_date:
-            expense_query = expense_query.filter(
-                Expense.expense_date >= start_date,
-                Expense.expense_date <= end_date
-            )
-        
-        expenses = expense_query.all()
-        
-        for expense in expenses:
-            transactions.append({
-                'id': f'expense_{expense.id}',
-                'date': expense.expense_date.isoformat(),
-                'type': 'expense',
-                'description': expense.description,
-                'client': 'مصروف',
-                'project': expense.category or 'عام',
-                'amount': float(expense.amount),
-                'status': 'paid' if expense.status == 'approved' else 'pending',
-                'source': 'expense'
-            })
-    
-    # Sort by date (newest first)
-    transactions.sort(key=lambda x: x['date'], reverse=True)
-    
-    return transactions
+def get_export_params(data):
+    """Export parameters from a request body"""
+    if data.get('export_type') == 'clients':
+        return {'filters': data.get('filters') or {}}
+    return {
+        'start_date': data.get('start_date'),
+        'end_date': data.get('end_date'),
+        'type': data.get('type')
+    }
 
-def create_excel_report(transactions, start_date, end_date):
-    """Create Excel report with financial data"""
-    
-    # Create BytesIO buffer
-    excel_buffer = io.BytesIO()
-    
-    # Create workbook in memory
-    wb = xlsxwriter.Workbook(excel_buffer, {'in_memory': True})
-    ws = wb.add_worksheet("التقرير المالي")
-    
-    # Set up formats
-    header_format = wb.add_format({
-        'bold': True,
-        'font_color': 'white',
-        'bg_color': '#366092',
-        'align': 'center',
-        'valign': 'vcenter'
-    })
-    
-    # Add header
-    headers = ['التاريخ', 'النوع', 'الوصف', 'العميل', 'المشروع', 'المبلغ (ج.م)', 'الحالة']
-    
-    for col, header in enumerate(headers):
-        ws.write(0, col, header, header_format)
-    
-    # Add data
-    for row, transaction in enumerate(transactions, 1):
-        ws.write(row, 0, transaction['date'])
-        ws.write(row, 1, 'إيراد' if transaction['type'] == 'income' else 'مصروف')
-        ws.write(row, 2, transaction['description'])
-        ws.write(row, 3, transaction['client'])
-        ws.write(row, 4, transaction['project'])
-        ws.write(row, 5, transaction['amount'])
-        ws.write(row, 6, transaction['status'])
-    
-    # Auto-adjust column widths
-    for col in range(len(headers)):
-        max_length = len(headers[col])
-        for row, transaction in enumerate(transactions):
-            if col == 0:
-                cell_length = len(str(transaction['date']))
-            elif col == 1:
-                cell_length = len('إيراد' if transaction['type'] == 'income' else 'مصروف')
-            elif col == 2:
-                cell_length = len(str(transaction['description']))
-            elif col == 3:
-                cell_length = len(str(transaction['client']))
-            elif col == 4:
-                cell_length = len(str(transaction['project']))
-            elif col == 5:
-                cell_length = len(str(transaction['amount']))
-            elif col == 6:
-                cell_length = len(str(transaction['status']))
-            
-            if cell_length > max_length:
-                max_length = cell_length
-        
-        ws.set_column(col, col, max_length + 2)
-    
-    # Close workbook to save data
-    wb.close()
-    
-    # Seek to beginning of buffer
-    excel_buffer.seek(0)
-    
-    return excel_buffer
+def get_financial_transactions(start_date=None, end_date=None, transaction_type=None, status=None, source=None):
+    """Stream all financial transactions for the specified period (newest first)"""
+    return iter_transactions(
+        parse_report_date(start_date),
+        parse_report_date(end_date),
+        transaction_type,
+        status,
+        source
+    )
+
+def stream_transactions_json(transactions):
+    """Serialize a transaction stream as the JSON body of /transactions"""
+    yield '{"success": true, "transactions": ['
+    total = 0
+    for transaction in transactions:
+        if total:
+            yield ','
+        yield json.dumps(transaction, ensure_ascii=False)
+        total += 1
+    yield '], "total": %d}' % total
 
 def get_arabic_month_name(date):
     """Get Arabic month name"""
@@ -401,126 +669,3 @@ def get_arabic_month_name(date):
         9: 'سبتمبر', 10: 'أكتوبر', 11: 'نوفمبر', 12: 'ديسمبر'
     }
     return f"{arabic_months[date.month]} {date.year}" 
-
-def get_clients_for_export(filters):
-    """Get clients data for export"""
-    from models.client import Client
-    
-    query = Client.query
-    
-    # Apply filters
-    if filters.get('status'):
-        query = query.filter_by(status=filters['status'])
-    
-    if filters.get('type'):
-        query = query.filter_by(client_type=filters['type'])
-    
-    return query.order_by(Client.created_at.desc()).all()
-
-def create_clients_excel_report(clients):
-    """Create Excel report with clients data"""
-    
-    # Create BytesIO buffer
-    excel_buffer = io.BytesIO()
-    
-    # Create workbook in memory
-    wb = xlsxwriter.Workbook(excel_buffer, {'in_memory': True})
-    ws = wb.add_worksheet("العملاء")
-    
-    # Set up formats
-    header_format = wb.add_format({
-        'bold': True,
-        'font_color': 'white',
-        'bg_color': '#366092',
-        'align': 'center',
-        'valign': 'vcenter'
-    })
-    
-    # Add header
-    headers = [
-        'الرقم', 'اسم العميل', 'النوع', 'البريد الإلكتروني', 'الهاتف',
-        'المدينة', 'البلد', 'الحالة', 'القطاع', 'الأولوية', 'المصدر',
-        'تاريخ الإضافة', 'آخر تحديث'
-    ]
-    
-    for col, header in enumerate(headers):
-        ws.write(0, col, header, header_format)
-    
-    # Add data
-    for row, client in enumerate(clients, 1):
-        ws.write(row, 0, client.id)
-        ws.write(row, 1, client.display_name or 'غير محدد')
-        ws.write(row, 2, 'فرد' if client.client_type == 'individual' else 'شركة')
-        ws.write(row, 3, client.email or 'غير محدد')
-        ws.write(row, 4, client.phone or 'غير محدد')
-        ws.write(row, 5, client.city or 'غير محدد')
-        ws.write(row, 6, client.country or 'غير محدد')
-        ws.write(row, 7, get_status_text_arabic(client.status))
-        ws.write(row, 8, client.industry or 'غير محدد')
-        ws.write(row, 9, get_priority_text_arabic(client.priority))
-        ws.write(row, 10, client.source or 'غير محدد')
-        ws.write(row, 11, client.created_at.strftime('%Y-%m-%d') if client.created_at else 'غير محدد')
-        ws.write(row, 12, client.updated_at.strftime('%Y-%m-%d') if client.updated_at else 'غير محدد')
-    
-    # Auto-adjust column widths
-    for col in range(len(headers)):
-        max_length = len(headers[col])
-        for row, client in enumerate(clients):
-            if col == 0:
-                cell_length = len(str(client.id))
-            elif col == 1:
-                cell_length = len(client.display_name or 'غير محدد')
-            elif col == 2:
-                cell_length = len('فرد' if client.client_type == 'individual' else 'شركة')
-            elif col == 3:
-                cell_length = len(client.email or 'غير محدد')
-            elif col == 4:
-                cell_length = len(client.phone or 'غير محدد')
-            elif col == 5:
-                cell_length = len(client.city or 'غير محدد')
-            elif col == 6:
-                cell_length = len(client.country or 'غير محدد')
-            elif col == 7:
-                cell_length = len(get_status_text_arabic(client.status))
-            elif col == 8:
-                cell_length = len(client.industry or 'غير محدد')
-            elif col == 9:
-                cell_length = len(get_priority_text_arabic(client.priority))
-            elif col == 10:
-                cell_length = len(client.source or 'غير محدد')
-            elif col == 11:
-                cell_length = len(client.created_at.strftime('%Y-%m-%d') if client.created_at else 'غير محدد')
-            elif col == 12:
-                cell_length = len(client.updated_at.strftime('%Y-%m-%d') if client.updated_at else 'غير محدد')
-            
-            if cell_length > max_length:
-                max_length = cell_length
-        
-        ws.set_column(col, col, max_length + 2)
-    
-    # Close workbook to save data
-    wb.close()
-    
-    # Seek to beginning of buffer
-    excel_buffer.seek(0)
-    
-    return excel_buffer
-
-def get_status_text_arabic(status):
-    """Get Arabic status text"""
-    statuses = {
-        'active': 'نشط',
-        'inactive': 'غير نشط',
-        'potential': 'محتمل',
-        'targeted': 'سيتم استهدافه'
-    }
-    return statuses.get(status, 'غير محدد')
-
-def get_priority_text_arabic(priority):
-    """Get Arabic priority text"""
-    priorities = {
-        'low': 'منخفضة',
-        'medium': 'متوسطة',
-        'high': 'عالية'
-    }
-    return priorities.get(priority, 'غير محدد')
\ No newline at end of file
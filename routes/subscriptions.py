@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from extensions import db
@@ -6,6 +6,13 @@ from models.subscription import ClientSubscription, SubscriptionPayment
 from models.client import Client
 from models.project import Project
 from models.user import User
+from sqlalchemy import select, func, case
+from services.fanout import run_queries, one, rows
+from services.subscription_billing import run_subscription_billing
+from services.subscription_analytics import current_mrr_groups, get_subscription_analytics, get_subscription_cohorts
+from services.dashboard import FINANCIAL_ROLES
+from services.money import exact_sum, to_major
+from services.exchange_rates import convert_groups, rate_day, base_currency
 
 subscriptions_bp = Blueprint('subscriptions', __name__)
 
@@ -30,11 +37,14 @@ def get_subscriptions():
         if client_id:
             query = query.filter(ClientSubscription.client_id == client_id)
         
-        subscriptions = query.all()
-        
         # Filter overdue if requested
         if overdue_only:
-            subscriptions = [s for s in subscriptions if s.is_overdue]
+            query = query.filter(
+                ClientSubscription.status == 'active',
+                ClientSubscription.next_billing_date < datetime.now().date()
+            )
+        
+        subscriptions = query.all()
         
         return jsonify({
             'success': True,
@@ -369,27 +379,46 @@ def get_subscription_payments(subscription_id):
 def get_subscription_statistics():
     """Get subscription statistics"""
     try:
-        # Total subscriptions by status
-        active_count = ClientSubscription.query.filter_by(status='active').count()
-        paused_count = ClientSubscription.query.filter_by(status='paused').count()
-        cancelled_count = ClientSubscription.query.filter_by(status='cancelled').count()
-        
-        # Revenue calculations
-        active_subscriptions = ClientSubscription.query.filter_by(status='active').all()
-        monthly_revenue = sum(sub.monthly_revenue_projection for sub in active_subscriptions)
-        
-        # Overdue subscriptions
-        overdue_subscriptions = [sub for sub in active_subscriptions if sub.is_overdue]
-        overdue_count = len(overdue_subscriptions)
-        
-        # Trial subscriptions
-        trial_subscriptions = [sub for sub in active_subscriptions if sub.is_trial]
-        trial_count = len(trial_subscriptions)
-        
-        # Total revenue from all payments
-        total_revenue = db.session.query(db.func.sum(SubscriptionPayment.amount)).filter(
-            SubscriptionPayment.status == 'completed'
-        ).scalar() or 0
+        today = datetime.now().date()
+        active = ClientSubscription.status == 'active'
+        # Payments are converted to the base currency per currency and payment date
+        payment_rate_day = rate_day(SubscriptionPayment.currency, SubscriptionPayment.payment_date)
+
+        # Subscription counters and payment revenue run concurrently on separate connections
+        results, missing = run_queries({
+            'subscriptions': one(select(
+                # Total subscriptions by status
+                func.count(case((active, 1))).label('active'),
+                func.count(case((ClientSubscription.status == 'paused', 1))).label('paused'),
+                func.count(case((ClientSubscription.status == 'cancelled', 1))).label('cancelled'),
+                # Overdue and trial subscriptions
+                func.count(case((active & (ClientSubscription.next_billing_date < today), 1))).label('overdue'),
+                func.count(case((active & (ClientSubscription.trial_end_date >= today), 1))).label('trial')
+            )),
+            # Monthly recurring revenue (active, out of the trial and not ended) per currency
+            'monthly_revenue': rows(current_mrr_groups(today)),
+            # Total revenue from all payments
+            'total_revenue': rows(
+                select(
+                    SubscriptionPayment.currency,
+                    payment_rate_day,
+                    exact_sum(SubscriptionPayment.amount, SubscriptionPayment.currency)
+                )
+                .where(SubscriptionPayment.status == 'completed')
+                .group_by(SubscriptionPayment.currency, payment_rate_day)
+            )
+        })
+
+        subscriptions = results['subscriptions']
+        active_count = subscriptions.active if subscriptions else 0
+        paused_count = subscriptions.paused if subscriptions else 0
+        cancelled_count = subscriptions.cancelled if subscriptions else 0
+        trial_count = subscriptions.trial if subscriptions else 0
+        overdue_count = subscriptions.overdue if subscriptions else 0
+        monthly_revenue, _ = convert_groups(results['monthly_revenue'] or [], today)
+        monthly_revenue = to_major(monthly_revenue, base_currency())
+        total_revenue, _ = convert_groups(results['total_revenue'] or [])
+        total_revenue = to_major(total_revenue, base_currency())
         
         return jsonify({
             'success': True,
@@ -400,9 +429,11 @@ def get_subscription_statistics():
                 'cancelled_subscriptions': cancelled_count,
                 'trial_subscriptions': trial_count,
                 'overdue_subscriptions': overdue_count,
-                'monthly_revenue': float(monthly_revenue),
-                'total_revenue': float(total_revenue)
-            }
+                'monthly_revenue': monthly_revenue,
+                'total_revenue': total_revenue,
+                'currency': base_currency()
+            },
+            'partial': bool(missing)
         }), 200
         
     except Exception as e:
@@ -412,13 +443,75 @@ def get_subscription_statistics():
             'message': 'حدث خطأ في جلب إحصائيات الاشتراكات'
         }), 500
 
+@subscriptions_bp.route('/analytics', methods=['GET'])
+@jwt_required()
+def get_subscription_analytics_report():
+    """MRR, ARR, MRR movements and a 12 month projection"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user or user.role not in FINANCIAL_ROLES:
+            return jsonify({
+                'success': False,
+                'message': 'غير مصرح لك بعرض هذا التقرير'
+            }), 403
+        
+        months = min(max(request.args.get('months', 12, type=int), 1), 36)
+        analytics = get_subscription_analytics(
+            months=months,
+            timeout=current_app.config.get('SUBSCRIPTION_ANALYTICS_CACHE_TIMEOUT', 3600)
+        )
+        
+        return jsonify({
+            'success': True,
+            **analytics
+        }), 200
+        
+    except Exception as e:
+        print(f"❌ Error building subscription analytics: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في إنشاء تحليلات الاشتراكات'
+        }), 500
+
+@subscriptions_bp.route('/cohorts', methods=['GET'])
+@jwt_required()
+def get_subscription_cohorts_report():
+    """Retention of the subscriptions by start month"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user or user.role not in FINANCIAL_ROLES:
+            return jsonify({
+                'success': False,
+                'message': 'غير مصرح لك بعرض هذا التقرير'
+            }), 403
+        
+        months = min(max(request.args.get('months', 12, type=int), 1), 36)
+        cohorts = get_subscription_cohorts(
+            months=months,
+            timeout=current_app.config.get('SUBSCRIPTION_COHORTS_CACHE_TIMEOUT', 86400)
+        )
+        
+        return jsonify({
+            'success': True,
+            **cohorts
+        }), 200
+        
+    except Exception as e:
+        print(f"❌ Error building subscription cohorts: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في إنشاء تحليل الاحتفاظ بالاشتراكات'
+        }), 500
+
 @subscriptions_bp.route('/overdue', methods=['GET'])
 @jwt_required()
 def get_overdue_subscriptions():
     """Get overdue subscriptions"""
     try:
-        subscriptions = ClientSubscription.query.filter_by(status='active').all()
-        overdue_subscriptions = [sub for sub in subscriptions if sub.is_overdue]
+        overdue_subscriptions = ClientSubscription.query.filter(
+            ClientSubscription.status == 'active',
+            ClientSubscription.next_billing_date < datetime.now().date()
+        ).all()
         
         return jsonify({
             'success': True,
@@ -432,6 +525,42 @@ def get_overdue_subscriptions():
             'message': 'حدث خطأ في جلب الاشتراكات المتأخرة'
         }), 500
 
+@subscriptions_bp.route('/billing-run', methods=['POST'])
+@jwt_required()
+def create_subscription_billing_run():
+    """Expire, advance, flag overdue, pause and remind subscriptions for a day"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        if not user or user.role not in FINANCIAL_ROLES:
+            return jsonify({
+                'success': False,
+                'message': 'غير مصرح لك بتشغيل دورة الفوترة'
+            }), 403
+        
+        data = request.get_json(silent=True) or {}
+        run_date = datetime.strptime(data['run_date'], '%Y-%m-%d').date() if data.get('run_date') else None
+        
+        counts = run_subscription_billing(run_date)
+        
+        return jsonify({
+            'success': True,
+            'message': 'تم تشغيل دورة فوترة الاشتراكات بنجاح',
+            'counts': counts
+        }), 200
+        
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'تنسيق التاريخ غير صحيح'
+        }), 400
+    except Exception as e:
+        db.session.rollback()
+        print(f"❌ Error running subscription billing: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في تشغيل دورة فوترة الاشتراكات'
+        }), 500
+
 @subscriptions_bp.route('/projects/<int:project_id>/available-clients', methods=['GET'])
 @jwt_required()
 def get_available_clients_for_project(project_id):
@@ -6,6 +6,8 @@ from models.task import Task, TaskComment, TaskTimeLog, TaskAssignment, TaskStat
 from models.project import Project
 from models.employee import Employee
 from models.user import User
+from sqlalchemy import select, func, case
+from services.fanout import run_queries, one, rows
 
 tasks_bp = Blueprint('tasks', __name__)
 
@@ -537,29 +539,49 @@ def get_employee_tasks(employee_id):
 def get_task_statistics():
     """Get task statistics"""
     try:
-        # Overall statistics
-        total_tasks = Task.query.count()
-        pending_tasks = Task.query.filter(Task.status == TaskStatus.PENDING).count()
-        in_progress_tasks = Task.query.filter(Task.status == TaskStatus.IN_PROGRESS).count()
-        completed_tasks = Task.query.filter(Task.status == TaskStatus.COMPLETED).count()
-        overdue_tasks = len([task for task in Task.query.all() if task.is_overdue])
-        
-        # Priority distribution
-        high_priority = Task.query.filter(Task.priority == TaskPriority.HIGH).count()
-        medium_priority = Task.query.filter(Task.priority == TaskPriority.MEDIUM).count()
-        low_priority = Task.query.filter(Task.priority == TaskPriority.LOW).count()
-        urgent_priority = Task.query.filter(Task.priority == TaskPriority.URGENT).count()
-
-        # Employee workload
-        from sqlalchemy import func
-        employee_workload = db.session.query(
-            Employee.id,
-            Employee.first_name,
-            Employee.last_name,
-            func.count(Task.id).label('task_count')
-        ).join(Task, Employee.id == Task.assignee_id)\
-         .group_by(Employee.id, Employee.first_name, Employee.last_name)\
-         .all()
+        today = datetime.now().date()
+
+        def count_where(condition):
+            return func.count(case((condition, 1)))
+
+        # Counters and workload run concurrently on separate connections
+        results, missing = run_queries({
+            'counts': one(select(
+                # Overall statistics
+                func.count(Task.id).label('total'),
+                count_where(Task.status == TaskStatus.PENDING).label('pending'),
+                count_where(Task.status == TaskStatus.IN_PROGRESS).label('in_progress'),
+                count_where(Task.status == TaskStatus.COMPLETED).label('completed'),
+                count_where((Task.status != TaskStatus.COMPLETED) & (Task.due_date < today)).label('overdue'),
+                # Priority distribution
+                count_where(Task.priority == TaskPriority.HIGH).label('high'),
+                count_where(Task.priority == TaskPriority.MEDIUM).label('medium'),
+                count_where(Task.priority == TaskPriority.LOW).label('low'),
+                count_where(Task.priority == TaskPriority.URGENT).label('urgent')
+            )),
+            # Employee workload
+            'employee_workload': rows(
+                select(
+                    Employee.id,
+                    Employee.first_name,
+                    Employee.last_name,
+                    func.count(Task.id).label('task_count')
+                ).join(Task, Employee.id == Task.assignee_id)
+                .group_by(Employee.id, Employee.first_name, Employee.last_name)
+            )
+        }, defaults={'employee_workload': []})
+
+        counts = results['counts']
+        total_tasks = counts.total if counts else 0
+        pending_tasks = counts.pending if counts else 0
+        in_progress_tasks = counts.in_progress if counts else 0
+        completed_tasks = counts.completed if counts else 0
+        overdue_tasks = counts.overdue if counts else 0
+        urgent_priority = counts.urgent if counts else 0
+        high_priority = counts.high if counts else 0
+        medium_priority = counts.medium if counts else 0
+        low_priority = counts.low if counts else 0
+        employee_workload = results['employee_workload']
 
         workload_data = []
         for emp_id, first_name, last_name, task_count in employee_workload:
@@ -587,7 +609,8 @@ def get_task_statistics():
 
         return jsonify({
             'success': True,
-            'statistics': statistics
+            'statistics': statistics,
+            'partial': bool(missing)
         }), 200
 
     except Exception as e:
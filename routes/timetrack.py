@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
+from datetime import datetime, timedelta
 from extensions import db
 from models.timetrack import TimeTrack
+from services.time_facts import get_project_hours, get_monthly_hours
 
 timetrack_bp = Blueprint('timetrack', __name__)
 
@@ -21,4 +23,62 @@ def get_time_tracks():
         return jsonify({
             'success': False,
             'message': 'حدث خطأ في جلب سجلات الوقت'
+        }), 500
+
+def get_date_range(default_days=30):
+    """start_date/end_date query parameters, defaulting to the last days"""
+    end_date = request.args.get('end_date')
+    start_date = request.args.get('start_date')
+    end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else datetime.now().date()
+    start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else end_date - timedelta(days=default_days - 1)
+    if start_date > end_date:
+        raise ValueError('start_date is after end_date')
+    return start_date, end_date
+
+@timetrack_bp.route('/project-hours', methods=['GET'])
+@jwt_required()
+def get_hours_per_project():
+    """Hours per project and week, day or month"""
+    try:
+        start_date, end_date = get_date_range(default_days=84)
+        period = request.args.get('period', 'week')
+        if period not in ('day', 'week', 'month'):
+            raise ValueError(period)
+        
+        return jsonify({
+            'success': True,
+            'period': period,
+            'hours': get_project_hours(start_date, end_date, period, request.args.get('project_id', type=int))
+        })
+        
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'message': 'معاملات غير صحيحة'
+        }), 400
+    except Exception as e:
+        print(f"❌ Error getting project hours: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في جلب ساعات المشاريع'
+        }), 500
+
+@timetrack_bp.route('/monthly-hours', methods=['GET'])
+@jwt_required()
+def get_hours_per_month():
+    """Hours per employee and month of a year"""
+    try:
+        year = request.args.get('year', datetime.now().year, type=int)
+        
+        return jsonify({
+            'success': True,
+            'year': year,
+            'hours': get_monthly_hours(year, request.args.get('employee_id', type=int))
+        })
+        
+    except Exception as e:
+        print(f"❌ Error getting monthly hours: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': 'حدث خطأ في جلب الساعات الشهرية'
         }), 500 
\ No newline at end of file
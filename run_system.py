@@ -48,21 +48,24 @@ def run_system():
     try:
         # محاولة عرض الإحصائيات السريعة
         from app import create_app
-        from models import ClientSubscription, Project
-        from sqlalchemy import func
+        from extensions import db
+        from models import Project
+        from services.subscription_analytics import current_mrr_groups
+        from services.exchange_rates import convert_groups, base_currency
+        from services.money import to_major
         
         app = create_app()
         with app.app_context():
             # الإيرادات الشهرية
-            monthly_revenue = db.session.query(
-                func.sum(ClientSubscription.monthly_amount)
-            ).filter(ClientSubscription.status == 'active').scalar() or 0
+            today = datetime.now().date()
+            monthly_revenue, _ = convert_groups(db.session.execute(current_mrr_groups(today)).all(), today)
+            monthly_revenue = to_major(monthly_revenue, base_currency())
             
             # عدد المشاريع
             total_projects = Project.query.count()
             subscription_projects = Project.query.filter_by(project_type='subscription').count()
             
-            print(f"💵 الإيرادات الشهرية: {float(monthly_revenue):,.2f} ج.م")
+            print(f"💵 الإيرادات الشهرية: {monthly_revenue:,.2f} {base_currency()}")
             print(f"📊 إجمالي المشاريع: {total_projects}")
             print(f"🔄 مشاريع الاشتراك: {subscription_projects}")
             
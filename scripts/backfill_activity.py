@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from extensions import db
+from services.activity import backfill_activity_events
+
+def backfill():
+    """Fill the activity feed from existing projects, subscriptions, payments and tasks"""
+    app = create_app()
+    
+    with app.app_context():
+        db.create_all()
+        created = backfill_activity_events()
+        
+        if created:
+            print(f'Created {created} activity events')
+        else:
+            print('Activity feed already has events, nothing to do')
+
+if __name__ == '__main__':
+    backfill()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+from statistics import median
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from models.user import User
+
+ENDPOINTS = [
+    '/api/v1/dashboard/stats',
+    '/api/v1/projects/statistics',
+    '/api/v1/employees/statistics',
+    '/api/v1/subscriptions/statistics',
+    '/api/v1/tasks/statistics'
+]
+
+def benchmark(iterations=20):
+    """Compare sequential and concurrent statistics queries on the configured database.
+
+    Point DATABASE_URL at PostgreSQL or SQLite before running.
+    """
+    app = create_app()
+    client = app.test_client()
+
+    with app.app_context():
+        user = User.query.filter_by(role='admin').first()
+        if not user:
+            print('No admin user found, run scripts/create_admin.py first')
+            return
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+
+    workers = app.config.get('FANOUT_WORKERS') or 4
+    print(f"Database: {app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1]}")
+    print(f"{'endpoint':40} {'sequential':>12} {'concurrent':>12}")
+
+    for endpoint in ENDPOINTS:
+        timings = {}
+        for mode, fanout_workers in (('sequential', 0), ('concurrent', workers)):
+            app.config['FANOUT_WORKERS'] = fanout_workers
+            client.get(endpoint, headers=headers)  # warm up
+            samples = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                response = client.get(endpoint, headers=headers)
+                samples.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    print(f'{endpoint} returned {response.status_code}')
+                    break
+            timings[mode] = median(samples)
+        print(f"{endpoint:40} {timings['sequential']:>10.1f}ms {timings['concurrent']:>10.1f}ms")
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from models.user import User
+from services.billing import run_billing
+
+def billing_run(start_date, end_date, dry_run=False):
+    """Invoice unbilled billable time and expenses (usage: billing_run.py START END [--dry-run] as YYYY-MM-DD)"""
+    app = create_app()
+    
+    with app.app_context():
+        admin = User.query.filter_by(role='admin').order_by(User.id).first()
+        if not admin:
+            print('❌ No admin user to create the invoices as')
+            return
+        
+        result = run_billing(
+            start_date, end_date, admin.id,
+            tax_rate=app.config.get('INVOICE_TAX_RATE', 15),
+            dry_run=dry_run
+        )
+        print(f"{'Would create' if dry_run else 'Created'} {result['invoice_count']} invoices "
+              f"for {result['total_amount']} ({result['time_entries']} time entries, {result['expenses']} expenses)")
+        if result['skipped']:
+            print(f"Skipped {len(result['skipped'])} projects")
+
+if __name__ == '__main__':
+    dates = [datetime.strptime(value, '%Y-%m-%d').date() for value in sys.argv[1:3]]
+    billing_run(*dates, dry_run='--dry-run' in sys.argv)
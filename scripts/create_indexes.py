@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from sqlalchemy.schema import CreateColumn
+from extensions import db
+from services.time_facts import backfill_time_facts
+
+def add_columns(table):
+    """Add nullable columns declared on a model that its existing table is missing"""
+    existing = {column['name'] for column in db.inspect(db.engine).get_columns(table.name)}
+    added = 0
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        if not column.nullable:
+            print(f'Skipped {table.name}.{column.name} (not nullable)')
+            continue
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql(
+                f'ALTER TABLE {table.name} ADD COLUMN {CreateColumn(column).compile(dialect=db.engine.dialect)}'
+            )
+        print(f'Added {table.name}.{column.name}')
+        added += 1
+    return added
+
+def create_indexes():
+    """Create columns and indexes declared on the models that existing tables are missing.
+
+    db.create_all() only creates new tables, so nullable columns and indexes
+    added to existing models have to be created separately.
+    """
+    app = create_app()
+    
+    with app.app_context():
+        created = 0
+        for table in db.metadata.sorted_tables:
+            if not db.inspect(db.engine).has_table(table.name):
+                continue
+            add_columns(table)
+            existing = {index['name'] for index in db.inspect(db.engine).get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(db.engine)
+                    print(f'Created {index.name}')
+                    created += 1
+        print(f'Created {created} indexes')
+        
+        # The daily time facts table is new to databases that predate it
+        written = backfill_time_facts()
+        if written:
+            print(f'Built {written} daily time fact rows')
+
+if __name__ == '__main__':
+    create_indexes()
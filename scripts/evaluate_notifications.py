@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.notifications import evaluate_notifications, run_notification_evaluator
+
+def evaluate():
+    """Generate pending notifications once (for cron when the in-process evaluator is disabled)"""
+    app = create_app()
+    
+    with app.app_context():
+        created = evaluate_notifications()
+        print(f'Created {created} notifications')
+
+def evaluate_forever():
+    """Generate notifications every NOTIFICATION_EVALUATOR_INTERVAL seconds (one process per deployment)"""
+    app = create_app()
+    print(f"Evaluating notifications every {app.config['NOTIFICATION_EVALUATOR_INTERVAL']} seconds")
+    run_notification_evaluator(app)
+
+if __name__ == '__main__':
+    if '--loop' in sys.argv[1:]:
+        evaluate_forever()
+    else:
+        evaluate()
@@ -20,6 +20,7 @@ from models.user import User
 from models.employee import Employee
 from models.client import Client
 from models.project import Project
+from services.time_facts import backfill_time_facts
 
 # Setup logging
 logging.basicConfig(
@@ -48,6 +49,11 @@ def init_database():
             db.create_all()
             logger.info("✅ Database tables created successfully")
             
+            # Fill the daily time facts of databases that predate them
+            written = backfill_time_facts()
+            if written:
+                logger.info(f"⏱️ Built {written} daily time fact rows")
+            
             # Create default admin user
             create_default_admin()
             
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.time_facts import rebuild_time_facts
+
+def rebuild(start_date=None, end_date=None):
+    """Recompute the daily time facts (usage: rebuild_time_facts.py [START END] as YYYY-MM-DD)"""
+    app = create_app()
+    
+    with app.app_context():
+        written = rebuild_time_facts(start_date, end_date)
+        print(f'Wrote {written} daily rows')
+
+if __name__ == '__main__':
+    dates = [datetime.strptime(value, '%Y-%m-%d').date() for value in sys.argv[1:3]]
+    rebuild(*dates)
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+from datetime import datetime
+
+# Add parent directory to path to import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.subscription_billing import run_subscription_billing
+
+def run(run_date=None):
+    """Run the daily subscription billing (usage: run_subscription_billing.py [YYYY-MM-DD], for cron)"""
+    app = create_app()
+    
+    with app.app_context():
+        counts = run_subscription_billing(run_date)
+        print(', '.join(f'{name}: {count}' for name, count in counts.items()))
+
+if __name__ == '__main__':
+    run(datetime.strptime(sys.argv[1], '%Y-%m-%d').date() if len(sys.argv) > 1 else None)
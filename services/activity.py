@@ -0,0 +1,227 @@
+import base64
+from datetime import datetime
+from flask import has_request_context
+from sqlalchemy import event, select, insert, inspect, and_, or_
+from sqlalchemy.orm import object_session
+from extensions import db
+from models.activity_event import ActivityEvent
+from models.project import Project
+from models.client import Client
+from models.subscription import ClientSubscription, SubscriptionPayment
+from models.task import Task, TaskStatus
+from services.ledger import InvalidCursor
+from services.events import queue_event
+
+# Icon and color of each event type in the activity list
+EVENT_STYLES = {
+    'project_created': ('fas fa-project-diagram', 'primary'),
+    'subscription_created': ('fas fa-sync-alt', 'success'),
+    'payment_received': ('fas fa-money-bill', 'info'),
+    'task_completed': ('fas fa-check-circle', 'success')
+}
+
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def _current_user_id():
+    """Id of the authenticated user, if the write happens inside a request"""
+    if not has_request_context():
+        return None
+    try:
+        from flask_jwt_extended import get_jwt_identity
+        identity = get_jwt_identity()
+        return int(identity) if identity else None
+    except Exception:
+        return None
+
+
+def _record(connection, target, event_type, entity_type, title, description=None, amount=None):
+    """Append an event on the connection of the current flush.
+
+    The event is also queued on the session so it is pushed to live
+    dashboards once the transaction commits.
+    """
+    values = {
+        'event_type': event_type,
+        'entity_type': entity_type,
+        'entity_id': target.id,
+        'title': title[:300],
+        'description': description[:500] if description else None,
+        'amount': amount,
+        'user_id': _current_user_id(),
+        'created_at': datetime.utcnow()
+    }
+    result = connection.execute(insert(ActivityEvent.__table__).values(**values))
+
+    session = object_session(target)
+    if session is not None:
+        activity = event_to_activity(ActivityEvent(id=result.inserted_primary_key[0], **values))
+        queue_event(session, {'type': 'activity', 'activity': activity})
+
+
+def _subscription_names(connection, subscription_id):
+    """Client and project names of a subscription"""
+    row = connection.execute(
+        select(Client.display_name.label('client'), Project.name.label('project'))
+        .select_from(ClientSubscription)
+        .join(Client, ClientSubscription.client_id == Client.id)
+        .join(Project, ClientSubscription.project_id == Project.id)
+        .where(ClientSubscription.id == subscription_id)
+    ).first()
+    return (row.client, row.project) if row else ('غير محدد', 'غير محدد')
+
+
+def _project_created_text(name, project_type, category):
+    return f'تم إنشاء مشروع جديد: {name}', f'مشروع {project_type} في فئة {category}'
+
+
+def _subscription_created_text(client, project, monthly_price):
+    return f'اشتراك جديد: {client}', f'اشتراك في {project} بقيمة {float(monthly_price or 0)} ج.م شهرياً'
+
+
+def _payment_received_text(client, project, amount):
+    return f'تم استلام دفعة من {client}', f'مبلغ {float(amount or 0)} ج.م لاشتراك {project}'
+
+
+def _task_completed_text(title):
+    return f'تم إكمال مهمة: {title}', None
+
+
+@event.listens_for(Project, 'after_insert')
+def _project_created(mapper, connection, target):
+    title, description = _project_created_text(target.name, target.project_type, target.category)
+    _record(connection, target, 'project_created', 'project', title, description)
+
+
+@event.listens_for(ClientSubscription, 'after_insert')
+def _subscription_created(mapper, connection, target):
+    client, project = _subscription_names(connection, target.id)
+    title, description = _subscription_created_text(client, project, target.monthly_price)
+    _record(connection, target, 'subscription_created', 'subscription', title, description,
+            amount=target.monthly_price)
+
+
+def _payment_received(connection, target):
+    client, project = _subscription_names(connection, target.subscription_id)
+    title, description = _payment_received_text(client, project, target.amount)
+    _record(connection, target, 'payment_received', 'payment', title, description,
+            amount=target.amount)
+
+
+@event.listens_for(SubscriptionPayment, 'after_insert')
+def _payment_inserted(mapper, connection, target):
+    if target.status == 'completed':
+        _payment_received(connection, target)
+
+
+@event.listens_for(SubscriptionPayment, 'after_update')
+def _payment_updated(mapper, connection, target):
+    history = inspect(target).attrs.status.history
+    if history.has_changes() and target.status == 'completed':
+        _payment_received(connection, target)
+
+
+@event.listens_for(Task, 'after_update')
+def _task_updated(mapper, connection, target):
+    history = inspect(target).attrs.status.history
+    if history.has_changes() and target.status == TaskStatus.COMPLETED \
+            and TaskStatus.COMPLETED not in history.deleted:
+        title, description = _task_completed_text(target.title)
+        _record(connection, target, 'task_completed', 'task', title, description)
+
+
+def encode_cursor(created_at, event_id):
+    """Opaque cursor pointing after the given event"""
+    raw = f"{created_at.isoformat()}|{event_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, event_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(event_id)
+    except (ValueError, UnicodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def event_to_activity(activity_event):
+    """Activity dict in the format of the dashboard's activity list"""
+    data = activity_event.to_dict()
+    data['icon'], data['color'] = EVENT_STYLES.get(activity_event.event_type, ('fas fa-info-circle', 'secondary'))
+    return data
+
+
+def get_activity_feed(limit=20, cursor=None):
+    """Newest events first as (activities, next_cursor), one indexed top-N read"""
+    query = select(ActivityEvent).order_by(ActivityEvent.created_at.desc(), ActivityEvent.id.desc())
+
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        query = query.where(or_(
+            ActivityEvent.created_at < cursor_created_at,
+            and_(ActivityEvent.created_at == cursor_created_at, ActivityEvent.id < cursor_id)
+        ))
+
+    events = db.session.execute(query.limit(limit + 1)).scalars().all()
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    next_cursor = None
+    if has_more and events:
+        next_cursor = encode_cursor(events[-1].created_at, events[-1].id)
+
+    return [event_to_activity(e) for e in events], next_cursor
+
+
+def backfill_activity_events():
+    """Create events for rows written before the feed existed.
+
+    Only runs on an empty table so it can be called safely more than once.
+    Returns the number of events created.
+    """
+    if db.session.execute(select(ActivityEvent.id).limit(1)).first():
+        return 0
+
+    sources = [
+        (
+            select(Project.id, Project.name, Project.project_type, Project.category, Project.created_at),
+            lambda r: ('project_created', 'project', r.id, *_project_created_text(r.name, r.project_type, r.category), None, r.created_at)
+        ),
+        (
+            select(ClientSubscription.id, Client.display_name.label('client'), Project.name.label('project'),
+                   ClientSubscription.monthly_price, ClientSubscription.created_at)
+            .join(Client, ClientSubscription.client_id == Client.id)
+            .join(Project, ClientSubscription.project_id == Project.id),
+            lambda r: ('subscription_created', 'subscription', r.id, *_subscription_created_text(r.client, r.project, r.monthly_price), r.monthly_price, r.created_at)
+        ),
+        (
+            select(SubscriptionPayment.id, Client.display_name.label('client'), Project.name.label('project'),
+                   SubscriptionPayment.amount, SubscriptionPayment.payment_date, SubscriptionPayment.created_at)
+            .join(ClientSubscription, SubscriptionPayment.subscription_id == ClientSubscription.id)
+            .join(Client, ClientSubscription.client_id == Client.id)
+            .join(Project, ClientSubscription.project_id == Project.id)
+            .where(SubscriptionPayment.status == 'completed'),
+            lambda r: ('payment_received', 'payment', r.id, *_payment_received_text(r.client, r.project, r.amount), r.amount,
+                       datetime.combine(r.payment_date, datetime.min.time()) if r.payment_date else r.created_at)
+        ),
+        (
+            select(Task.id, Task.title, Task.completed_date, Task.updated_at)
+            .where(Task.status == TaskStatus.COMPLETED),
+            lambda r: ('task_completed', 'task', r.id, *_task_completed_text(r.title), None, r.completed_date or r.updated_at)
+        )
+    ]
+
+    keys = ('event_type', 'entity_type', 'entity_id', 'title', 'description', 'amount', 'created_at')
+    total = 0
+    for query, to_event in sources:
+        result = db.session.execute(query.execution_options(yield_per=BACKFILL_CHUNK_SIZE))
+        for rows in result.partitions():
+            values = [dict(zip(keys, to_event(row))) for row in rows]
+            for value in values:
+                value['created_at'] = value['created_at'] or datetime.utcnow()
+            db.session.execute(insert(ActivityEvent.__table__), values)
+            total += len(values)
+
+    db.session.commit()
+    return total
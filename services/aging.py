@@ -0,0 +1,188 @@
+from datetime import date, timedelta
+from sqlalchemy import select, func, case, and_
+from extensions import db
+from models.invoice import Invoice
+from models.client import Client
+from services.money import minor_units, to_major, sum_by_currency, DEFAULT_CURRENCY
+from services.exchange_rates import convert_groups, base_currency
+
+# Issued invoices that can still be collected
+RECEIVABLE_STATUSES = ('sent', 'overdue')
+
+# (bucket, lowest and highest days past due); None is open ended
+AGING_BUCKETS = (
+    ('current', None, 0),
+    ('1_30', 1, 30),
+    ('31_60', 31, 60),
+    ('61_90', 61, 90),
+    ('90_plus', 91, None)
+)
+
+
+class InvalidAgingBucket(ValueError):
+    """Raised for a bucket name that is not in AGING_BUCKETS"""
+
+
+def _balance():
+    return Invoice.total_amount - func.coalesce(Invoice.paid_amount, 0)
+
+
+def _receivable():
+    return and_(Invoice.status.in_(RECEIVABLE_STATUSES), _balance() > 0)
+
+
+def _in_bucket(low, high, today):
+    """Due date criterion of a bucket, compared with dates so it works on every database"""
+    criteria = []
+    if low is not None:
+        criteria.append(Invoice.due_date <= today - timedelta(days=low))
+    if high is not None:
+        criteria.append(Invoice.due_date >= today - timedelta(days=high))
+    return and_(*criteria)
+
+
+def _bucket_sums(today):
+    balance = minor_units(_balance(), Invoice.currency)
+    return [
+        func.coalesce(func.sum(case((_in_bucket(low, high, today), balance), else_=0)), 0).label(bucket)
+        for bucket, low, high in AGING_BUCKETS
+    ]
+
+
+def compute_aging(today=None, client_id=None):
+    """Receivables of every client split into aging buckets by days past due.
+
+    One GROUP BY over the open invoices, each bucket a CASE sum in exact
+    minor units, served by the (status, due_date) index. Clients invoiced in
+    several currencies get a row per currency. Returns the clients, largest
+    balance first, the company totals of every currency and their sum in the
+    base currency at today's rates. `client_id` limits it to one client.
+    """
+    today = today or date.today()
+    criteria = [_receivable()]
+    if client_id:
+        criteria.append(Invoice.client_id == client_id)
+    rows = db.session.execute(
+        select(
+            Invoice.client_id,
+            Client.name,
+            Invoice.currency,
+            func.count(Invoice.id).label('invoices'),
+            func.min(Invoice.due_date).label('oldest_due_date'),
+            *_bucket_sums(today)
+        )
+        .outerjoin(Client, Client.id == Invoice.client_id)
+        .where(*criteria)
+        .group_by(Invoice.client_id, Client.name, Invoice.currency)
+    ).all()
+
+    buckets = [bucket for bucket, _, _ in AGING_BUCKETS]
+    currencies = [row.currency or DEFAULT_CURRENCY for row in rows]
+    minor = {bucket: [int(getattr(row, bucket)) for row in rows] for bucket in buckets}
+
+    clients = []
+    for i, row in enumerate(rows):
+        total = sum(minor[bucket][i] for bucket in buckets)
+        clients.append({
+            'client_id': row.client_id,
+            'client_name': row.name,
+            'currency': currencies[i],
+            'invoices': row.invoices,
+            'oldest_due_date': row.oldest_due_date.isoformat() if row.oldest_due_date else None,
+            **{bucket: to_major(minor[bucket][i], currencies[i]) for bucket in buckets},
+            'overdue': to_major(total - minor['current'][i], currencies[i]),
+            'total': to_major(total, currencies[i])
+        })
+    clients.sort(key=lambda client: client['total'], reverse=True)
+
+    totals = {}
+    for bucket in buckets:
+        for currency, amount in sum_by_currency(currencies, minor[bucket]).items():
+            totals.setdefault(currency, {})[bucket] = amount
+
+    # Converted once per currency and bucket
+    base = base_currency()
+    base_totals = {'currency': base}
+    missing_rates = set()
+    for bucket in buckets:
+        amount, unconverted = convert_groups(
+            [(currency, today, amounts[bucket]) for currency, amounts in totals.items()], today
+        )
+        base_totals[bucket] = amount
+        missing_rates.update(unconverted)
+    base_totals['total'] = sum(base_totals[bucket] for bucket in buckets)
+    base_totals['overdue'] = base_totals['total'] - base_totals['current']
+    base_totals.update({field: to_major(base_totals[field], base) for field in buckets + ['total', 'overdue']})
+    base_totals['missing_rates'] = sorted(missing_rates)
+
+    for currency, amounts in totals.items():
+        amounts['total'] = sum(amounts.values())
+        amounts['overdue'] = amounts['total'] - amounts['current']
+        totals[currency] = {field: to_major(amount, currency) for field, amount in amounts.items()}
+        totals[currency]['invoices'] = sum(client['invoices'] for client in clients if client['currency'] == currency)
+        totals[currency]['clients'] = sum(1 for client in clients if client['currency'] == currency)
+
+    return {
+        'as_of': today.isoformat(),
+        'buckets': buckets,
+        'totals': totals,
+        'base_totals': base_totals,
+        'clients': clients
+    }
+
+
+def get_aging_invoices(today=None, client_id=None, bucket=None, page=1, per_page=50):
+    """One page of the open invoices behind an aging figure, oldest due date first"""
+    today = today or date.today()
+    criteria = [_receivable()]
+    if client_id:
+        criteria.append(Invoice.client_id == client_id)
+    if bucket:
+        bounds = {name: (low, high) for name, low, high in AGING_BUCKETS}
+        if bucket not in bounds:
+            raise InvalidAgingBucket(f'Unknown aging bucket: {bucket}')
+        criteria.append(_in_bucket(*bounds[bucket], today))
+
+    page_rows = (
+        Invoice.query
+        .with_entities(
+            Invoice.id,
+            Invoice.invoice_number,
+            Invoice.title,
+            Invoice.client_id,
+            Client.name,
+            Invoice.project_id,
+            Invoice.status,
+            Invoice.issue_date,
+            Invoice.due_date,
+            Invoice.total_amount,
+            Invoice.paid_amount,
+            Invoice.currency
+        )
+        .outerjoin(Client, Client.id == Invoice.client_id)
+        .filter(*criteria)
+        .order_by(Invoice.due_date, Invoice.id)
+        .paginate(page=page, per_page=per_page, error_out=False)
+    )
+
+    invoices = []
+    for row in page_rows.items:
+        days_overdue = max((today - row.due_date).days, 0)
+        invoices.append({
+            'id': row.id,
+            'invoice_number': row.invoice_number,
+            'title': row.title,
+            'client_id': row.client_id,
+            'client_name': row.name,
+            'project_id': row.project_id,
+            'status': row.status,
+            'issue_date': row.issue_date.isoformat() if row.issue_date else None,
+            'due_date': row.due_date.isoformat(),
+            'total_amount': float(row.total_amount),
+            'paid_amount': float(row.paid_amount or 0),
+            'outstanding_amount': float(row.total_amount - (row.paid_amount or 0)),
+            'currency': row.currency,
+            'days_overdue': days_overdue,
+            'bucket': next(name for name, low, high in AGING_BUCKETS if high is None or days_overdue <= high)
+        })
+    return invoices, page_rows
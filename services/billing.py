@@ -0,0 +1,293 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, func, bindparam
+from extensions import db
+from models.invoice import Invoice
+from models.timetrack import TimeTrack
+from models.expense import Expense
+from models.project import Project
+from models.client import Client
+from models.employee import Employee
+from services.numbering import next_numbers
+
+BILLABLE_TIME_STATUS = 'approved'
+BILLABLE_EXPENSE_STATUSES = ('approved', 'reimbursed')
+
+# Rows per IN (...) lookup
+CHUNK_SIZE = 500
+
+
+class BillingRunError(ValueError):
+    """Raised for a billing run that cannot be performed"""
+
+
+class BillingRunConflict(RuntimeError):
+    """Raised when source rows were billed or changed by another transaction during the run"""
+
+
+def _chunks(values, size=CHUNK_SIZE):
+    values = list(values)
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def _time_criteria(start_date, end_date, last_id, project_ids=None):
+    """Unbilled billable time of the period, up to the last entry seen by the run"""
+    criteria = [
+        TimeTrack.is_billable.isnot(False),
+        TimeTrack.invoice_id.is_(None),
+        TimeTrack.status == BILLABLE_TIME_STATUS,
+        TimeTrack.date >= start_date,
+        TimeTrack.date <= end_date,
+        TimeTrack.id <= last_id
+    ]
+    if project_ids:
+        criteria.append(TimeTrack.project_id.in_(project_ids))
+    return criteria
+
+
+def _expense_criteria(start_date, end_date, last_id, project_ids=None):
+    """Unbilled expenses of the period that are billable to the client"""
+    criteria = [
+        Expense.is_billable_to_client.is_(True),
+        Expense.invoice_id.is_(None),
+        Expense.project_id.isnot(None),
+        Expense.status.in_(BILLABLE_EXPENSE_STATUSES),
+        Expense.expense_date >= start_date,
+        Expense.expense_date <= end_date,
+        Expense.id <= last_id
+    ]
+    if project_ids:
+        criteria.append(Expense.project_id.in_(project_ids))
+    return criteria
+
+
+def _load_lines(start_date, end_date, last_time_id, last_expense_id, project_ids):
+    """Time and expense line items per project, from two bulk queries.
+
+    Time entries are loaded one by one and summed per employee here, so the
+    hours on the invoice and the entry ids marked as billed come from the
+    same statement.
+    """
+    lines = defaultdict(lambda: {'time': {}, 'time_ids': [], 'expenses': []})
+
+    time_rows = db.session.execute(
+        select(
+            TimeTrack.id,
+            TimeTrack.project_id,
+            TimeTrack.employee_id,
+            TimeTrack.hours,
+            Employee.first_name,
+            Employee.last_name,
+            Employee.hourly_rate
+        )
+        .outerjoin(Employee, TimeTrack.employee_id == Employee.id)
+        .where(*_time_criteria(start_date, end_date, last_time_id, project_ids))
+    ).all()
+    for row in time_rows:
+        project_lines = lines[row.project_id]
+        project_lines['time_ids'].append(row.id)
+        employee = project_lines['time'].setdefault(row.employee_id, {
+            'first_name': row.first_name,
+            'last_name': row.last_name,
+            'hourly_rate': row.hourly_rate,
+            'hours': 0
+        })
+        employee['hours'] += float(row.hours or 0)
+
+    expense_rows = db.session.execute(
+        select(Expense.id, Expense.project_id, Expense.title, Expense.amount)
+        .where(*_expense_criteria(start_date, end_date, last_expense_id, project_ids))
+        .order_by(Expense.expense_date, Expense.id)
+    ).all()
+    for row in expense_rows:
+        lines[row.project_id]['expenses'].append(row)
+
+    return lines
+
+
+def _load_projects(project_ids):
+    """Rate and client billing terms of the projects, in chunks"""
+    projects = {}
+    for chunk in _chunks(project_ids):
+        for row in db.session.execute(
+            select(
+                Project.id, Project.name, Project.hourly_rate, Project.client_id,
+                Client.payment_terms, Client.currency
+            )
+            .outerjoin(Client, Project.client_id == Client.id)
+            .where(Project.id.in_(chunk))
+        ).all():
+            projects[row.id] = row
+    return projects
+
+
+def _build_items(project, project_lines):
+    """Invoice items of a project: one per employee, then one per expense"""
+    items = []
+    employees = project_lines['time'].values()
+    for row in sorted(employees, key=lambda row: (row['first_name'] or '', row['last_name'] or '')):
+        hours = round(row['hours'], 2)
+        rate = float(project.hourly_rate or row['hourly_rate'] or 0)
+        name = f"{row['first_name']} {row['last_name']}" if row['first_name'] else 'غير محدد'
+        items.append({
+            'description': f'ساعات عمل - {name}',
+            'quantity': hours,
+            'rate': rate,
+            'amount': round(hours * rate, 2)
+        })
+    for row in project_lines['expenses']:
+        amount = float(row.amount or 0)
+        items.append({
+            'description': f'مصروف - {row.title}',
+            'quantity': 1,
+            'rate': amount,
+            'amount': amount
+        })
+    return items
+
+
+def _count_billed(model, invoice_ids):
+    """Rows of a model linked to the given invoices, counted in chunks"""
+    return sum(
+        db.session.execute(select(func.count(model.id)).where(model.invoice_id.in_(chunk))).scalar() or 0
+        for chunk in _chunks(invoice_ids)
+    )
+
+
+def run_billing(start_date, end_date, created_by, issue_date=None, project_ids=None,
+                tax_rate=15, dry_run=False):
+    """Create draft invoices for the unbilled billable time and expenses of a period.
+
+    Line items come from two bulk queries grouped per project, every invoice
+    is inserted in one statement with numbers reserved as a block, and the
+    source rows are marked with their invoice in set-based updates. The whole
+    run is one transaction. Projects without a client or with nothing to
+    charge are reported in `skipped` and their rows stay unbilled.
+
+    Only the loaded rows are marked, and only while they are still unbilled;
+    if another transaction billed or changed any of them in the meantime
+    (such as an overlapping run) the run is rolled back with
+    BillingRunConflict.
+    """
+    if start_date > end_date:
+        raise BillingRunError('start_date is after end_date')
+    issue_date = issue_date or datetime.now().date()
+
+    # Rows created while the run is in progress are left for the next run
+    last_time_id = db.session.execute(select(func.max(TimeTrack.id))).scalar() or 0
+    last_expense_id = db.session.execute(select(func.max(Expense.id))).scalar() or 0
+
+    lines = _load_lines(start_date, end_date, last_time_id, last_expense_id, project_ids)
+    projects = _load_projects(lines.keys())
+
+    invoices = []
+    skipped = []
+    for project_id in sorted(lines):
+        project = projects.get(project_id)
+        if project is None or project.client_id is None:
+            skipped.append({'project_id': project_id, 'reason': 'no_client'})
+            continue
+        items = _build_items(project, lines[project_id])
+        subtotal = round(sum(item['amount'] for item in items), 2)
+        if subtotal <= 0:
+            skipped.append({'project_id': project_id, 'reason': 'nothing_to_charge'})
+            continue
+        tax_amount = round(subtotal * float(tax_rate) / 100, 2)
+        invoices.append({
+            'project_id': project_id,
+            'client_id': project.client_id,
+            'title': f'{project.name} ({start_date.isoformat()} - {end_date.isoformat()})',
+            'issue_date': issue_date,
+            'due_date': issue_date + timedelta(days=project.payment_terms or 30),
+            'subtotal': subtotal,
+            'tax_rate': tax_rate,
+            'tax_amount': tax_amount,
+            'discount_amount': 0,
+            'total_amount': round(subtotal + tax_amount, 2),
+            'paid_amount': 0,
+            'currency': project.currency or 'SAR',
+            'status': 'draft',
+            'items': items,
+            'created_by': created_by,
+            'time_ids': lines[project_id]['time_ids'],
+            'expense_ids': [row.id for row in lines[project_id]['expenses']]
+        })
+
+    summary = {
+        'period': {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()},
+        'invoice_count': len(invoices),
+        'total_amount': round(sum(invoice['total_amount'] for invoice in invoices), 2),
+        'time_entries': sum(len(invoice['time_ids']) for invoice in invoices),
+        'expenses': sum(len(invoice['expense_ids']) for invoice in invoices),
+        'skipped': skipped,
+        'dry_run': dry_run
+    }
+    if dry_run or not invoices:
+        return summary
+
+    now = datetime.utcnow()
+    numbers = next_numbers('invoice', len(invoices), issue_date.year)
+    rows = []
+    for invoice, number in zip(invoices, numbers):
+        invoice['invoice_number'] = number
+        rows.append({
+            **{key: value for key, value in invoice.items() if key not in ('time_ids', 'expense_ids')},
+            'created_at': now,
+            'updated_at': now
+        })
+
+    try:
+        db.session.execute(insert(Invoice.__table__), rows)
+
+        invoice_ids = {}
+        for chunk in _chunks(numbers):
+            invoice_ids.update(db.session.execute(
+                select(Invoice.invoice_number, Invoice.id).where(Invoice.invoice_number.in_(chunk))
+            ).all())
+
+        time_rows = [
+            {'billed_id': time_id, 'billed_invoice_id': invoice_ids[invoice['invoice_number']]}
+            for invoice in invoices for time_id in invoice['time_ids']
+        ]
+        if time_rows:
+            time_table = TimeTrack.__table__
+            db.session.execute(
+                update(time_table)
+                .where(time_table.c.id == bindparam('billed_id'),
+                       time_table.c.invoice_id.is_(None),
+                       time_table.c.status == BILLABLE_TIME_STATUS)
+                .values(invoice_id=bindparam('billed_invoice_id'), status='billed', updated_at=now),
+                time_rows
+            )
+
+        expense_rows = [
+            {'billed_id': expense_id, 'billed_invoice_id': invoice_ids[invoice['invoice_number']]}
+            for invoice in invoices for expense_id in invoice['expense_ids']
+        ]
+        if expense_rows:
+            expense_table = Expense.__table__
+            db.session.execute(
+                update(expense_table)
+                .where(expense_table.c.id == bindparam('billed_id'),
+                       expense_table.c.invoice_id.is_(None))
+                .values(invoice_id=bindparam('billed_invoice_id'), updated_at=now),
+                expense_rows
+            )
+
+        # Executemany row counts are not reliable on every driver, so the
+        # marked rows are counted instead
+        run_invoice_ids = list(invoice_ids.values())
+        if (_count_billed(TimeTrack, run_invoice_ids) != len(time_rows)
+                or _count_billed(Expense, run_invoice_ids) != len(expense_rows)):
+            raise BillingRunConflict('Time entries or expenses were billed or changed during the run')
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    summary['invoice_ids'] = [invoice_ids[number] for number in numbers]
+    summary['first_invoice_number'] = numbers[0]
+    summary['last_invoice_number'] = numbers[-1]
+    return summary
@@ -0,0 +1,242 @@
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import select, func, or_
+from extensions import db, cache
+from models.subscription import ClientSubscription, CYCLE_DAYS
+from models.invoice import Invoice
+from models.project import Project
+from models.expense import Expense
+from models.client import Client
+from services.subscription_analytics import CYCLE_MONTHS
+from services.money import minor_units, minor_array, sum_at, to_major, DEFAULT_CURRENCY
+from services.exchange_rates import minor_factor, base_currency, rate_version, MissingExchangeRate
+
+OPEN_INVOICE_STATUSES = ('sent', 'overdue')
+CLOSED_PROJECT_STATUSES = ('cancelled',)
+
+INFLOWS = ('subscriptions', 'invoices', 'projects')
+OUTFLOWS = ('expenses',)
+
+
+def _day_index(dates, today):
+    """Offset of datetime64[D] dates from today"""
+    return (dates - np.datetime64(today, 'D')).astype(int)
+
+
+def _spread(offsets, amounts, days):
+    """Dense per day totals of minor unit amounts falling inside the horizon, and the total before it"""
+    inside = (offsets >= 0) & (offsets < days)
+    return sum_at(offsets[inside], amounts[inside], days), int(amounts[offsets < 0].sum())
+
+
+def _to_base(currencies, amounts, today, missing_rates):
+    """Base currency minor units of minor unit amounts, one rate lookup per currency.
+
+    Amounts in a currency without a rate count as 0 and the currency is
+    added to missing_rates.
+    """
+    currencies = np.array(currencies)
+    factors = np.zeros(len(currencies))
+    for currency in np.unique(currencies):
+        try:
+            factors[currencies == currency] = float(minor_factor(str(currency), today))
+        except MissingExchangeRate:
+            missing_rates.add(str(currency))
+    return np.rint(amounts * factors).astype(np.int64)
+
+
+def _grouped(rows, today, days, missing_rates):
+    """Spread a grouped (date, currency, amount) result, dates may be missing"""
+    if not rows:
+        return np.zeros(days, dtype=np.int64), 0, 0
+    dates, currencies, amounts = zip(*rows)
+    dates = np.array(list(dates), dtype='datetime64[D]')
+    amounts = _to_base(currencies, minor_array(amounts), today, missing_rates)
+    missing = np.isnat(dates)
+    totals, past_due = _spread(_day_index(dates[~missing], today), amounts[~missing], days)
+    return totals, past_due, int(amounts[missing].sum())
+
+
+def _subscription_inflows(today, days, missing_rates):
+    """Renewals of the active subscriptions, every billing date in the horizon.
+
+    Each subscription's schedule is expanded into a (subscriptions x billings)
+    date matrix from next_billing_date and the cycle length, then billing
+    dates after the end date or inside the trial are masked out.
+    """
+    rows = db.session.execute(
+        select(
+            ClientSubscription.next_billing_date,
+            ClientSubscription.billing_cycle,
+            func.coalesce(ClientSubscription.currency, DEFAULT_CURRENCY),
+            minor_units(ClientSubscription.monthly_price, ClientSubscription.currency),
+            ClientSubscription.end_date,
+            ClientSubscription.trial_end_date
+        ).where(ClientSubscription.status == 'active', ClientSubscription.monthly_price > 0)
+    ).all()
+    if not rows:
+        return np.zeros(days, dtype=np.int64), 0
+
+    next_billing, cycles, currencies, prices, ends, trial_ends = zip(*rows)
+    next_billing = np.array(next_billing, dtype='datetime64[D]')
+    cycles = np.array(cycles)
+    step = np.full(len(cycles), CYCLE_DAYS['monthly'])
+    months = np.ones(len(cycles), dtype=np.int64)
+    for cycle, cycle_days in CYCLE_DAYS.items():
+        step[cycles == cycle] = cycle_days
+        months[cycles == cycle] = CYCLE_MONTHS[cycle]
+    amount = _to_base(currencies, minor_array(prices) * months, today, missing_rates)
+    ends = np.array(list(ends), dtype='datetime64[D]')
+    trial_ends = np.array(list(trial_ends), dtype='datetime64[D]')
+
+    # A missed billing date is due once; the schedule resumes at the first date from today
+    first = _day_index(next_billing, today)
+    past_due = int(amount[(first < 0) & (np.isnat(trial_ends) | (next_billing > trial_ends))].sum())
+    skipped = np.where(first < 0, -(first // step), 0)
+
+    billings = np.arange(days // min(step.min(), days) + 1)
+    offsets = first[:, None] + (skipped[:, None] + billings[None, :]) * step[:, None]
+    dates = np.datetime64(today, 'D') + offsets
+    billed = (
+        (offsets < days)
+        & (np.isnat(ends)[:, None] | (dates <= ends[:, None]))
+        & (np.isnat(trial_ends)[:, None] | (dates > trial_ends[:, None]))
+    )
+    totals = sum_at(offsets[billed], np.broadcast_to(amount[:, None], offsets.shape)[billed], days)
+    return totals, past_due
+
+
+def _invoice_inflows(today, days, missing_rates):
+    """Open balances of the sent invoices by due date"""
+    balance = Invoice.total_amount - func.coalesce(Invoice.paid_amount, 0)
+    currency = func.coalesce(Invoice.currency, DEFAULT_CURRENCY)
+    rows = db.session.execute(
+        select(Invoice.due_date, currency, func.sum(minor_units(balance, Invoice.currency)))
+        .where(Invoice.status.in_(OPEN_INVOICE_STATUSES), balance > 0)
+        .group_by(Invoice.due_date, currency, Invoice.currency)
+    ).all()
+    totals, past_due, _ = _grouped(rows, today, days, missing_rates)
+    return totals, past_due
+
+
+def _project_inflows(today, days, missing_rates):
+    """Unpaid amount of the one-time projects at their end date, in the client's currency"""
+    remaining = Project.total_amount - func.coalesce(Project.paid_amount, 0)
+    currency = func.coalesce(Client.currency, DEFAULT_CURRENCY)
+    rows = db.session.execute(
+        select(Project.end_date, currency, func.sum(minor_units(remaining, currency)))
+        .outerjoin(Client, Client.id == Project.client_id)
+        .where(
+            Project.project_type == 'onetime',
+            Project.status.notin_(CLOSED_PROJECT_STATUSES),
+            remaining > 0
+        )
+        .group_by(Project.end_date, currency)
+    ).all()
+    return _grouped(rows, today, days, missing_rates)
+
+
+def _expense_outflows(today, days, reimbursement_days, missing_rates):
+    """Approved reimbursable expenses, paid `reimbursement_days` after approval"""
+    approved = func.coalesce(func.date(Expense.approved_at), Expense.expense_date)
+    currency = func.coalesce(Expense.currency, DEFAULT_CURRENCY)
+    rows = db.session.execute(
+        select(
+            approved,
+            currency,
+            func.sum(minor_units(func.coalesce(Expense.total_amount, Expense.amount), Expense.currency))
+        )
+        .where(
+            Expense.status == 'approved',
+            Expense.reimbursed_at.is_(None),
+            or_(Expense.is_reimbursable.is_(True), Expense.is_reimbursable.is_(None))
+        )
+        .group_by(approved, currency, Expense.currency)
+    ).all()
+    if not rows:
+        return np.zeros(days, dtype=np.int64)
+
+    dates, currencies, amounts = zip(*rows)
+    dates = np.array([value if isinstance(value, date) else date.fromisoformat(value) for value in dates],
+                     dtype='datetime64[D]')
+    amounts = _to_base(currencies, minor_array(amounts), today, missing_rates)
+
+    # Already late reimbursements are expected today
+    offsets = np.maximum(_day_index(dates, today) + reimbursement_days, 0)
+    totals, _ = _spread(offsets, amounts, days)
+    return totals
+
+
+def compute_cash_flow(today=None, days=90, reimbursement_days=14):
+    """Expected inflows and outflows of every day from today for `days` days.
+
+    Inflows are subscription renewals, open invoice balances by due date and
+    the unpaid amount of one-time projects at their end date; outflows are
+    approved expenses waiting for reimbursement. Each source is grouped by
+    currency, converted to the base currency at today's rates and turned into
+    a dense per day array of minor unit amounts the calendar is built from.
+    Currencies without a rate are left out and listed. Amounts due before
+    today are reported as past due, and project balances without an end date
+    as unscheduled.
+    """
+    today = today or date.today()
+    currency = base_currency()
+    missing_rates = set()
+    subscriptions, subscriptions_past_due = _subscription_inflows(today, days, missing_rates)
+    invoices, invoices_past_due = _invoice_inflows(today, days, missing_rates)
+    projects, projects_past_due, projects_unscheduled = _project_inflows(today, days, missing_rates)
+    flows = {
+        'subscriptions': subscriptions,
+        'invoices': invoices,
+        'projects': projects,
+        'expenses': _expense_outflows(today, days, reimbursement_days, missing_rates)
+    }
+
+    inflow = sum(flows[source] for source in INFLOWS)
+    outflow = sum(flows[source] for source in OUTFLOWS)
+    net = inflow - outflow
+    balance = np.cumsum(net)
+
+    calendar = []
+    for i in range(days):
+        calendar.append({
+            'date': (today + timedelta(days=i)).isoformat(),
+            **{source: to_major(flows[source][i], currency) for source in INFLOWS + OUTFLOWS},
+            'inflow': to_major(inflow[i], currency),
+            'outflow': to_major(outflow[i], currency),
+            'net': to_major(net[i], currency),
+            'cumulative_net': to_major(balance[i], currency)
+        })
+
+    return {
+        'as_of': today.isoformat(),
+        'days': days,
+        'currency': currency,
+        'missing_rates': sorted(missing_rates),
+        'totals': {
+            **{source: to_major(flows[source].sum(), currency) for source in INFLOWS + OUTFLOWS},
+            'inflow': to_major(inflow.sum(), currency),
+            'outflow': to_major(outflow.sum(), currency),
+            'net': to_major(net.sum(), currency)
+        },
+        'past_due': {
+            'subscriptions': to_major(subscriptions_past_due, currency),
+            'invoices': to_major(invoices_past_due, currency),
+            'projects': to_major(projects_past_due, currency)
+        },
+        'unscheduled': {
+            'projects': to_major(projects_unscheduled, currency)
+        },
+        'calendar': calendar
+    }
+
+
+def get_cash_flow(today=None, days=90, reimbursement_days=14, timeout=300):
+    """Cash flow calendar cached per day, horizon and rate version"""
+    today = today or date.today()
+    cache_key = f'cash_flow:{today.isoformat()}:{days}:{reimbursement_days}:{rate_version()}'
+    cash_flow = cache.get(cache_key)
+    if cash_flow is None:
+        cash_flow = compute_cash_flow(today, days, reimbursement_days)
+        cache.set(cache_key, cash_flow, timeout=timeout)
+    return cash_flow
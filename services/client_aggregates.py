@@ -0,0 +1,127 @@
+from datetime import date
+from sqlalchemy import select, func, case, null
+from extensions import db
+from models.client import Client
+from models.project import Project
+from models.invoice import Invoice
+from models.subscription import ClientSubscription, SubscriptionPayment
+from services.aging import RECEIVABLE_STATUSES
+from services.money import minor_units, exact_sum, to_major
+from services.exchange_rates import to_base, rate_day, base_currency, MissingExchangeRate
+from services.subscription_analytics import is_revenue_generating
+
+# Client ids per IN list
+CHUNK_SIZE = 500
+
+COUNT_FIELDS = (
+    'total_projects', 'active_projects_count', 'completed_projects_count',
+    'outstanding_invoices_count', 'active_subscriptions'
+)
+AMOUNT_FIELDS = ('total_project_value', 'outstanding_amount', 'overdue_amount', 'monthly_recurring_revenue', 'total_paid')
+
+
+def _chunks(ids):
+    ids = sorted(set(ids))
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _grouped_queries(ids, today):
+    """One grouped query per source over a chunk of client ids.
+
+    Every query returns (client_id, currency, rate day, counts..., minor unit sums...)
+    so amounts are converted once per client and currency.
+    """
+    balance = Invoice.total_amount - func.coalesce(Invoice.paid_amount, 0)
+    payment_rate_day = rate_day(SubscriptionPayment.currency, SubscriptionPayment.payment_date)
+
+    yield ('total_projects', 'active_projects_count', 'completed_projects_count'), ('total_project_value',), select(
+        Project.client_id,
+        Client.currency,
+        null(),
+        func.count(Project.id),
+        func.count(case((Project.status == 'active', 1))),
+        func.count(case((Project.status == 'completed', 1))),
+        exact_sum(Project.total_amount, Client.currency)
+    ).join(Client, Client.id == Project.client_id).where(
+        Project.client_id.in_(ids)
+    ).group_by(Project.client_id, Client.currency)
+
+    yield ('outstanding_invoices_count',), ('outstanding_amount', 'overdue_amount'), select(
+        Invoice.client_id,
+        Invoice.currency,
+        null(),
+        func.count(Invoice.id),
+        exact_sum(balance, Invoice.currency),
+        func.coalesce(func.sum(case((Invoice.due_date < today, minor_units(balance, Invoice.currency)), else_=0)), 0)
+    ).where(
+        Invoice.client_id.in_(ids),
+        Invoice.status.in_(RECEIVABLE_STATUSES),
+        balance > 0
+    ).group_by(Invoice.client_id, Invoice.currency)
+
+    yield ('active_subscriptions',), ('monthly_recurring_revenue',), select(
+        ClientSubscription.client_id,
+        ClientSubscription.currency,
+        null(),
+        func.count(case((ClientSubscription.status == 'active', 1))),
+        func.coalesce(func.sum(case(
+            (is_revenue_generating(today), minor_units(ClientSubscription.monthly_price, ClientSubscription.currency)),
+            else_=0
+        )), 0)
+    ).where(
+        ClientSubscription.client_id.in_(ids)
+    ).group_by(ClientSubscription.client_id, ClientSubscription.currency)
+
+    yield (), ('total_paid',), select(
+        ClientSubscription.client_id,
+        SubscriptionPayment.currency,
+        payment_rate_day,
+        exact_sum(SubscriptionPayment.amount, SubscriptionPayment.currency)
+    ).join(ClientSubscription, ClientSubscription.id == SubscriptionPayment.subscription_id).where(
+        ClientSubscription.client_id.in_(ids),
+        SubscriptionPayment.status == 'completed'
+    ).group_by(ClientSubscription.client_id, SubscriptionPayment.currency, payment_rate_day)
+
+
+def get_client_aggregates(client_ids, today=None):
+    """Project, invoice, subscription and payment figures of a set of clients.
+
+    Four grouped queries per chunk of CHUNK_SIZE ids, whatever the number of
+    clients. Amounts are in the base currency; currencies without a rate are
+    left out and listed per client. Returns {client_id: figures}.
+    """
+    today = today or date.today()
+    base = base_currency()
+    figures = {
+        client_id: {**{field: 0 for field in COUNT_FIELDS + AMOUNT_FIELDS}, 'missing_rates': set()}
+        for client_id in client_ids
+    }
+
+    for ids in _chunks(client_ids):
+        for count_fields, amount_fields, statement in _grouped_queries(ids, today):
+            for row in db.session.execute(statement):
+                client_id, currency, day = row[0], row[1], row[2]
+                client = figures[client_id]
+                for field, value in zip(count_fields, row[3:]):
+                    client[field] += value or 0
+                for field, value in zip(amount_fields, row[3 + len(count_fields):]):
+                    try:
+                        client[field] += to_base(value or 0, currency, day or today)
+                    except MissingExchangeRate:
+                        client['missing_rates'].add(currency)
+
+    for client in figures.values():
+        for field in AMOUNT_FIELDS:
+            client[field] = to_major(client[field], base)
+        client['missing_rates'] = sorted(client['missing_rates'])
+        client['currency'] = base
+    return figures
+
+
+def attach_client_aggregates(clients, today=None):
+    """Load the figures of many clients at once, so their properties and to_dict need no queries"""
+    figures = get_client_aggregates([client.id for client in clients], today)
+    for client in clients:
+        client._aggregates = figures[client.id]
+    return clients
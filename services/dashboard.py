@@ -0,0 +1,202 @@
+from datetime import datetime, date, timedelta
+from sqlalchemy import select, func
+from extensions import db, cache
+from models.project import Project
+from models.client import Client
+from models.employee import Employee
+from models.task import Task, TaskStatus
+from models.subscription import ClientSubscription, SubscriptionPayment
+from services.activity import get_activity_feed
+from services.money import exact_sum, to_major
+from services.exchange_rates import convert_groups, rate_day, base_currency, rate_version
+
+# Roles that see revenue figures and billing alerts
+FINANCIAL_ROLES = ('admin', 'manager')
+
+RECENT_LIMIT = 5
+REVENUE_MONTHS = 6
+
+
+def _count(model, *criteria):
+    return select(func.count(model.id)).where(*criteria).scalar_subquery()
+
+
+def get_counts(today):
+    """Every dashboard counter in one query"""
+    open_task = Task.status.notin_([TaskStatus.COMPLETED, TaskStatus.CANCELLED])
+    row = db.session.execute(select(
+        _count(Project).label('projects'),
+        _count(Client).label('clients'),
+        _count(Employee).label('employees'),
+        _count(Task, Task.status != TaskStatus.COMPLETED).label('tasks'),
+        _count(Task, open_task, Task.due_date < today).label('overdue_tasks'),
+        _count(ClientSubscription, ClientSubscription.status == 'active').label('active_subscriptions'),
+        _count(
+            ClientSubscription,
+            ClientSubscription.status == 'active',
+            ClientSubscription.next_billing_date < today
+        ).label('overdue_subscriptions'),
+        _count(
+            Project,
+            Project.status == 'active',
+            Project.end_date.isnot(None),
+            Project.end_date <= today + timedelta(days=7)
+        ).label('upcoming_deadlines'),
+        _count(Client, Client.created_at >= datetime.combine(today - timedelta(days=7), datetime.min.time())).label('new_clients')
+    )).one()
+    return row._asdict()
+
+
+def get_project_status_counts():
+    """Number of projects in each status"""
+    rows = db.session.execute(
+        select(Project.status, func.count(Project.id)).group_by(Project.status)
+    ).all()
+    return {status: count for status, count in rows}
+
+
+def get_recent_items():
+    """Latest projects, clients and open tasks (only the columns the page shows)"""
+    projects = db.session.execute(
+        select(Project.id, Project.name, Project.status, Project.created_at)
+        .order_by(Project.created_at.desc()).limit(RECENT_LIMIT)
+    ).all()
+    clients = db.session.execute(
+        select(Client.id, Client.display_name.label('name'), Client.created_at)
+        .order_by(Client.created_at.desc()).limit(RECENT_LIMIT)
+    ).all()
+    tasks = db.session.execute(
+        select(Task.id, Task.title, Task.status, Task.due_date)
+        .where(Task.status.notin_([TaskStatus.COMPLETED, TaskStatus.CANCELLED]))
+        .order_by(Task.due_date.asc()).limit(RECENT_LIMIT)
+    ).all()
+
+    return {
+        'projects': [{
+            'id': p.id,
+            'name': p.name,
+            'status': p.status,
+            'created_at': p.created_at.isoformat() if p.created_at else None
+        } for p in projects],
+        'clients': [{
+            'id': c.id,
+            'name': c.name,
+            'created_at': c.created_at.isoformat() if c.created_at else None
+        } for c in clients],
+        'tasks': [{
+            'id': t.id,
+            'title': t.title,
+            'status': t.status.value if t.status else None,
+            'due_date': t.due_date.isoformat() if t.due_date else None
+        } for t in tasks]
+    }
+
+
+def get_monthly_revenue(today):
+    """Completed subscription payments of the last months in the base currency, oldest first"""
+    months = []
+    for i in range(REVENUE_MONTHS - 1, -1, -1):
+        year, month = divmod(today.year * 12 + today.month - 1 - i, 12)
+        months.append((year, month + 1))
+    start = date(months[0][0], months[0][1], 1)
+
+    month_key = func.extract('year', SubscriptionPayment.payment_date) * 100 + \
+        func.extract('month', SubscriptionPayment.payment_date)
+    payment_rate_day = rate_day(SubscriptionPayment.currency, SubscriptionPayment.payment_date)
+    rows = db.session.execute(
+        select(
+            month_key.label('month_key'),
+            SubscriptionPayment.currency,
+            payment_rate_day,
+            exact_sum(SubscriptionPayment.amount, SubscriptionPayment.currency)
+        )
+        .where(SubscriptionPayment.status == 'completed', SubscriptionPayment.payment_date >= start)
+        .group_by(month_key, SubscriptionPayment.currency, payment_rate_day)
+    ).all()
+    groups = {}
+    for key, currency, day, minor in rows:
+        groups.setdefault(int(key), []).append((currency, day, minor))
+    base = base_currency()
+    totals = {key: to_major(convert_groups(month_groups)[0], base) for key, month_groups in groups.items()}
+
+    return [{
+        'month': f'{year}-{month:02d}',
+        'amount': totals.get(year * 100 + month, 0.0)
+    } for year, month in months]
+
+
+def get_alerts(counts, include_financial):
+    """Alerts derived from the counters"""
+    alerts = []
+    if include_financial and counts['overdue_subscriptions']:
+        alerts.append({
+            'type': 'warning',
+            'code': 'overdue_subscriptions',
+            'title': 'اشتراكات متأخرة',
+            'message': f"يوجد {counts['overdue_subscriptions']} اشتراك متأخر عن الدفع",
+            'action_url': '/subscriptions?filter=overdue',
+            'priority': 'high'
+        })
+    if counts['overdue_tasks']:
+        alerts.append({
+            'type': 'warning',
+            'code': 'overdue_tasks',
+            'title': 'مهام متأخرة',
+            'message': f"يوجد {counts['overdue_tasks']} مهمة تجاوزت موعد التسليم",
+            'action_url': '/tasks?filter=overdue',
+            'priority': 'high'
+        })
+    if counts['upcoming_deadlines']:
+        alerts.append({
+            'type': 'info',
+            'code': 'upcoming_deadlines',
+            'title': 'مشاريع قريبة من الانتهاء',
+            'message': f"{counts['upcoming_deadlines']} مشروع ينتهي خلال الأسبوع القادم",
+            'action_url': '/projects?filter=upcoming',
+            'priority': 'medium'
+        })
+    if counts['new_clients']:
+        alerts.append({
+            'type': 'success',
+            'code': 'new_clients',
+            'title': 'عملاء جدد',
+            'message': f"تم إضافة {counts['new_clients']} عميل جديد هذا الأسبوع",
+            'action_url': '/clients',
+            'priority': 'low'
+        })
+    return alerts
+
+
+def build_dashboard_summary(role):
+    """Everything the dashboard page shows, for one role"""
+    today = date.today()
+    include_financial = role in FINANCIAL_ROLES
+
+    counts = get_counts(today)
+    recent = get_recent_items()
+    summary = {
+        'counts': counts,
+        'project_status': get_project_status_counts(),
+        'recent': recent,
+        'activities': get_activity_feed(RECENT_LIMIT * 2)[0],
+        'alerts': get_alerts(counts, include_financial),
+        'generated_at': datetime.utcnow().isoformat()
+    }
+
+    if include_financial:
+        summary['monthly_revenue'] = get_monthly_revenue(today)
+    else:
+        counts.pop('active_subscriptions')
+        counts.pop('overdue_subscriptions')
+
+    return summary
+
+
+def get_dashboard_summary(role, timeout=60):
+    """Dashboard summary cached per role and rate version"""
+    cache_key = f'dashboard_summary:{role}:{rate_version()}'
+    summary = cache.get(cache_key)
+    if summary is None:
+        summary = build_dashboard_summary(role)
+        cache.set(cache_key, summary, timeout=timeout)
+    return summary
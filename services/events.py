@@ -0,0 +1,232 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from flask import current_app
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models.project import Project
+from models.client import Client
+from models.employee import Employee
+from models.task import Task, TaskStatus
+
+logger = logging.getLogger(__name__)
+
+# Events waiting in a subscriber queue before new ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+REDIS_CHANNEL = 'erp:dashboard-events'
+
+# Signing salt of stream tokens, so they cannot be used for anything else
+STREAM_TOKEN_SALT = 'dashboard-stream'
+
+# Dashboard counter of each model
+COUNTED_MODELS = {
+    Project: 'projects',
+    Client: 'clients',
+    Employee: 'employees'
+}
+
+
+class InvalidStreamToken(ValueError):
+    """Raised when a stream token is forged or expired"""
+
+
+class EventBroker:
+    """In-process pub/sub for dashboard events.
+
+    Each subscriber gets its own bounded queue; a slow subscriber loses events
+    instead of blocking publishers. With a Redis URL configured, events are
+    relayed through Redis so subscribers on every worker receive them.
+    """
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._redis = None
+
+    def subscribe(self, limit=None):
+        """New subscriber queue, None when `limit` subscribers are already connected"""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def has_capacity(self, limit):
+        with self._lock:
+            return len(self._subscribers) < limit
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, data):
+        """Publish an event to every subscriber (of every worker when using Redis)"""
+        if self._redis is not None:
+            try:
+                self._redis.publish(REDIS_CHANNEL, json.dumps(data, default=str))
+                return
+            except Exception as e:
+                logger.warning(f"Redis publish failed, delivering locally: {e}")
+        self._deliver(data)
+
+    def _deliver(self, data):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(data)
+            except queue.Full:
+                pass
+
+    def connect_redis(self, url):
+        """Relay events through Redis pub/sub; stays in-process if Redis is unavailable"""
+        try:
+            import redis
+            client = redis.Redis.from_url(url)
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(REDIS_CHANNEL)
+        except Exception as e:
+            logger.warning(f"Redis events disabled, using in-process delivery: {e}")
+            return False
+
+        def listen():
+            while True:
+                try:
+                    for message in pubsub.listen():
+                        try:
+                            self._deliver(json.loads(message['data']))
+                        except ValueError as e:
+                            logger.warning(f"Invalid dashboard event from Redis: {e}")
+                except Exception as e:
+                    # redis-py resubscribes on the next listen() after a dropped connection
+                    logger.warning(f"Redis events connection lost: {e}")
+                    time.sleep(5)
+
+        threading.Thread(target=listen, name='dashboard-events', daemon=True).start()
+        self._redis = client
+        return True
+
+
+broker = EventBroker()
+
+
+def init_events(app):
+    """Use Redis for cross-worker delivery when EVENTS_REDIS_URL is set"""
+    url = app.config.get('EVENTS_REDIS_URL')
+    if url:
+        broker.connect_redis(url)
+
+
+def _stream_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=STREAM_TOKEN_SALT)
+
+
+def create_stream_token(user_id):
+    """Short-lived token that only opens the dashboard stream of a user.
+
+    EventSource cannot send headers, so the token ends up in the URL (and in
+    access logs); it is not a JWT and grants nothing else.
+    """
+    return _stream_serializer().dumps({'user_id': user_id})
+
+
+def read_stream_token(token):
+    """(user id, expiry as a unix time) of a stream token"""
+    max_age = current_app.config.get('EVENTS_STREAM_TOKEN_SECONDS', 600)
+    try:
+        data, issued_at = _stream_serializer().loads(token, max_age=max_age, return_timestamp=True)
+        return int(data['user_id']), issued_at.timestamp() + max_age
+    except (BadSignature, KeyError, TypeError, ValueError):
+        raise InvalidStreamToken('Invalid or expired stream token')
+
+
+def format_event(data):
+    """Server-Sent Events frame of an event"""
+    return f"event: {data['type']}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+
+def stream_events(subscriber, user_id, expires_at, keepalive=15):
+    """Yield SSE frames of a broker subscriber until the client disconnects or its token expires.
+
+    Notification events are only sent to the user they belong to. A comment
+    line is sent after `keepalive` idle seconds so proxies keep the
+    connection open. Once the token expires an `expired` event is sent and
+    the stream ends; the client reconnects with a new token.
+    """
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            remaining = expires_at - time.time()
+            if remaining <= 0:
+                yield format_event({'type': 'expired'})
+                return
+            try:
+                data = subscriber.get(timeout=min(keepalive, remaining))
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            if data.get('type') == 'notifications' and str(data.get('user_id')) != str(user_id):
+                continue
+            yield format_event(data)
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+def queue_event(session, data):
+    """Queue an event to be published once the session commits"""
+    session.info.setdefault('pending_events', []).append(data)
+
+
+def _counter_deltas(session):
+    """Changes to the dashboard counters caused by a flush"""
+    deltas = defaultdict(int)
+    for objects, sign in ((session.new, 1), (session.deleted, -1)):
+        for obj in objects:
+            counter = COUNTED_MODELS.get(type(obj))
+            if counter:
+                deltas[counter] += sign
+            elif isinstance(obj, Task) and obj.status != TaskStatus.COMPLETED:
+                deltas['tasks'] += sign
+
+    for obj in session.dirty:
+        if isinstance(obj, Task):
+            history = inspect(obj).attrs.status.history
+            if history.has_changes():
+                was_open = any(status != TaskStatus.COMPLETED for status in history.deleted)
+                is_open = obj.status != TaskStatus.COMPLETED
+                if was_open != is_open:
+                    deltas['tasks'] += 1 if is_open else -1
+    return deltas
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_counter_deltas(session, flush_context):
+    deltas = _counter_deltas(session)
+    if deltas:
+        pending = session.info.setdefault('pending_counts', defaultdict(int))
+        for counter, delta in deltas.items():
+            pending[counter] += delta
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_pending(session):
+    counts = session.info.pop('pending_counts', None)
+    events = session.info.pop('pending_events', [])
+
+    counts = {counter: delta for counter, delta in (counts or {}).items() if delta}
+    if counts:
+        broker.publish({'type': 'counts', 'delta': counts})
+    for data in events:
+        broker.publish(data)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending(session):
+    session.info.pop('pending_counts', None)
+    session.info.pop('pending_events', None)
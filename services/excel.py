@@ -0,0 +1,111 @@
+import os
+import tempfile
+from urllib.parse import quote
+import xlsxwriter
+from flask import Response
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+HEADER_FORMAT = {
+    'bold': True,
+    'font_color': 'white',
+    'bg_color': '#366092',
+    'align': 'center',
+    'valign': 'vcenter'
+}
+
+
+class SheetWriter:
+    """Row-by-row writer for one worksheet that keeps column widths up to date"""
+
+    def __init__(self, worksheet, headers, header_format):
+        self.worksheet = worksheet
+        self.widths = [len(header) for header in headers]
+        self.row = 0
+        self.write_row(headers, header_format)
+
+    def write_row(self, values, cell_format=None):
+        """Write the next row; rows must be written in order (constant_memory)"""
+        for col, value in enumerate(values):
+            self.worksheet.write(self.row, col, value, cell_format)
+            length = len(str(value)) if value is not None else 0
+            if col >= len(self.widths):
+                self.widths.append(length)
+            elif length > self.widths[col]:
+                self.widths[col] = length
+        self.row += 1
+
+    def finish(self):
+        """Apply the tracked column widths"""
+        for col, width in enumerate(self.widths):
+            self.worksheet.set_column(col, col, width + 2)
+
+
+class ExcelWorkbook:
+    """xlsxwriter workbook in constant_memory mode spooled to a temp file.
+
+    Rows are flushed to disk as they are written, so memory use does not grow
+    with the number of rows. ``close()`` returns the path of the finished file.
+    """
+
+    def __init__(self, directory=None):
+        fd, self.path = tempfile.mkstemp(suffix='.xlsx', prefix='erp_export_', dir=directory)
+        os.close(fd)
+        self.workbook = xlsxwriter.Workbook(self.path, {'constant_memory': True})
+        self.header_format = self.workbook.add_format(HEADER_FORMAT)
+        self.sheets = []
+
+    def add_sheet(self, name, headers):
+        """Add a worksheet with a header row and return its writer"""
+        sheet = SheetWriter(self.workbook.add_worksheet(name), headers, self.header_format)
+        self.sheets.append(sheet)
+        return sheet
+
+    def add_format(self, properties):
+        return self.workbook.add_format(properties)
+
+    def close(self):
+        """Finish all sheets and write the file"""
+        for sheet in self.sheets:
+            sheet.finish()
+        self.workbook.close()
+        return self.path
+
+    def discard(self):
+        """Remove the temp file after a failed export"""
+        try:
+            self.workbook.close()
+        except Exception:
+            pass
+        remove_file(self.path)
+
+
+def remove_file(path):
+    """Delete a file, ignoring files that are already gone"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _iter_file(path, delete_after, chunk_size=64 * 1024):
+    """Yield a file in chunks, deleting it once fully sent or the client disconnects"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if delete_after:
+            remove_file(path)
+
+
+def send_excel_file(path, download_name, delete_after=True):
+    """Stream a finished workbook from disk in chunks"""
+    response = Response(_iter_file(path, delete_after), mimetype=XLSX_MIMETYPE)
+    response.headers['Content-Length'] = str(os.path.getsize(path))
+    response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(download_name)}"
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
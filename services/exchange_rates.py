@@ -0,0 +1,144 @@
+import threading
+import time
+from bisect import bisect_right
+from datetime import date, datetime
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import select, case, type_coerce
+from extensions import db, cache
+from models.exchange_rate import ExchangeRate
+from services.money import DEFAULT_CURRENCY, minor_digits, from_minor, to_minor
+
+# In-process rate index: {currency: (sorted rate dates, rates)}, reloaded after the cache timeout
+# or when the shared rate version changes
+_rates = {'loaded_at': None, 'index': {}, 'version': None}
+_lock = threading.Lock()
+
+# Shared cache entry changed every time a rate is saved
+RATE_VERSION_KEY = 'exchange_rates:version'
+
+
+class MissingExchangeRate(ValueError):
+    """Raised when a currency has no rate on or before a date"""
+
+
+def base_currency():
+    return current_app.config.get('BASE_CURRENCY', DEFAULT_CURRENCY)
+
+
+def invalidate_rates():
+    """Drop the rate index of this process, e.g. after saving a rate"""
+    with _lock:
+        _rates['loaded_at'] = None
+
+
+def rate_version():
+    """Version of the saved rates, shared by every process through the cache.
+
+    Cached reports that convert amounts put it in their cache key, so saving
+    a rate invalidates them everywhere. Reading a new version also drops this
+    process's rate index.
+    """
+    version = cache.get(RATE_VERSION_KEY) or 0
+    with _lock:
+        if version != _rates['version']:
+            _rates['loaded_at'] = None
+            _rates['version'] = version
+    return version
+
+
+def _rate_index():
+    timeout = current_app.config.get('EXCHANGE_RATE_CACHE_TIMEOUT', 300)
+    with _lock:
+        if _rates['loaded_at'] is None or time.monotonic() - _rates['loaded_at'] > timeout:
+            index = {}
+            rows = db.session.execute(
+                select(ExchangeRate.currency, ExchangeRate.rate_date, ExchangeRate.rate)
+                .order_by(ExchangeRate.currency, ExchangeRate.rate_date)
+            ).all()
+            for currency, rate_date, rate in rows:
+                dates, rates = index.setdefault(currency, ([], []))
+                dates.append(rate_date)
+                rates.append(Decimal(rate))
+            _rates['index'] = index
+            _rates['loaded_at'] = time.monotonic()
+        return _rates['index']
+
+
+def get_rate(currency, day=None):
+    """Base currency value of one unit of a currency: the latest rate on or before the day"""
+    currency = currency or DEFAULT_CURRENCY
+    if currency == base_currency():
+        return Decimal(1)
+    day = day or date.today()
+    if isinstance(day, str):
+        day = date.fromisoformat(day[:10])
+    elif isinstance(day, datetime):
+        day = day.date()
+
+    dates, rates = _rate_index().get(currency, ((), ()))
+    position = bisect_right(dates, day)
+    if not position:
+        raise MissingExchangeRate(f'No {currency} exchange rate on or before {day.isoformat()}')
+    return rates[position - 1]
+
+
+def minor_factor(currency, day=None):
+    """Multiplier from minor units of a currency to minor units of the base currency"""
+    digits = minor_digits(base_currency()) - minor_digits(currency or DEFAULT_CURRENCY)
+    return get_rate(currency, day).scaleb(digits)
+
+
+def to_base(minor, currency, day=None):
+    """Minor unit amount of a currency in base currency minor units, rounded half up"""
+    if (currency or DEFAULT_CURRENCY) == base_currency():
+        return int(minor)
+    base = base_currency()
+    return to_minor(from_minor(minor, currency) * get_rate(currency, day), base)
+
+
+def rate_day(currency_column, date_column):
+    """Date to group amounts by for conversion.
+
+    Base currency amounts need no rate, so they get no date and stay a single
+    group; the other currencies are grouped by the date of their rate.
+    """
+    return type_coerce(case((currency_column == base_currency(), None), else_=date_column), db.Date)
+
+
+def convert_groups(rows, day=None):
+    """Total in base currency minor units of (currency, rate day, minor units) groups.
+
+    One rate lookup per group. Groups without a rate are left out and
+    returned per currency, so a missing rate never hides the other figures.
+    """
+    total = 0
+    unconverted = {}
+    for currency, group_day, minor in rows:
+        try:
+            total += to_base(minor or 0, currency, group_day or day)
+        except MissingExchangeRate:
+            currency = currency or DEFAULT_CURRENCY
+            unconverted[currency] = unconverted.get(currency, 0) + int(minor or 0)
+    return total, unconverted
+
+
+def set_rate(currency, rate_date, rate, source=None, created_by=None):
+    """Create or update the rate of a currency on a date"""
+    currency = currency.upper()
+    rate = Decimal(str(rate))
+    if len(currency) != 3 or currency == base_currency():
+        raise ValueError('Invalid currency')
+    if rate <= 0:
+        raise ValueError('Rate must be positive')
+
+    exchange_rate = ExchangeRate.query.filter_by(currency=currency, rate_date=rate_date).first()
+    if exchange_rate is None:
+        exchange_rate = ExchangeRate(currency=currency, rate_date=rate_date, created_by=created_by)
+        db.session.add(exchange_rate)
+    exchange_rate.rate = rate
+    exchange_rate.source = source
+    db.session.commit()
+    invalidate_rates()
+    cache.set(RATE_VERSION_KEY, time.time_ns(), timeout=0)
+    return exchange_rate
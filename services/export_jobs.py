@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update, func
+from extensions import db
+from models.export_job import ExportJob
+from services.exports import build_export, count_export, EXPORT_TYPES
+from services.excel import remove_file
+
+# Rows written between progress updates
+PROGRESS_INTERVAL = 1000
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+_executor = None
+_executor_lock = threading.Lock()
+_submit_lock = threading.Lock()
+
+# Live row counts of the jobs running in this process
+_progress = {}
+
+
+def _get_executor(app):
+    """Create the local worker pool on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get('EXPORT_WORKERS', 2),
+                thread_name_prefix='export'
+            )
+    return _executor
+
+
+def get_export_folder(app):
+    """Directory where finished export files are kept until they expire"""
+    folder = os.path.abspath(app.config.get('EXPORT_FOLDER') or 'exports')
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def make_job_key(export_type, params):
+    """Hash identifying identical export requests"""
+    raw = json.dumps({'type': export_type, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def submit_export(export_type, params, user_id=None):
+    """Queue an export job and return (job, created).
+
+    An identical export of the same user that is still queued or running is
+    returned instead of starting a second one.
+    """
+    if export_type not in EXPORT_TYPES:
+        raise ValueError(f'Unknown export type: {export_type}')
+
+    app = current_app._get_current_object()
+    cleanup_exports()
+
+    job_key = make_job_key(export_type, params)
+    with _submit_lock:
+        existing = ExportJob.query.filter(
+            ExportJob.job_key == job_key,
+            ExportJob.requested_by == user_id,
+            ExportJob.status.in_(ACTIVE_STATUSES)
+        ).order_by(ExportJob.id.desc()).first()
+        if existing:
+            return existing, False
+
+        job = ExportJob(
+            export_type=export_type,
+            params=json.dumps(params, sort_keys=True, default=str),
+            job_key=job_key,
+            status='queued',
+            requested_by=user_id
+        )
+        db.session.add(job)
+        db.session.commit()
+
+    _get_executor(app).submit(run_export_job, app, job.id)
+    return job, True
+
+
+def _track_progress(job_id, rows, persist):
+    """Pass rows through while counting them for the job's progress"""
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if count % PROGRESS_INTERVAL == 0:
+            _progress[job_id] = count
+            if persist:
+                _persist_progress(job_id, count)
+    _progress[job_id] = count
+
+
+def _persist_progress(job_id, count):
+    """Store progress and the heartbeat on a separate connection so other workers can see them"""
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(
+                update(ExportJob)
+                .where(ExportJob.id == job_id)
+                .values(processed_rows=count, updated_at=datetime.utcnow())
+            )
+    except Exception as e:
+        current_app.logger.warning(f"Could not store progress of export job {job_id}: {e}")
+
+
+def run_export_job(app, job_id):
+    """Build the file of a queued export job (runs in the worker pool)"""
+    with app.app_context():
+        try:
+            job = db.session.get(ExportJob, job_id)
+            if job is None or job.status != 'queued':
+                return
+
+            job.status = 'running'
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+
+            job.total_rows = count_export(job.export_type, job.params_dict)
+            db.session.commit()
+
+            # SQLite cannot commit while the export cursor holds its read lock,
+            # so progress is only kept in memory there
+            persist = db.engine.dialect.name != 'sqlite'
+            path, filename = build_export(
+                job.export_type,
+                job.params_dict,
+                get_export_folder(app),
+                track=lambda rows: _track_progress(job_id, rows, persist)
+            )
+
+            completed_at = datetime.utcnow()
+            job.status = 'completed'
+            job.processed_rows = _progress.get(job_id, 0)
+            job.file_path = path
+            job.file_name = filename
+            job.file_size = os.path.getsize(path)
+            job.completed_at = completed_at
+            job.expires_at = completed_at + timedelta(hours=app.config.get('EXPORT_RETENTION_HOURS', 24))
+            db.session.commit()
+
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Export job {job_id} failed: {e}")
+            job = db.session.get(ExportJob, job_id)
+            if job is not None:
+                job.status = 'failed'
+                job.error_message = str(e)
+                job.completed_at = datetime.utcnow()
+                db.session.commit()
+
+        finally:
+            _progress.pop(job_id, None)
+            db.session.remove()
+
+
+def get_job_status(job):
+    """Job dict including the live progress of jobs running in this process"""
+    data = job.to_dict()
+    if job.id in _progress:
+        data['processed_rows'] = max(data['processed_rows'], _progress[job.id])
+    return data
+
+
+def cleanup_exports():
+    """Apply the retention policy.
+
+    Files of expired jobs are deleted and queued or running jobs whose
+    heartbeat (updated_at, bumped with every stored progress update) is
+    older than EXPORT_JOB_TIMEOUT_MINUTES are marked failed.
+    """
+    now = datetime.utcnow()
+
+    expired = ExportJob.query.filter(
+        ExportJob.status == 'completed',
+        ExportJob.expires_at <= now
+    ).all()
+    for job in expired:
+        if job.file_path:
+            remove_file(job.file_path)
+        job.status = 'expired'
+        job.file_path = None
+
+    timeout = timedelta(minutes=current_app.config.get('EXPORT_JOB_TIMEOUT_MINUTES', 120))
+    stale = ExportJob.query.filter(
+        ExportJob.status.in_(ACTIVE_STATUSES),
+        func.coalesce(ExportJob.updated_at, ExportJob.created_at) <= now - timeout
+    ).all()
+    for job in stale:
+        # Progress is not stored on SQLite, so a job running here is still alive
+        if job.id in _progress:
+            continue
+        job.status = 'failed'
+        job.error_message = 'Export timed out'
+        job.completed_at = now
+
+    if expired or stale:
+        db.session.commit()
+
+    return len(expired), len(stale)
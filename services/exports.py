@@ -0,0 +1,187 @@
+from datetime import datetime
+from sqlalchemy import select, func
+from extensions import db
+from models.client import Client
+from services.ledger import iter_transactions, build_ledger_query, DEFAULT_CHUNK_SIZE
+from services.excel import ExcelWorkbook
+
+# Export types that can be built by build_export
+EXPORT_TYPES = ('financial', 'clients', 'pack')
+
+TRANSACTION_HEADERS = ['التاريخ', 'النوع', 'الوصف', 'العميل', 'المشروع', 'المبلغ (ج.م)', 'الحالة']
+
+
+def parse_report_date(value):
+    """Parse a YYYY-MM-DD value, passing None through"""
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def build_export(export_type, params, directory=None, track=None):
+    """Build an export file and return (path, download name).
+
+    ``track`` optionally wraps the row stream, which lets background jobs
+    report progress while the rows are written.
+    """
+    track = track or (lambda rows: rows)
+
+    if export_type == 'clients':
+        clients = get_clients_for_export(params.get('filters') or {})
+        path = create_clients_excel_report(track(clients), directory)
+        filename = f"clients_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    elif export_type == 'pack':
+        from services.report_pack import create_report_pack
+        start_date = params.get('start_date')
+        end_date = params.get('end_date')
+        path = create_report_pack(parse_report_date(start_date), parse_report_date(end_date), directory, track)
+        filename = f"financial_pack_{start_date}_{end_date}.xlsx"
+    else:
+        start_date = params.get('start_date')
+        end_date = params.get('end_date')
+        transactions = iter_transactions(
+            parse_report_date(start_date),
+            parse_report_date(end_date),
+            params.get('type')
+        )
+        path = create_excel_report(track(transactions), start_date, end_date, directory)
+        filename = f"financial_report_{start_date}_{end_date}.xlsx"
+
+    return path, filename
+
+
+def count_export(export_type, params):
+    """Number of rows build_export will write, for progress reporting"""
+    if export_type == 'clients':
+        query = select(func.count(Client.id)).where(*client_filters(params.get('filters') or {}))
+    else:
+        ledger = build_ledger_query(
+            parse_report_date(params.get('start_date')),
+            parse_report_date(params.get('end_date')),
+            params.get('type') if export_type == 'financial' else None
+        )
+        if ledger is None:
+            return 0
+        query = select(func.count()).select_from(ledger.order_by(None).subquery())
+    return db.session.execute(query).scalar()
+
+
+def create_excel_report(transactions, start_date, end_date, directory=None):
+    """Create Excel report with financial data, returns the path of the temp file"""
+
+    workbook = ExcelWorkbook(directory)
+    try:
+        sheet = workbook.add_sheet("التقرير المالي", TRANSACTION_HEADERS)
+
+        # Rows are flushed to disk as they are written (constant_memory)
+        for transaction in transactions:
+            sheet.write_row(transaction_values(transaction))
+
+        return workbook.close()
+    except Exception:
+        workbook.discard()
+        raise
+
+
+def transaction_values(transaction):
+    """Cell values of a transaction row"""
+    return [
+        transaction['date'],
+        'إيراد' if transaction['type'] == 'income' else 'مصروف',
+        transaction['description'],
+        transaction['client'],
+        transaction['project'],
+        transaction['amount'],
+        transaction['status']
+    ]
+
+
+def client_filters(filters):
+    """Where clauses of the client export filters"""
+    criteria = []
+    if filters.get('status'):
+        criteria.append(Client.status == filters['status'])
+    if filters.get('type'):
+        criteria.append(Client.client_type == filters['type'])
+    return criteria
+
+
+def get_clients_for_export(filters, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream clients data for export, fetching only the exported columns in chunks"""
+    query = select(
+        Client.id,
+        Client.display_name.label('display_name'),
+        Client.client_type,
+        Client.email,
+        Client.phone,
+        Client.city,
+        Client.country,
+        Client.status,
+        Client.industry,
+        Client.priority,
+        Client.source,
+        Client.created_at,
+        Client.updated_at
+    ).where(*client_filters(filters))
+
+    query = query.order_by(Client.created_at.desc(), Client.id.desc())
+
+    result = db.session.execute(query.execution_options(yield_per=chunk_size))
+    for row in result:
+        yield row
+
+
+def create_clients_excel_report(clients, directory=None):
+    """Create Excel report with clients data, returns the path of the temp file"""
+
+    workbook = ExcelWorkbook(directory)
+    try:
+        headers = [
+            'الرقم', 'اسم العميل', 'النوع', 'البريد الإلكتروني', 'الهاتف',
+            'المدينة', 'البلد', 'الحالة', 'القطاع', 'الأولوية', 'المصدر',
+            'تاريخ الإضافة', 'آخر تحديث'
+        ]
+        sheet = workbook.add_sheet("العملاء", headers)
+
+        for client in clients:
+            sheet.write_row([
+                client.id,
+                client.display_name or 'غير محدد',
+                'فرد' if client.client_type == 'individual' else 'شركة',
+                client.email or 'غير محدد',
+                client.phone or 'غير محدد',
+                client.city or 'غير محدد',
+                client.country or 'غير محدد',
+                get_status_text_arabic(client.status),
+                client.industry or 'غير محدد',
+                get_priority_text_arabic(client.priority),
+                client.source or 'غير محدد',
+                client.created_at.strftime('%Y-%m-%d') if client.created_at else 'غير محدد',
+                client.updated_at.strftime('%Y-%m-%d') if client.updated_at else 'غير محدد'
+            ])
+
+        return workbook.close()
+    except Exception:
+        workbook.discard()
+        raise
+
+
+def get_status_text_arabic(status):
+    """Get Arabic status text"""
+    statuses = {
+        'active': 'نشط',
+        'inactive': 'غير نشط',
+        'potential': 'محتمل',
+        'targeted': 'سيتم استهدافه'
+    }
+    return statuses.get(status, 'غير محدد')
+
+
+def get_priority_text_arabic(priority):
+    """Get Arabic priority text"""
+    priorities = {
+        'low': 'منخفضة',
+        'medium': 'متوسطة',
+        'high': 'عالية'
+    }
+    return priorities.get(priority, 'غير محدد')
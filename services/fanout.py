@@ -0,0 +1,115 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from flask import current_app
+from extensions import db
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(app):
+    """Create the shared query pool on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get('FANOUT_WORKERS', 4),
+                thread_name_prefix='fanout'
+            )
+    return _executor
+
+
+def scalar(statement):
+    """Query returning the first column of the first row"""
+    return lambda connection: connection.execute(statement).scalar()
+
+
+def one(statement):
+    """Query returning a single row"""
+    return lambda connection: connection.execute(statement).one()
+
+
+def rows(statement):
+    """Query returning all rows"""
+    return lambda connection: connection.execute(statement).all()
+
+
+def _can_fan_out(engine):
+    # An in-memory SQLite database only exists on the connection that created it
+    return not (engine.dialect.name == 'sqlite' and engine.url.database in (None, '', ':memory:'))
+
+
+def _run(engine, query, timeout, started, name):
+    """Run one query on its own pooled connection"""
+    started[name] = time.monotonic()
+    with engine.connect() as connection:
+        if engine.dialect.name == 'postgresql':
+            # Stop work nobody is waiting for any more
+            connection.exec_driver_sql(f'SET LOCAL statement_timeout = {max(int(timeout * 1000), 1)}')
+        return query(connection)
+
+
+def run_queries(queries, timeout=None, defaults=None):
+    """Run independent read queries concurrently and return (results, missing).
+
+    `queries` maps names to callables taking a connection (see scalar, one
+    and rows). Each query runs on its own pooled connection through a bounded
+    thread pool, so the wait is that of the slowest query instead of the sum.
+    Queries that fail or do not finish within `timeout` seconds of starting
+    are reported in `missing` and take their value from `defaults` (None
+    otherwise). Time spent queued for a worker does not count against that
+    deadline; a query still queued after `timeout` seconds is given up too.
+    With FANOUT_WORKERS set to 0 the queries run one after another.
+    """
+    app = current_app._get_current_object()
+    timeout = timeout if timeout is not None else app.config.get('FANOUT_TIMEOUT_SECONDS', 5)
+    defaults = defaults or {}
+    engine = db.engine
+
+    results = {}
+    missing = []
+
+    if len(queries) < 2 or not app.config.get('FANOUT_WORKERS', 4) or not _can_fan_out(engine):
+        connection = db.session.connection()
+        for name, query in queries.items():
+            try:
+                results[name] = query(connection)
+            except Exception as e:
+                app.logger.error(f"Query '{name}' failed: {e}")
+                results[name] = defaults.get(name)
+                missing.append(name)
+        return results, missing
+
+    executor = _get_executor(app)
+    started = {}
+    submitted = time.monotonic()
+    futures = {name: executor.submit(_run, engine, query, timeout, started, name)
+               for name, query in queries.items()}
+
+    pending = dict(futures)
+    while pending:
+        now = time.monotonic()
+        deadlines = {name: started.get(name, submitted) + timeout for name in pending}
+        for name, deadline in deadlines.items():
+            if deadline <= now:
+                del pending[name]
+        if not pending:
+            break
+        done, _ = wait(pending.values(), timeout=min(deadlines[name] for name in pending) - now,
+                       return_when=FIRST_COMPLETED)
+        pending = {name: future for name, future in pending.items() if future not in done}
+
+    for name, future in futures.items():
+        if not future.done():
+            future.cancel()
+            app.logger.warning(f"Query '{name}' missed the {timeout}s deadline")
+        elif future.exception() is None:
+            results[name] = future.result()
+            continue
+        else:
+            app.logger.error(f"Query '{name}' failed: {future.exception()}")
+        results[name] = defaults.get(name)
+        missing.append(name)
+
+    return results, missing
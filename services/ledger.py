@@ -0,0 +1,239 @@
+import base64
+from datetime import datetime, date
+from sqlalchemy import select, union_all, literal, null, case, func, and_, or_, type_coerce
+from extensions import db
+from models.subscription import ClientSubscription, SubscriptionPayment
+from models.project import Project
+from models.client import Client
+from models.expense import Expense
+from services.money import DEFAULT_CURRENCY
+
+# Prefix used for the public transaction id of each source
+SOURCE_PREFIXES = {
+    'subscription': 'sub_pay',
+    'project': 'project',
+    'expense': 'expense'
+}
+
+# Sources that make up each transaction type
+TYPE_SOURCES = {
+    'income': ('subscription', 'project'),
+    'expected': ('project',),
+    'expense': ('expense',)
+}
+
+# Statuses of projects whose budget is still expected, as in the financial summary
+EXPECTED_PROJECT_STATUSES = ('active', 'on_hold')
+
+DEFAULT_CHUNK_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def _subscription_payments_select(start_date, end_date):
+    """Subscription payments as ledger rows (income)"""
+    query = select(
+        literal('subscription').label('source'),
+        SubscriptionPayment.id.label('source_id'),
+        SubscriptionPayment.payment_date.label('date'),
+        literal('income').label('type'),
+        (literal('دفعة اشتراك - ') + ClientSubscription.subscription_plan).label('description'),
+        Client.display_name.label('client'),
+        Project.name.label('project'),
+        SubscriptionPayment.amount.label('amount'),
+        case((SubscriptionPayment.status == 'completed', 'paid'), else_='pending').label('status'),
+        ClientSubscription.client_id.label('client_id'),
+        ClientSubscription.project_id.label('project_id'),
+        SubscriptionPayment.currency.label('currency')
+    ).join(
+        ClientSubscription, SubscriptionPayment.subscription_id == ClientSubscription.id
+    ).join(
+        Client, ClientSubscription.client_id == Client.id
+    ).join(
+        Project, ClientSubscription.project_id == Project.id
+    )
+
+    if start_date:
+        query = query.where(SubscriptionPayment.payment_date >= start_date)
+    if end_date:
+        query = query.where(SubscriptionPayment.payment_date <= end_date)
+
+    return query
+
+
+def _projects_select(start_date, end_date):
+    """Project budgets as ledger rows in the client's currency (income, paid once completed, cancelled projects excluded)"""
+    query = select(
+        literal('project').label('source'),
+        Project.id.label('source_id'),
+        type_coerce(func.date(Project.created_at), db.Date).label('date'),
+        literal('income').label('type'),
+        (literal('مشروع: ') + Project.name).label('description'),
+        func.coalesce(Client.display_name, 'غير محدد').label('client'),
+        Project.name.label('project'),
+        Project.budget.label('amount'),
+        case(
+            (Project.status == 'completed', 'paid'),
+            (Project.status.in_(EXPECTED_PROJECT_STATUSES), 'expected'),
+            else_='pending'
+        ).label('status'),
+        Project.client_id.label('client_id'),
+        Project.id.label('project_id'),
+        Client.currency.label('currency')
+    ).outerjoin(
+        Client, Project.client_id == Client.id
+    ).where(
+        Project.budget > 0,
+        Project.status != 'cancelled'
+    )
+
+    if start_date:
+        query = query.where(Project.created_at >= datetime.combine(start_date, datetime.min.time()))
+    if end_date:
+        query = query.where(Project.created_at <= datetime.combine(end_date, datetime.max.time()))
+
+    return query
+
+
+def _expenses_select(start_date, end_date):
+    """Expenses as ledger rows"""
+    query = select(
+        literal('expense').label('source'),
+        Expense.id.label('source_id'),
+        Expense.expense_date.label('date'),
+        literal('expense').label('type'),
+        Expense.description.label('description'),
+        literal('مصروف').label('client'),
+        func.coalesce(func.nullif(Expense.category, ''), 'عام').label('project'),
+        Expense.amount.label('amount'),
+        case((Expense.status == 'approved', 'paid'), else_='pending').label('status'),
+        type_coerce(null(), db.Integer).label('client_id'),
+        Expense.project_id.label('project_id'),
+        Expense.currency.label('currency')
+    )
+
+    if start_date:
+        query = query.where(Expense.expense_date >= start_date)
+    if end_date:
+        query = query.where(Expense.expense_date <= end_date)
+
+    return query
+
+
+SOURCE_SELECTS = {
+    'subscription': _subscription_payments_select,
+    'project': _projects_select,
+    'expense': _expenses_select
+}
+
+
+def encode_cursor(row):
+    """Encode the sort key of a ledger row as an opaque cursor"""
+    raw = f"{row['date']}|{row['source']}|{row['source_id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        date_part, source, source_id = raw.split('|')
+        return date.fromisoformat(date_part), source, int(source_id)
+    except (ValueError, UnicodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def build_ledger_query(start_date=None, end_date=None, transaction_type=None,
+                       status=None, source=None, cursor=None):
+    """Build the UNION ALL ledger query, ordered newest first.
+
+    Type and source filters prune whole branches of the union, status and the
+    cursor are applied to the combined rows. Returns None when the filters
+    cannot match anything.
+    """
+    sources = list(SOURCE_SELECTS)
+    if transaction_type:
+        sources = [s for s in sources if s in TYPE_SOURCES.get(transaction_type, ())]
+        if transaction_type == 'expected':
+            status = status or 'expected'
+    if source:
+        sources = [s for s in sources if s == source]
+    if not sources:
+        return None
+
+    ledger = union_all(*[SOURCE_SELECTS[s](start_date, end_date) for s in sources]).subquery('ledger')
+    query = select(ledger)
+
+    if status:
+        query = query.where(ledger.c.status == status)
+
+    if cursor:
+        cursor_date, cursor_source, cursor_id = decode_cursor(cursor)
+        query = query.where(or_(
+            ledger.c.date < cursor_date,
+            and_(ledger.c.date == cursor_date, ledger.c.source < cursor_source),
+            and_(ledger.c.date == cursor_date, ledger.c.source == cursor_source,
+                 ledger.c.source_id < cursor_id)
+        ))
+
+    return query.order_by(ledger.c.date.desc(), ledger.c.source.desc(), ledger.c.source_id.desc())
+
+
+def row_to_transaction(row):
+    """Convert a ledger row to the transaction dict returned by the API"""
+    return {
+        'id': f"{SOURCE_PREFIXES[row.source]}_{row.source_id}",
+        'date': row.date.isoformat() if row.date else None,
+        'type': row.type,
+        'description': row.description,
+        'client': row.client,
+        'project': row.project,
+        'amount': float(row.amount or 0),
+        'currency': row.currency or DEFAULT_CURRENCY,
+        'status': row.status,
+        'source': row.source
+    }
+
+
+def iter_ledger_rows(start_date=None, end_date=None, transaction_type=None, status=None,
+                     source=None, cursor=None, limit=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield raw ledger rows, fetching them from the database in chunks"""
+    query = build_ledger_query(start_date, end_date, transaction_type, status, source, cursor)
+    if query is None:
+        return
+    if limit:
+        query = query.limit(limit)
+
+    result = db.session.execute(query.execution_options(yield_per=chunk_size))
+    for row in result:
+        yield row
+
+
+def iter_transactions(start_date=None, end_date=None, transaction_type=None, status=None,
+                      source=None, cursor=None, limit=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield transaction dicts newest first without materializing the whole ledger"""
+    for row in iter_ledger_rows(start_date, end_date, transaction_type, status, source,
+                                cursor, limit, chunk_size):
+        yield row_to_transaction(row)
+
+
+def get_transactions_page(start_date=None, end_date=None, transaction_type=None,
+                          status=None, source=None, cursor=None, limit=100):
+    """Return one page of transactions and the cursor of the next page"""
+    rows = list(iter_ledger_rows(start_date, end_date, transaction_type, status, source,
+                                  cursor, limit + 1, chunk_size=limit + 1))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor({
+            'date': last.date.isoformat(),
+            'source': last.source,
+            'source_id': last.source_id
+        })
+
+    return [row_to_transaction(row) for row in rows], next_cursor
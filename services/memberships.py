@@ -0,0 +1,109 @@
+from datetime import datetime
+from sqlalchemy import select, insert, delete, update, func
+from extensions import db
+from models.project import Project, project_team, project_clients
+from models.employee import Employee
+from models.client import Client
+from services.numbering import INSERT_IGNORE_DIALECTS
+
+# Association of each membership kind: table, member column, member model and
+# the project column counting the members, if any
+MEMBERSHIPS = {
+    'team': {'table': project_team, 'column': 'employee_id', 'model': Employee, 'counter': None},
+    'subscribers': {'table': project_clients, 'column': 'client_id', 'model': Client, 'counter': 'subscriber_count'}
+}
+
+# Member ids per IN list
+CHUNK_SIZE = 500
+
+
+class MembershipError(ValueError):
+    """Raised for an unknown membership kind or a project that cannot have it"""
+
+
+def _chunks(ids):
+    ids = sorted(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _ids(values):
+    return {int(value) for value in values or []}
+
+
+def _select_ids(column, criteria, ids=None):
+    """Values of a column matching the criteria, limited to `ids` when given, in chunked IN lists"""
+    if ids is None:
+        return set(db.session.execute(select(column).where(*criteria)).scalars())
+    found = set()
+    for chunk in _chunks(ids):
+        found.update(db.session.execute(select(column).where(*criteria, column.in_(chunk))).scalars())
+    return found
+
+
+def update_members(project_id, kind, add=None, remove=None, replace=None):
+    """Add, remove or replace the members of a project with set-based statements.
+
+    The requested ids are diffed against the existing ones in SQL; only the
+    missing rows are inserted, in one multi-row INSERT, and the extra rows
+    deleted, one DELETE per chunk. Ids that do not exist are skipped and
+    returned. A counter column is recounted with a single UPDATE from the
+    association table, so concurrent changes cannot leave it wrong. The
+    caller commits. Returns the ids added, removed and skipped and the new
+    number of members.
+    """
+    if kind not in MEMBERSHIPS:
+        raise MembershipError(f'Unknown membership: {kind}')
+    membership = MEMBERSHIPS[kind]
+    table = membership['table']
+    member = table.c[membership['column']]
+    in_project = table.c.project_id == project_id
+
+    project_type = db.session.execute(select(Project.project_type).where(Project.id == project_id)).scalar()
+    if project_type is None:
+        raise MembershipError(f'Unknown project: {project_id}')
+    if kind == 'subscribers' and project_type != 'subscription':
+        raise MembershipError('Only subscription projects have subscribers')
+
+    wanted = _ids(replace) if replace is not None else _ids(add)
+    unwanted = _ids(remove) - wanted
+    model_id = membership['model'].id
+    known = _select_ids(model_id, [], wanted) if wanted else set()
+    skipped = wanted - known
+
+    if replace is not None:
+        existing = _select_ids(member, [in_project])
+        unwanted = existing - known
+    else:
+        existing = _select_ids(member, [in_project], known) if known else set()
+        unwanted = _select_ids(member, [in_project], unwanted) if unwanted else set()
+    to_add = known - existing
+
+    if to_add:
+        rows = [{'project_id': project_id, membership['column']: member_id} for member_id in sorted(to_add)]
+        dialect = db.session.get_bind().dialect.name
+        if dialect in INSERT_IGNORE_DIALECTS:
+            # Rows added concurrently since the diff are ignored instead of failing the request
+            statement = INSERT_IGNORE_DIALECTS[dialect](table).values(rows).on_conflict_do_nothing()
+        else:
+            statement = insert(table).values(rows)
+        db.session.execute(statement)
+    for chunk in _chunks(unwanted):
+        db.session.execute(delete(table).where(in_project, member.in_(chunk)))
+
+    count_query = select(func.count()).select_from(table).where(in_project)
+    if membership['counter']:
+        db.session.execute(
+            update(Project)
+            .where(Project.id == project_id)
+            .values({membership['counter']: count_query.scalar_subquery(), 'updated_at': datetime.utcnow()})
+            .execution_options(synchronize_session=False)
+        )
+    count = db.session.execute(count_query).scalar()
+
+    return {
+        'added': sorted(to_add),
+        'removed': sorted(unwanted),
+        'skipped': sorted(skipped),
+        'count': count
+    }
@@ -0,0 +1,68 @@
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+from sqlalchemy import BigInteger, cast, case, func
+
+DEFAULT_CURRENCY = 'SAR'
+
+# Digits after the decimal point of the currencies that do not use 2
+MINOR_DIGITS = {'BHD': 3, 'JOD': 3, 'KWD': 3, 'OMR': 3, 'TND': 3, 'JPY': 0}
+
+
+def minor_digits(currency=None):
+    return MINOR_DIGITS.get(currency or DEFAULT_CURRENCY, 2)
+
+
+def to_minor(amount, currency=None):
+    """Exact integer amount in the currency's minor unit, e.g. Decimal('12.34') -> 1234"""
+    if amount is None:
+        return 0
+    return int((Decimal(str(amount)).scaleb(minor_digits(currency))).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor(minor, currency=None):
+    """Decimal amount of an integer minor unit amount"""
+    return Decimal(int(minor)).scaleb(-minor_digits(currency))
+
+
+def to_major(minor, currency=None):
+    """Float of an integer minor unit amount, for JSON and spreadsheets"""
+    return float(from_minor(minor, currency))
+
+
+def minor_units(column, currency_column=None):
+    """SQL expression of a Numeric column in minor units, so sums come back as exact integers"""
+    if currency_column is None:
+        factor = 10 ** minor_digits()
+    else:
+        factor = case(
+            *((currency_column == currency, 10 ** digits) for currency, digits in MINOR_DIGITS.items()),
+            else_=10 ** minor_digits()
+        )
+    return cast(func.round(func.coalesce(column, 0) * factor), BigInteger)
+
+
+def exact_sum(column, currency_column=None):
+    """SQL SUM of a Numeric column in minor units, 0 when there are no rows"""
+    return func.coalesce(func.sum(minor_units(column, currency_column)), 0)
+
+
+def minor_array(values):
+    """int64 array of minor unit amounts loaded with minor_units"""
+    return np.fromiter((value or 0 for value in values), dtype=np.int64)
+
+
+def sum_at(index, amounts, size):
+    """Exact int64 totals of the amounts grouped by an index in range(size)"""
+    totals = np.zeros(size, dtype=np.int64)
+    np.add.at(totals, index, amounts)
+    return totals
+
+
+def sum_by_currency(currencies, amounts):
+    """Exact totals of int64 minor unit amounts per currency, {currency: minor}"""
+    currencies = np.array([currency or DEFAULT_CURRENCY for currency in currencies])
+    if not len(currencies):
+        return {}
+    names, index = np.unique(currencies, return_inverse=True)
+    totals = sum_at(index, np.asarray(amounts, dtype=np.int64), len(names))
+    return {str(name): int(total) for name, total in zip(names, totals)}
@@ -0,0 +1,218 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from sqlalchemy import select, insert, update, case
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models.notification import Notification, NotificationCounter
+from models.user import User
+from services.dashboard import get_counts, get_alerts, FINANCIAL_ROLES
+from services.events import queue_event
+
+
+def _ensure_counters(user_ids):
+    """Create missing counter rows"""
+    existing = set(db.session.execute(
+        select(NotificationCounter.user_id).where(NotificationCounter.user_id.in_(user_ids))
+    ).scalars())
+    missing = [user_id for user_id in user_ids if user_id not in existing]
+    if missing:
+        db.session.execute(insert(NotificationCounter.__table__), [
+            {'user_id': user_id, 'unread_count': 0, 'updated_at': datetime.utcnow()} for user_id in missing
+        ])
+
+
+def _increment_counters(increments):
+    """Add to the unread counters, one UPDATE per distinct increment"""
+    _ensure_counters(list(increments))
+    by_amount = defaultdict(list)
+    for user_id, amount in increments.items():
+        by_amount[amount].append(user_id)
+    for amount, user_ids in by_amount.items():
+        db.session.execute(
+            update(NotificationCounter)
+            .where(NotificationCounter.user_id.in_(user_ids))
+            .values(unread_count=NotificationCounter.unread_count + amount, updated_at=datetime.utcnow())
+        )
+
+
+def evaluate_notifications(today=None):
+    """Generate today's alerts for every active user that has not received them.
+
+    Alerts are keyed by code and day, so running the evaluator again (or from
+    several workers) does not duplicate them. Returns the number created.
+    """
+    today = today or date.today()
+    counts = get_counts(today)
+    alerts_by_role = {
+        True: get_alerts(counts, include_financial=True),
+        False: get_alerts(counts, include_financial=False)
+    }
+
+    users = db.session.execute(
+        select(User.id, User.role).where(User.is_active.is_(True))
+    ).all()
+    keys = {f"{alert['code']}:{today.isoformat()}" for alerts in alerts_by_role.values() for alert in alerts}
+    if not users or not keys:
+        return 0
+
+    delivered = set(db.session.execute(
+        select(Notification.user_id, Notification.dedupe_key).where(Notification.dedupe_key.in_(keys))
+    ).all())
+
+    now = datetime.utcnow()
+    rows = []
+    increments = defaultdict(int)
+    for user in users:
+        for alert in alerts_by_role[user.role in FINANCIAL_ROLES]:
+            dedupe_key = f"{alert['code']}:{today.isoformat()}"
+            if (user.id, dedupe_key) in delivered:
+                continue
+            rows.append({
+                'user_id': user.id,
+                'type': alert['type'],
+                'title': alert['title'],
+                'message': alert['message'],
+                'action_url': alert['action_url'],
+                'priority': alert['priority'],
+                'dedupe_key': dedupe_key,
+                'is_read': False,
+                'created_at': now
+            })
+            increments[user.id] += 1
+
+    if not rows:
+        return 0
+
+    try:
+        db.session.execute(insert(Notification.__table__), rows)
+        _increment_counters(increments)
+        for user_id, created in increments.items():
+            queue_event(db.session, {'type': 'notifications', 'user_id': user_id, 'created': created})
+        db.session.commit()
+    except IntegrityError:
+        # Another worker delivered the same alerts first
+        db.session.rollback()
+        return 0
+
+    return len(rows)
+
+
+def deliver_alert(alert, day, roles=None):
+    """Add an alert to the inbox of the active users (of `roles` when given) that do not have it.
+
+    Keyed by the alert code and day like the evaluator's alerts. The caller
+    commits. Returns the number of notifications created.
+    """
+    dedupe_key = f"{alert['code']}:{day.isoformat()}"
+    query = select(User.id).where(User.is_active.is_(True))
+    if roles is not None:
+        query = query.where(User.role.in_(roles))
+    delivered = select(Notification.user_id).where(Notification.dedupe_key == dedupe_key)
+    user_ids = db.session.execute(query.where(User.id.notin_(delivered))).scalars().all()
+    if not user_ids:
+        return 0
+
+    now = datetime.utcnow()
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Notification.__table__), [{
+                'user_id': user_id,
+                'type': alert['type'],
+                'title': alert['title'],
+                'message': alert['message'],
+                'action_url': alert['action_url'],
+                'priority': alert['priority'],
+                'dedupe_key': dedupe_key,
+                'is_read': False,
+                'created_at': now
+            } for user_id in user_ids])
+    except IntegrityError:
+        # Another worker delivered it first
+        return 0
+
+    _increment_counters({user_id: 1 for user_id in user_ids})
+    for user_id in user_ids:
+        queue_event(db.session, {'type': 'notifications', 'user_id': user_id, 'created': 1})
+    return len(user_ids)
+
+
+def get_unread_count(user_id):
+    return db.session.execute(
+        select(NotificationCounter.unread_count).where(NotificationCounter.user_id == user_id)
+    ).scalar() or 0
+
+
+def get_inbox(user_id, limit=20, unread_only=False):
+    """Latest notifications of a user and the unread count"""
+    query = select(Notification).where(Notification.user_id == user_id)
+    if unread_only:
+        query = query.where(Notification.is_read.is_(False))
+    notifications = db.session.execute(
+        query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit)
+    ).scalars().all()
+    return notifications, get_unread_count(user_id)
+
+
+def mark_read(user_id, notification_ids=None):
+    """Mark notifications (all when no ids are given) as read, returns how many changed"""
+    query = update(Notification).where(
+        Notification.user_id == user_id,
+        Notification.is_read.is_(False)
+    )
+    if notification_ids is not None:
+        query = query.where(Notification.id.in_(notification_ids))
+
+    changed = db.session.execute(query.values(is_read=True, read_at=datetime.utcnow())).rowcount
+    if changed:
+        db.session.execute(
+            update(NotificationCounter)
+            .where(NotificationCounter.user_id == user_id)
+            .values(
+                unread_count=case(
+                    (NotificationCounter.unread_count > changed, NotificationCounter.unread_count - changed),
+                    else_=0
+                ),
+                updated_at=datetime.utcnow()
+            )
+        )
+    db.session.commit()
+    return changed
+
+
+def run_notification_evaluator(app, interval=None):
+    """Run evaluate_notifications every NOTIFICATION_EVALUATOR_INTERVAL seconds, forever"""
+    interval = interval or app.config.get('NOTIFICATION_EVALUATOR_INTERVAL') or 600
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                created = evaluate_notifications()
+                if created:
+                    app.logger.info(f"Notification evaluator created {created} notifications")
+            except Exception as e:
+                app.logger.error(f"Notification evaluator failed: {e}")
+            finally:
+                db.session.remove()
+
+
+def start_notification_evaluator(app):
+    """Run the evaluator in a daemon thread of this process when NOTIFICATION_EVALUATOR_ENABLED is set.
+
+    Only meant for single process servers; with several workers run
+    scripts/evaluate_notifications.py --loop (or cron it) instead, so
+    notifications are evaluated once rather than once per worker.
+    """
+    interval = app.config.get('NOTIFICATION_EVALUATOR_INTERVAL', 0)
+    if not app.config.get('NOTIFICATION_EVALUATOR_ENABLED') or not interval or app.config.get('TESTING'):
+        return None
+
+    thread = threading.Thread(
+        target=run_notification_evaluator,
+        args=(app, interval),
+        name='notification-evaluator',
+        daemon=True
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,118 @@
+from datetime import datetime
+from sqlalchemy import select, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models.number_sequence import NumberSequence, NO_YEAR
+from models.invoice import Invoice
+from models.project import Project
+from models.employee import Employee
+
+# Format and existing column of every sequence; yearly sequences restart at 1 each year
+SEQUENCES = {
+    'invoice': {'format': 'INV-{year}-{number:04d}', 'column': Invoice.invoice_number, 'yearly': True},
+    'project_subscription': {'format': 'SUB-{number:04d}', 'column': Project.project_code, 'yearly': False},
+    'project_onetime': {'format': 'ONE-{number:04d}', 'column': Project.project_code, 'yearly': False},
+    'employee': {'format': 'EMP{number:04d}', 'column': Employee.employee_id, 'yearly': False}
+}
+
+INSERT_IGNORE_DIALECTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+
+class UnknownSequence(ValueError):
+    """Raised for a sequence name that is not in SEQUENCES"""
+
+
+def _spec(name):
+    if name not in SEQUENCES:
+        raise UnknownSequence(f'Unknown sequence: {name}')
+    return SEQUENCES[name]
+
+
+def _sequence_year(spec, year):
+    if not spec['yearly']:
+        return NO_YEAR
+    return year or datetime.now().year
+
+
+def _prefix(spec, year):
+    return spec['format'].split('{number')[0].format(year=year)
+
+
+def _highest_existing(spec, year):
+    """Highest number already used by the documents of a sequence"""
+    prefix = _prefix(spec, year)
+    values = db.session.execute(
+        select(spec['column']).where(spec['column'].like(prefix + '%'))
+    ).scalars()
+    return max((int(value[len(prefix):]) for value in values if value[len(prefix):].isdigit()), default=0)
+
+
+def _ensure_sequence(name, spec, year):
+    """Create the sequence row, starting after the numbers already in use"""
+    table = NumberSequence.__table__
+    exists = db.session.execute(
+        select(table.c.id).where(table.c.name == name, table.c.year == year)
+    ).first()
+    if exists:
+        return
+
+    # Only runs once per sequence, so the existing documents are scanned once
+    row = {'name': name, 'year': year, 'last_value': _highest_existing(spec, year), 'updated_at': datetime.utcnow()}
+    dialect = db.session.get_bind().dialect.name
+    if dialect in INSERT_IGNORE_DIALECTS:
+        db.session.execute(INSERT_IGNORE_DIALECTS[dialect](table).values(**row).on_conflict_do_nothing())
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(table).values(**row))
+    except IntegrityError:
+        # Created concurrently
+        pass
+
+
+def reserve_numbers(name, count=1, year=None):
+    """Reserve `count` consecutive numbers of a sequence and return them as a range.
+
+    The counter is moved with a single UPDATE in the caller's transaction, so
+    concurrent callers wait on the sequence row instead of counting documents,
+    and a rolled back transaction gives its numbers back.
+    """
+    if count < 1:
+        raise ValueError('count must be at least 1')
+    spec = _spec(name)
+    year = _sequence_year(spec, year)
+    _ensure_sequence(name, spec, year)
+
+    table = NumberSequence.__table__
+    statement = update(table).where(table.c.name == name, table.c.year == year).values(
+        last_value=table.c.last_value + count,
+        updated_at=datetime.utcnow()
+    )
+    if db.session.get_bind().dialect.update_returning:
+        last_value = db.session.execute(statement.returning(table.c.last_value)).scalar_one()
+    else:
+        db.session.execute(statement)
+        last_value = db.session.execute(
+            select(table.c.last_value).where(table.c.name == name, table.c.year == year)
+        ).scalar_one()
+
+    return range(last_value - count + 1, last_value + 1)
+
+
+def format_number(name, number, year=None):
+    spec = _spec(name)
+    return spec['format'].format(year=_sequence_year(spec, year), number=number)
+
+
+def next_numbers(name, count=1, year=None):
+    """Reserve a block of formatted numbers, e.g. INV-2026-0001"""
+    return [format_number(name, number, year) for number in reserve_numbers(name, count, year)]
+
+
+def next_number(name, year=None):
+    """Reserve one formatted number"""
+    return next_numbers(name, 1, year)[0]
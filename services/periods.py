@@ -0,0 +1,325 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import event, select, func, and_, or_, inspect, union_all, literal, null, type_coerce
+from sqlalchemy.orm import Session
+from extensions import db
+from models.period_snapshot import PeriodSnapshot
+from models.subscription import ClientSubscription, SubscriptionPayment
+from models.project import Project
+from models.client import Client
+from models.expense import Expense
+from services.ledger import EXPECTED_PROJECT_STATUSES
+from services.money import exact_sum, from_minor
+from services.exchange_rates import convert_groups, rate_day, base_currency
+
+# Figures that add up across months; the others are point-in-time values
+ADDITIVE_FIELDS = (
+    'total_revenue',
+    'subscription_revenue',
+    'project_revenue',
+    'total_expenses',
+    'completed_projects'
+)
+
+POINT_IN_TIME_FIELDS = ('expected_revenue', 'active_subscriptions', 'pending_payments')
+
+# Source rows of the figures: model -> (date attribute, attributes that affect the figures)
+TRACKED_MODELS = {
+    SubscriptionPayment: ('payment_date', ('payment_date', 'amount', 'currency', 'status')),
+    Project: ('created_at', ('created_at', 'budget', 'status')),
+    Expense: ('expense_date', ('expense_date', 'amount', 'currency', 'status'))
+}
+
+
+class PeriodNotFinished(ValueError):
+    """Raised when closing a month that has not ended yet"""
+
+
+class PeriodAlreadyClosed(ValueError):
+    """Raised when closing a month that already has a snapshot"""
+
+
+class PeriodMissingRates(ValueError):
+    """Raised when closing a month with amounts in a currency that has no exchange rate"""
+
+
+def month_bounds(year, month):
+    """First and last day of a month"""
+    first = date(year, month, 1)
+    next_month = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return first, next_month - timedelta(days=1)
+
+
+def _figure(name, currency, day, value):
+    """Columns of a figure branch: (figure, currency, rate day, value)"""
+    return (
+        literal(name).label('figure'),
+        type_coerce(currency, db.String).label('currency'),
+        type_coerce(day, db.Date).label('rate_day'),
+        value.label('value')
+    )
+
+
+def _project_amount(project_day):
+    """Project budgets are in the client's currency"""
+    return Client.currency, project_day, exact_sum(Project.budget, Client.currency)
+
+
+def _convert_figures(branches, amount_fields, count_fields, day):
+    """Run grouped figure branches in one query and convert their amounts to the base currency.
+
+    Amount groups without a rate date are converted at `day`. Returns the
+    figures as Decimals and the currencies without a rate.
+    """
+    groups = defaultdict(list)
+    for row in db.session.execute(union_all(*branches)):
+        groups[row.figure].append((row.currency, row.rate_day, row.value))
+
+    base = base_currency()
+    figures = {field: sum(value or 0 for _, _, value in groups[field]) for field in count_fields}
+    missing_rates = set()
+    for field in amount_fields:
+        total, unconverted = convert_groups(groups[field], day)
+        figures[field] = from_minor(total, base)
+        missing_rates.update(unconverted)
+    return figures, missing_rates
+
+
+def compute_period_figures(start_date, end_date):
+    """Additive figures for a date range, in one query.
+
+    Amounts are converted to the base currency at the rate of their date.
+    Amounts in a currency without a rate are left out and the currency is
+    listed in missing_rates.
+    """
+    start_dt = datetime.combine(start_date, datetime.min.time())
+    end_dt = datetime.combine(end_date, datetime.max.time())
+    completed_projects = and_(
+        Project.created_at >= start_dt,
+        Project.created_at <= end_dt,
+        Project.status == 'completed'
+    )
+    payment_rate_day = rate_day(SubscriptionPayment.currency, SubscriptionPayment.payment_date)
+    project_rate_day = rate_day(Client.currency, func.date(Project.created_at))
+    expense_rate_day = rate_day(Expense.currency, Expense.expense_date)
+
+    figures, missing_rates = _convert_figures((
+        select(*_figure(
+            'subscription_revenue', SubscriptionPayment.currency, payment_rate_day,
+            exact_sum(SubscriptionPayment.amount, SubscriptionPayment.currency)
+        )).where(
+            SubscriptionPayment.payment_date >= start_date,
+            SubscriptionPayment.payment_date <= end_date,
+            SubscriptionPayment.status == 'completed'
+        ).group_by(SubscriptionPayment.currency, payment_rate_day),
+        select(*_figure('project_revenue', *_project_amount(project_rate_day)))
+        .outerjoin(Client, Project.client_id == Client.id)
+        .where(completed_projects).group_by(Client.currency, project_rate_day),
+        select(*_figure('completed_projects', null(), null(), func.count(Project.id))).where(completed_projects),
+        select(*_figure(
+            'total_expenses', Expense.currency, expense_rate_day, exact_sum(Expense.amount, Expense.currency)
+        )).where(
+            Expense.expense_date >= start_date,
+            Expense.expense_date <= end_date,
+            Expense.status == 'approved'
+        ).group_by(Expense.currency, expense_rate_day)
+    ), ('subscription_revenue', 'project_revenue', 'total_expenses'), ('completed_projects',), end_date)
+
+    return {
+        'total_revenue': figures['subscription_revenue'] + figures['project_revenue'],
+        'subscription_revenue': figures['subscription_revenue'],
+        'project_revenue': figures['project_revenue'],
+        'total_expenses': figures['total_expenses'],
+        'completed_projects': figures['completed_projects'],
+        'missing_rates': sorted(missing_rates)
+    }
+
+
+def compute_point_in_time_figures():
+    """Current expected revenue, active subscriptions and pending payments, amounts at today's rates"""
+    figures, missing_rates = _convert_figures((
+        select(*_figure('expected_revenue', *_project_amount(null())))
+        .outerjoin(Client, Project.client_id == Client.id)
+        .where(
+            Project.status.in_(EXPECTED_PROJECT_STATUSES),
+            Project.budget.isnot(None)
+        ).group_by(Client.currency),
+        select(*_figure('active_subscriptions', null(), null(), func.count(ClientSubscription.id))).where(
+            ClientSubscription.status == 'active'
+        ),
+        select(*_figure(
+            'pending_payments', SubscriptionPayment.currency, null(),
+            exact_sum(SubscriptionPayment.amount, SubscriptionPayment.currency)
+        )).where(
+            SubscriptionPayment.status == 'pending'
+        ).group_by(SubscriptionPayment.currency)
+    ), ('expected_revenue', 'pending_payments'), ('active_subscriptions',), date.today())
+
+    return {
+        'expected_revenue': figures['expected_revenue'],
+        'active_subscriptions': figures['active_subscriptions'],
+        'pending_payments': figures['pending_payments'],
+        'missing_rates': sorted(missing_rates)
+    }
+
+
+def get_snapshots(start_date, end_date):
+    """Snapshots of the months touched by a date range, keyed by (year, month)"""
+    start_key = start_date.year * 100 + start_date.month
+    end_key = end_date.year * 100 + end_date.month
+    snapshots = PeriodSnapshot.query.filter(
+        (PeriodSnapshot.year * 100 + PeriodSnapshot.month).between(start_key, end_key)
+    ).all()
+    return {(s.year, s.month): s for s in snapshots}
+
+
+def split_period(start_date, end_date, snapshots):
+    """Split a date range into closed months and the date ranges to compute live.
+
+    A month is read from its snapshot only when the range covers it entirely;
+    adjacent live parts are merged so they cost one query.
+    """
+    closed = []
+    live = []
+    current = start_date
+    while current <= end_date:
+        first, last = month_bounds(current.year, current.month)
+        segment_end = min(last, end_date)
+        snapshot = snapshots.get((current.year, current.month))
+
+        if snapshot and current == first and segment_end == last:
+            closed.append(snapshot)
+        elif live and live[-1][1] == current - timedelta(days=1):
+            live[-1] = (live[-1][0], segment_end)
+        else:
+            live.append((current, segment_end))
+
+        current = segment_end + timedelta(days=1)
+    return closed, live
+
+
+def get_financial_summary(start_date, end_date):
+    """Financial summary of a date range and the snapshots it was built from.
+
+    Closed months come from their snapshots and only the rest is computed
+    from raw rows. Point-in-time figures are live unless the whole range is
+    closed, in which case they are taken from the last snapshot.
+    """
+    closed, live = split_period(start_date, end_date, get_snapshots(start_date, end_date))
+
+    summary = {field: Decimal(0) for field in ADDITIVE_FIELDS}
+    summary['completed_projects'] = 0
+    missing_rates = set()
+
+    for snapshot in closed:
+        for field in ADDITIVE_FIELDS:
+            summary[field] += getattr(snapshot, field) or 0
+    for live_start, live_end in live:
+        figures = compute_period_figures(live_start, live_end)
+        for field in ADDITIVE_FIELDS:
+            summary[field] += figures[field]
+        missing_rates.update(figures['missing_rates'])
+
+    if closed and not live:
+        last = closed[-1]
+        summary.update({field: getattr(last, field) or 0 for field in POINT_IN_TIME_FIELDS})
+    else:
+        figures = compute_point_in_time_figures()
+        summary.update({field: figures[field] for field in POINT_IN_TIME_FIELDS})
+        missing_rates.update(figures['missing_rates'])
+
+    summary['net_profit'] = summary['total_revenue'] - summary['total_expenses']
+    summary['currency'] = base_currency()
+    summary['missing_rates'] = sorted(missing_rates)
+    return summary, closed
+
+
+def close_period(year, month, user_id=None):
+    """Write the immutable snapshot of a finished month"""
+    first, last = month_bounds(year, month)
+    if last >= date.today():
+        raise PeriodNotFinished(f'{year}-{month:02d} has not ended yet')
+    if PeriodSnapshot.query.filter_by(year=year, month=month).first():
+        raise PeriodAlreadyClosed(f'{year}-{month:02d} is already closed')
+
+    figures = compute_period_figures(first, last)
+    point_in_time = compute_point_in_time_figures()
+    # Snapshots are frozen, so they are only written once every amount could be converted
+    missing_rates = sorted(set(figures.pop('missing_rates')) | set(point_in_time.pop('missing_rates')))
+    figures.update(point_in_time)
+    if missing_rates:
+        raise PeriodMissingRates(f"No exchange rate for {', '.join(missing_rates)}")
+
+    snapshot = PeriodSnapshot(
+        year=year,
+        month=month,
+        net_profit=figures['total_revenue'] - figures['total_expenses'],
+        closed_by=user_id,
+        **figures
+    )
+    db.session.add(snapshot)
+    db.session.commit()
+    return snapshot
+
+
+def _months_of(obj, state, date_attr, attrs, is_new, is_deleted):
+    """Months whose figures are affected by the pending change of obj"""
+    if not (is_new or is_deleted) and not any(state.attrs[attr].history.has_changes() for attr in attrs):
+        return set()
+
+    values = [getattr(obj, date_attr)]
+    if not (is_new or is_deleted):
+        values.extend(state.attrs[date_attr].history.deleted)
+    return {(value.year, value.month) for value in values if value is not None}
+
+
+@event.listens_for(Session, 'before_flush')
+def flag_late_edits(session, flush_context, instances):
+    """Flag closed periods whose source rows are being changed"""
+    months = set()
+    for objects, is_new, is_deleted in ((session.new, True, False),
+                                        (session.dirty, False, False),
+                                        (session.deleted, False, True)):
+        for obj in objects:
+            tracked = TRACKED_MODELS.get(type(obj))
+            if tracked:
+                date_attr, attrs = tracked
+                months |= _months_of(obj, inspect(obj), date_attr, attrs, is_new, is_deleted)
+
+    if not months:
+        return
+
+    snapshots = session.execute(select(PeriodSnapshot).where(or_(*[
+        and_(PeriodSnapshot.year == year, PeriodSnapshot.month == month)
+        for year, month in months
+    ]))).scalars()
+    for snapshot in snapshots:
+        snapshot.flag_late_edit()
+
+
+def get_monthly_summaries(months):
+    """Summaries of whole months given as sorted (year, month) pairs.
+
+    Returns (summary, snapshot) pairs; snapshot is None for open months.
+    """
+    if not months:
+        return []
+
+    snapshots = get_snapshots(date(months[0][0], months[0][1], 1), date(months[-1][0], months[-1][1], 1))
+    point_in_time = None
+    summaries = []
+    for year, month in months:
+        snapshot = snapshots.get((year, month))
+        if snapshot:
+            summaries.append((snapshot.to_summary(), snapshot))
+            continue
+
+        summary = compute_period_figures(*month_bounds(year, month))
+        if point_in_time is None:
+            point_in_time = compute_point_in_time_figures()
+        summary.update({field: point_in_time[field] for field in POINT_IN_TIME_FIELDS})
+        summary['missing_rates'] = sorted(set(summary['missing_rates']) | set(point_in_time['missing_rates']))
+        summary['net_profit'] = summary['total_revenue'] - summary['total_expenses']
+        summaries.append((summary, None))
+    return summaries
@@ -0,0 +1,307 @@
+import hashlib
+import json
+from datetime import date
+from types import SimpleNamespace
+from sqlalchemy import select, func, literal
+from extensions import db, cache
+from models.expense import Expense
+from models.timetrack import TimeTrack
+from models.subscription import ClientSubscription, SubscriptionPayment
+from models.invoice import Invoice
+from models.project import Project
+from models.client import Client
+from models.employee import Employee
+from services.money import DEFAULT_CURRENCY, exact_sum, to_major
+from services.exchange_rates import to_base, rate_day, base_currency, rate_version, MissingExchangeRate
+
+DIMENSIONS = ('month', 'project', 'client', 'employee', 'category', 'status')
+MEASURES = ('sum_amount', 'sum_hours', 'count')
+FILTERS = ('project_id', 'client_id', 'employee_id', 'category', 'status')
+
+MAX_ROWS = 1000
+
+
+class InvalidPivotQuery(ValueError):
+    """Raised for a dimension, measure or filter the source does not support"""
+
+
+def _source(model, date_column, amount=None, currency=None, hours=None, project=None, client=None,
+            employee=None, category=None, status=None, joins=()):
+    return {
+        'model': model,
+        'date': date_column,
+        'amount': amount,
+        'currency': currency,
+        'hours': hours,
+        'project': project,
+        'client': client,
+        'employee': employee,
+        'category': category,
+        'status': status,
+        'joins': joins
+    }
+
+
+# Columns behind each dimension and measure of every source. The joins are
+# only added when a dimension or filter reads a joined column.
+SOURCES = {
+    'expenses': _source(
+        Expense, Expense.expense_date,
+        amount=Expense.amount,
+        currency=Expense.currency,
+        project=Expense.project_id,
+        client=Project.client_id,
+        employee=Expense.employee_id,
+        category=Expense.category,
+        status=Expense.status,
+        joins=((Project, Expense.project_id == Project.id),)
+    ),
+    'timetrack': _source(
+        TimeTrack, TimeTrack.date,
+        hours=TimeTrack.hours,
+        project=TimeTrack.project_id,
+        client=Project.client_id,
+        employee=TimeTrack.employee_id,
+        category=TimeTrack.activity_type,
+        status=TimeTrack.status,
+        joins=((Project, TimeTrack.project_id == Project.id),)
+    ),
+    'payments': _source(
+        SubscriptionPayment, SubscriptionPayment.payment_date,
+        amount=SubscriptionPayment.amount,
+        currency=SubscriptionPayment.currency,
+        project=ClientSubscription.project_id,
+        client=ClientSubscription.client_id,
+        category=ClientSubscription.subscription_plan,
+        status=SubscriptionPayment.status,
+        joins=((ClientSubscription, SubscriptionPayment.subscription_id == ClientSubscription.id),)
+    ),
+    'invoices': _source(
+        Invoice, Invoice.issue_date,
+        amount=Invoice.total_amount,
+        currency=Invoice.currency,
+        project=Invoice.project_id,
+        client=Invoice.client_id,
+        status=Invoice.status
+    )
+}
+
+# Display name of the entity dimensions
+LABELS = {
+    'project': (Project, Project.name),
+    'client': (Client, Client.display_name),
+    'employee': (Employee, Employee.first_name + literal(' ') + Employee.last_name)
+}
+
+
+def normalize_query(source, dimensions, measures, filters=None, start_date=None, end_date=None):
+    """Validate a pivot query and return it in a canonical form"""
+    if source not in SOURCES:
+        raise InvalidPivotQuery(f'Unknown source: {source}')
+    spec = SOURCES[source]
+
+    dimensions = list(dict.fromkeys(dimensions or []))
+    measures = sorted(set(measures or ['count']))
+    filters = {key: value for key, value in (filters or {}).items() if value not in (None, '')}
+
+    for dimension in dimensions:
+        if dimension not in DIMENSIONS:
+            raise InvalidPivotQuery(f'Unknown dimension: {dimension}')
+        if dimension != 'month' and spec[dimension] is None:
+            raise InvalidPivotQuery(f'Dimension {dimension} is not available for {source}')
+
+    for measure in measures:
+        if measure not in MEASURES:
+            raise InvalidPivotQuery(f'Unknown measure: {measure}')
+        if measure != 'count' and spec[measure[len('sum_'):]] is None:
+            raise InvalidPivotQuery(f'Measure {measure} is not available for {source}')
+
+    for key, value in filters.items():
+        if key not in FILTERS:
+            raise InvalidPivotQuery(f'Unknown filter: {key}')
+        if spec[key.replace('_id', '')] is None:
+            raise InvalidPivotQuery(f'Filter {key} is not available for {source}')
+        if key.endswith('_id'):
+            try:
+                filters[key] = int(value)
+            except (TypeError, ValueError):
+                raise InvalidPivotQuery(f'Invalid {key}: {value}')
+
+    if start_date and end_date and start_date > end_date:
+        raise InvalidPivotQuery('start_date is after end_date')
+
+    return {
+        'source': source,
+        'dimensions': dimensions,
+        'measures': measures,
+        'filters': dict(sorted(filters.items())),
+        'start_date': start_date.isoformat() if start_date else None,
+        'end_date': end_date.isoformat() if end_date else None
+    }
+
+
+def query_signature(query):
+    """Cache key of a normalized query"""
+    raw = json.dumps(query, sort_keys=True, default=str)
+    return 'pivot:' + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _column_of(spec, name):
+    """Column behind a dimension or filter, and whether it needs the source joins"""
+    column = spec[name]
+    return column, column.table is not spec['model'].__table__
+
+
+def build_pivot_select(query, limit=MAX_ROWS):
+    """Single GROUP BY statement for a normalized query.
+
+    With sum_amount every group is also split per currency and rate day, in
+    minor units, and the statement is not limited: run_pivot converts and
+    merges the splits and stops reading after `limit` groups.
+    """
+    spec = SOURCES[query['source']]
+    date_column = spec['date']
+    columns = []
+    group_by = []
+    needs_joins = False
+
+    for dimension in query['dimensions']:
+        if dimension == 'month':
+            column = func.extract('year', date_column) * 100 + func.extract('month', date_column)
+        else:
+            column, joined = _column_of(spec, dimension)
+            needs_joins = needs_joins or joined
+        columns.append(column.label(dimension))
+        group_by.append(column)
+
+    for measure in query['measures']:
+        if measure == 'count':
+            columns.append(func.count().label('count'))
+        elif measure == 'sum_amount':
+            columns.append(exact_sum(spec['amount'], spec['currency']).label(measure))
+        else:
+            measure_column = spec[measure[len('sum_'):]]
+            columns.append(func.coalesce(func.sum(measure_column), 0).label(measure))
+
+    converted = 'sum_amount' in query['measures']
+    split = []
+    if converted:
+        split = [spec['currency'], rate_day(spec['currency'], date_column)]
+        columns += [split[0].label('currency'), split[1].label('rate_day')]
+
+    criteria = []
+    if query['start_date']:
+        criteria.append(date_column >= date.fromisoformat(query['start_date']))
+    if query['end_date']:
+        criteria.append(date_column <= date.fromisoformat(query['end_date']))
+    for key, value in query['filters'].items():
+        column, joined = _column_of(spec, key.replace('_id', ''))
+        needs_joins = needs_joins or joined
+        criteria.append(column == value)
+
+    statement = select(*columns).select_from(spec['model'])
+    if needs_joins:
+        for model, on in spec['joins']:
+            statement = statement.outerjoin(model, on)
+
+    statement = statement.where(*criteria).group_by(*group_by, *split).order_by(*group_by)
+    return statement if converted else statement.limit(limit + 1)
+
+
+def _labels(dimension, ids):
+    """Display names of the entities in a result"""
+    model, name = LABELS[dimension]
+    ids = [entity_id for entity_id in ids if entity_id is not None]
+    if not ids:
+        return {}
+    return dict(db.session.execute(select(model.id, name).where(model.id.in_(ids))).all())
+
+
+def _merge_groups(rows, query, limit, missing_rates):
+    """Groups of currency split rows with sum_amount in base currency minor units.
+
+    Rows come ordered by the dimensions, so reading stops once `limit` + 1
+    groups are seen. Amounts in a currency without a rate are left out and
+    the currency added to missing_rates.
+    """
+    today = date.today()
+    groups = {}
+    for row in rows:
+        key = tuple(getattr(row, dimension) for dimension in query['dimensions'])
+        group = groups.get(key)
+        if group is None:
+            if len(groups) > limit:
+                break
+            group = groups[key] = {
+                **{dimension: value for dimension, value in zip(query['dimensions'], key)},
+                **{measure: 0 for measure in query['measures']}
+            }
+        for measure in query['measures']:
+            value = getattr(row, measure) or 0
+            if measure == 'sum_amount':
+                try:
+                    value = to_base(value, row.currency, row.rate_day or today)
+                except MissingExchangeRate:
+                    missing_rates.add(row.currency or DEFAULT_CURRENCY)
+                    continue
+            group[measure] += value
+    return list(groups.values())
+
+
+def run_pivot(query, limit=MAX_ROWS):
+    """Run a normalized query and return {'rows', 'truncated', 'currency', 'missing_rates'}"""
+    missing_rates = set()
+    result_rows = db.session.execute(build_pivot_select(query, limit))
+    if 'sum_amount' in query['measures']:
+        rows = [SimpleNamespace(**group) for group in _merge_groups(result_rows, query, limit, missing_rates)]
+        result_rows.close()
+    else:
+        rows = result_rows.all()
+    truncated = len(rows) > limit
+    rows = rows[:limit]
+
+    labels = {
+        dimension: _labels(dimension, {getattr(row, dimension) for row in rows})
+        for dimension in query['dimensions'] if dimension in LABELS
+    }
+
+    result = []
+    for row in rows:
+        item = {}
+        for dimension in query['dimensions']:
+            value = getattr(row, dimension)
+            if dimension == 'month':
+                value = f'{int(value) // 100}-{int(value) % 100:02d}' if value is not None else None
+            elif dimension in labels:
+                item[f'{dimension}_name'] = labels[dimension].get(value)
+            item[dimension] = value
+        for measure in query['measures']:
+            value = getattr(row, measure)
+            if measure == 'count':
+                item[measure] = int(value)
+            elif measure == 'sum_amount':
+                item[measure] = to_major(value, base_currency())
+            else:
+                item[measure] = float(value or 0)
+        result.append(item)
+
+    return {
+        'rows': result,
+        'truncated': truncated,
+        'currency': base_currency(),
+        'missing_rates': sorted(missing_rates)
+    }
+
+
+def get_pivot(query, timeout=300, limit=MAX_ROWS):
+    """Pivot result cached by the normalized query and, for amounts, the rate version"""
+    cache_key = query_signature({
+        **query,
+        'limit': limit,
+        'rate_version': rate_version() if 'sum_amount' in query['measures'] else None
+    })
+    result = cache.get(cache_key)
+    if result is None:
+        result = run_pivot(query, limit)
+        cache.set(cache_key, result, timeout=timeout)
+    return result
@@ -0,0 +1,233 @@
+from datetime import date
+import numpy as np
+from sqlalchemy import select, func
+from extensions import db, cache
+from models.project import Project
+from models.client import Client
+from models.employee import Employee
+from models.expense import Expense
+from models.invoice import Invoice
+from models.subscription import ClientSubscription, SubscriptionPayment
+from models.timetrack_daily import TimeTrackDaily
+from services.money import DEFAULT_CURRENCY, exact_sum, to_major
+from services.exchange_rates import get_rate, to_base, rate_day, base_currency, rate_version, MissingExchangeRate
+
+# Hours in a working month, used to derive an hourly cost from a monthly salary
+STANDARD_MONTHLY_HOURS = 176
+
+SORT_FIELDS = (
+    'name', 'revenue', 'labor_cost', 'expenses', 'total_cost', 'margin', 'margin_percentage',
+    'hours', 'billable_value', 'realization', 'effective_rate'
+)
+
+INVOICED_STATUSES = ('sent', 'paid', 'overdue')
+
+
+def _date_range(column, start_date, end_date):
+    criteria = []
+    if start_date:
+        criteria.append(column >= start_date)
+    if end_date:
+        criteria.append(column <= end_date)
+    return criteria
+
+
+def _per_project(project_index, rows, day, missing_rates):
+    """Base currency array of a grouped (project_id, currency, rate day, minor units) result aligned with the projects.
+
+    Groups in a currency without a rate are left out and the currency is
+    added to the project's missing_rates.
+    """
+    base = base_currency()
+    values = np.zeros(len(project_index))
+    for project_id, currency, group_day, minor in rows:
+        if project_id not in project_index:
+            continue
+        i = project_index[project_id]
+        try:
+            values[i] += to_major(to_base(minor or 0, currency, group_day or day), base)
+        except MissingExchangeRate:
+            missing_rates[i].add(currency or DEFAULT_CURRENCY)
+    return values
+
+
+def _rate_factors(currencies, days, day, missing_rates, rows_project):
+    """Base currency value of one unit per row, 0 with the currency added to missing_rates when there is no rate"""
+    factors = np.zeros(len(currencies))
+    for i, (currency, group_day) in enumerate(zip(currencies, days)):
+        try:
+            factors[i] = float(get_rate(currency, group_day or day))
+        except MissingExchangeRate:
+            if rows_project[i] >= 0:
+                missing_rates[rows_project[i]].add(currency or DEFAULT_CURRENCY)
+    return factors
+
+
+def compute_profitability(start_date=None, end_date=None):
+    """Margin of every project from a handful of grouped queries.
+
+    Labor cost is hours times the employee's hourly rate (or salary divided
+    by STANDARD_MONTHLY_HOURS). Billable value prices billable hours at the
+    project rate, falling back to the employee rate like
+    TimeTrack.billable_amount. Recognized revenue is completed subscription
+    payments plus, for one-time work, the larger of the payments recorded on
+    invoices and the project's paid_amount (both record the same money).
+    paid_amount has no date, so it only counts when no range is given.
+
+    Amounts are in the base currency: dated amounts at the rate of their
+    date, employee rates at the rate of the day worked, and the project's own
+    rate, budget and paid_amount (in the client's currency) at the rate of
+    end_date or today. Amounts in a currency without a rate are left out and
+    the currency listed in the project's missing_rates.
+    """
+    day = end_date or date.today()
+    projects = db.session.execute(
+        select(
+            Project.id, Project.name, Project.project_type, Project.status,
+            Project.hourly_rate, Project.budget,
+            Project.paid_amount, Client.display_name.label('client_name'), Client.currency
+        ).outerjoin(Client, Project.client_id == Client.id).order_by(Project.id)
+    ).all()
+    if not projects:
+        return []
+
+    project_index = {project.id: i for i, project in enumerate(projects)}
+    count = len(projects)
+    missing_rates = [set() for _ in projects]
+
+    # Hours per project and employee with the employee's cost rate, per rate day of foreign currency rates
+    cost_rate = func.coalesce(Employee.hourly_rate, Employee.salary / STANDARD_MONTHLY_HOURS, 0)
+    hours_rate_day = rate_day(Employee.currency, TimeTrackDaily.date)
+    hours = db.session.execute(
+        select(
+            TimeTrackDaily.project_id,
+            func.sum(TimeTrackDaily.billable_hours),
+            func.sum(TimeTrackDaily.non_billable_hours),
+            func.max(cost_rate),
+            func.max(func.coalesce(Employee.hourly_rate, 0)),
+            Employee.currency,
+            hours_rate_day
+        )
+        .outerjoin(Employee, TimeTrackDaily.employee_id == Employee.id)
+        .where(*_date_range(TimeTrackDaily.date, start_date, end_date))
+        .group_by(TimeTrackDaily.project_id, TimeTrackDaily.employee_id, Employee.currency, hours_rate_day)
+    ).all()
+
+    expense_rate_day = rate_day(Expense.currency, Expense.expense_date)
+    expenses = _per_project(project_index, db.session.execute(
+        select(Expense.project_id, Expense.currency, expense_rate_day, exact_sum(Expense.amount, Expense.currency))
+        .where(Expense.project_id.isnot(None), Expense.status != 'rejected',
+               *_date_range(Expense.expense_date, start_date, end_date))
+        .group_by(Expense.project_id, Expense.currency, expense_rate_day)
+    ).all(), day, missing_rates)
+
+    payment_rate_day = rate_day(SubscriptionPayment.currency, SubscriptionPayment.payment_date)
+    subscription_revenue = _per_project(project_index, db.session.execute(
+        select(
+            ClientSubscription.project_id, SubscriptionPayment.currency, payment_rate_day,
+            exact_sum(SubscriptionPayment.amount, SubscriptionPayment.currency)
+        )
+        .join(ClientSubscription, SubscriptionPayment.subscription_id == ClientSubscription.id)
+        .where(SubscriptionPayment.status == 'completed',
+               *_date_range(SubscriptionPayment.payment_date, start_date, end_date))
+        .group_by(ClientSubscription.project_id, SubscriptionPayment.currency, payment_rate_day)
+    ).all(), day, missing_rates)
+
+    invoice_rate_day = rate_day(Invoice.currency, Invoice.issue_date)
+    invoice_rows = db.session.execute(
+        select(
+            Invoice.project_id, Invoice.currency, invoice_rate_day,
+            exact_sum(Invoice.total_amount, Invoice.currency), exact_sum(Invoice.paid_amount, Invoice.currency)
+        )
+        .where(Invoice.status.in_(INVOICED_STATUSES),
+               *_date_range(Invoice.issue_date, start_date, end_date))
+        .group_by(Invoice.project_id, Invoice.currency, invoice_rate_day)
+    ).all()
+    invoiced = _per_project(project_index, [row[:4] for row in invoice_rows], day, missing_rates)
+    invoice_payments = _per_project(project_index, [(*row[:3], row[4]) for row in invoice_rows], day, missing_rates)
+
+    # Per project arrays, the project's own amounts are in the client's currency
+    project_factor = _rate_factors(
+        [project.currency for project in projects], [None] * count, day, missing_rates, range(count)
+    )
+    project_rate = np.array([float(project.hourly_rate or 0) for project in projects]) * project_factor
+    paid_amount = np.array([
+        float(project.paid_amount or 0) if project.project_type == 'onetime' else 0.0 for project in projects
+    ]) * project_factor
+    if start_date or end_date:
+        paid_amount = np.zeros(count)
+
+    if hours:
+        rows_project = np.array([project_index.get(row[0], -1) for row in hours])
+        factors = _rate_factors([row[5] for row in hours], [row[6] for row in hours], day, missing_rates, rows_project)
+        billable_hours = np.array([float(row[1] or 0) for row in hours])
+        non_billable_hours = np.array([float(row[2] or 0) for row in hours])
+        employee_cost_rate = np.array([float(row[3] or 0) for row in hours]) * factors
+        employee_rate = np.array([float(row[4] or 0) for row in hours]) * factors
+        known = rows_project >= 0
+        rows_project = rows_project[known]
+
+        price = np.where(project_rate[rows_project] > 0, project_rate[rows_project], employee_rate[known])
+        total_hours = np.bincount(rows_project, weights=(billable_hours + non_billable_hours)[known], minlength=count)
+        project_billable_hours = np.bincount(rows_project, weights=billable_hours[known], minlength=count)
+        labor_cost = np.bincount(
+            rows_project, weights=((billable_hours + non_billable_hours) * employee_cost_rate)[known], minlength=count
+        )
+        billable_value = np.bincount(rows_project, weights=billable_hours[known] * price, minlength=count)
+    else:
+        total_hours = project_billable_hours = labor_cost = billable_value = np.zeros(count)
+
+    revenue = subscription_revenue + np.maximum(invoice_payments, paid_amount)
+    total_cost = labor_cost + expenses
+    margin = revenue - total_cost
+
+    def ratio(numerator, denominator, scale=1):
+        return np.divide(numerator * scale, denominator, out=np.zeros(count), where=denominator > 0)
+
+    margin_percentage = ratio(margin, revenue, 100)
+    realization = ratio(revenue, billable_value, 100)
+    effective_rate = ratio(revenue, total_hours)
+    budget_used = ratio(total_cost, np.array([float(project.budget or 0) for project in projects]) * project_factor, 100)
+
+    return [{
+        'project_id': project.id,
+        'name': project.name,
+        'client_name': project.client_name,
+        'project_type': project.project_type,
+        'status': project.status,
+        'hours': round(float(total_hours[i]), 2),
+        'billable_hours': round(float(project_billable_hours[i]), 2),
+        'billable_value': round(float(billable_value[i]), 2),
+        'revenue': round(float(revenue[i]), 2),
+        'invoiced': round(float(invoiced[i]), 2),
+        'labor_cost': round(float(labor_cost[i]), 2),
+        'expenses': round(float(expenses[i]), 2),
+        'total_cost': round(float(total_cost[i]), 2),
+        'margin': round(float(margin[i]), 2),
+        'margin_percentage': round(float(margin_percentage[i]), 2),
+        'realization': round(float(realization[i]), 2),
+        'effective_rate': round(float(effective_rate[i]), 2),
+        'budget_used': round(float(budget_used[i]), 2),
+        'missing_rates': sorted(missing_rates[i])
+    } for i, project in enumerate(projects)]
+
+
+def get_profitability(start_date=None, end_date=None, timeout=300):
+    """Profitability of all projects cached per date range and rate version"""
+    cache_key = f"profitability:{start_date or ''}:{end_date or ''}:{rate_version()}"
+    projects = cache.get(cache_key)
+    if projects is None:
+        projects = compute_profitability(start_date, end_date)
+        cache.set(cache_key, projects, timeout=timeout)
+    return projects
+
+
+def summarize(projects):
+    """Company totals of a profitability result"""
+    totals = {field: round(sum(project[field] for project in projects), 2)
+              for field in ('revenue', 'labor_cost', 'expenses', 'total_cost', 'margin', 'hours')}
+    totals['margin_percentage'] = round(totals['margin'] * 100 / totals['revenue'], 2) if totals['revenue'] else 0
+    totals['projects'] = len(projects)
+    totals['currency'] = base_currency()
+    totals['missing_rates'] = sorted({currency for project in projects for currency in project['missing_rates']})
+    return totals
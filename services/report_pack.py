@@ -0,0 +1,203 @@
+from collections import defaultdict
+from datetime import date
+from sqlalchemy import select
+from extensions import db
+from models.project import Project
+from services.ledger import iter_ledger_rows, row_to_transaction
+from services.periods import compute_point_in_time_figures
+from services.excel import ExcelWorkbook
+from services.exports import TRANSACTION_HEADERS, transaction_values
+from services.money import DEFAULT_CURRENCY, to_minor, to_major
+from services.exchange_rates import to_base, base_currency, MissingExchangeRate
+
+ARABIC_MONTHS = {
+    1: 'يناير', 2: 'فبراير', 3: 'مارس', 4: 'أبريل',
+    5: 'مايو', 6: 'يونيو', 7: 'يوليو', 8: 'أغسطس',
+    9: 'سبتمبر', 10: 'أكتوبر', 11: 'نوفمبر', 12: 'ديسمبر'
+}
+
+
+def _month_range(first, last):
+    """Yield (year, month) from first to last inclusive"""
+    year, month = first
+    while (year, month) <= last:
+        yield year, month
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+
+class ReportPack:
+    """Aggregates ledger rows into every sheet of the report pack in one pass.
+
+    Amounts are converted to base currency minor units at the rate of the
+    row's date and summed as integers, so totals are exact however many rows
+    are folded in. Amounts in a currency without a rate are left out and the
+    currency is added to missing_rates.
+    """
+
+    def __init__(self):
+        self.today = date.today()
+        self.missing_rates = set()
+        self.summary = defaultdict(int)
+        self.months = defaultdict(lambda: defaultdict(int))
+        self.clients = {}
+        self.projects = {}
+        self.categories = {}
+
+    def _base_amount(self, row):
+        currency = row.currency or DEFAULT_CURRENCY
+        try:
+            return to_base(to_minor(row.amount, currency), currency, row.date or self.today)
+        except MissingExchangeRate:
+            self.missing_rates.add(currency)
+            return 0
+
+    def add(self, row):
+        amount = self._base_amount(row)
+        paid = row.status == 'paid'
+        expected = row.status == 'expected'
+        month = self.months[(row.date.year, row.date.month)] if row.date else None
+
+        if row.type == 'expense':
+            category = self.categories.setdefault(row.project, defaultdict(int))
+            category['count'] += 1
+            category['approved' if paid else 'pending'] += amount
+            if paid:
+                self.summary['total_expenses'] += amount
+                if month is not None:
+                    month['expenses'] += amount
+        else:
+            if paid:
+                self.summary['total_revenue'] += amount
+                self.summary[f'{row.source}_revenue'] += amount
+                if month is not None:
+                    month['revenue'] += amount
+            elif expected:
+                if month is not None:
+                    month['expected_revenue'] += amount
+            if row.source == 'project' and paid:
+                self.summary['completed_projects'] += 1
+
+            if row.client_id is not None:
+                client = self.clients.setdefault(row.client_id, defaultdict(int))
+                client['name'] = row.client
+                client['count'] += 1
+                client['paid' if paid else 'expected' if expected else 'pending'] += amount
+
+        if row.project_id is not None:
+            project = self.projects.setdefault(row.project_id, defaultdict(int))
+            if row.type == 'expense':
+                if paid:
+                    project['expenses'] += amount
+            else:
+                project['name'] = row.project
+                project['paid' if paid else 'expected' if expected else 'pending'] += amount
+
+    def fill_project_names(self):
+        """Look up names of projects that only appeared through expenses"""
+        missing = [project_id for project_id, project in self.projects.items() if not project.get('name')]
+        if missing:
+            names = dict(db.session.execute(
+                select(Project.id, Project.name).where(Project.id.in_(missing))
+            ).all())
+            for project_id in missing:
+                self.projects[project_id]['name'] = names.get(project_id, 'غير محدد')
+
+
+def create_report_pack(start_date, end_date, directory=None, track=None):
+    """Build the multi-sheet report pack and return the path of the temp file.
+
+    The ledger is scanned once: each row is streamed into the transactions
+    sheet and folded into the aggregates, which are written to their sheets
+    once the scan is done. xlsxwriter workbooks are not thread-safe, so the
+    sheets are written one after the other.
+    """
+    track = track or (lambda rows: rows)
+    pack = ReportPack()
+    currency = base_currency()
+
+    def major(minor):
+        return to_major(minor, currency)
+
+    workbook = ExcelWorkbook(directory)
+    try:
+        # Sheets appear in the order they are added
+        summary_sheet = workbook.add_sheet('الملخص', ['البند', 'القيمة'])
+        monthly_sheet = workbook.add_sheet('المقارنة الشهرية', [
+            'الشهر', 'الإيرادات', 'المصروفات', 'صافي الربح', 'الإيرادات المتوقعة'
+        ])
+        clients_sheet = workbook.add_sheet('العملاء', [
+            'العميل', 'المدفوع', 'المتوقع', 'المعلق', 'عدد المعاملات'
+        ])
+        projects_sheet = workbook.add_sheet('المشاريع', [
+            'المشروع', 'الإيرادات', 'المتوقع', 'المعلق', 'المصروفات', 'صافي الربح'
+        ])
+        categories_sheet = workbook.add_sheet('المصروفات حسب الفئة', [
+            'الفئة', 'المعتمد', 'المعلق', 'عدد المصروفات'
+        ])
+        transactions_sheet = workbook.add_sheet('المعاملات', TRANSACTION_HEADERS)
+
+        for row in track(iter_ledger_rows(start_date, end_date)):
+            pack.add(row)
+            transactions_sheet.write_row(transaction_values(row_to_transaction(row)))
+
+        pack.fill_project_names()
+        # Same point-in-time figures as the financial summary API
+        point_in_time = compute_point_in_time_figures()
+        summary = pack.summary
+
+        summary_sheet.write_row(['من تاريخ', start_date.isoformat() if start_date else 'غير محدد'])
+        summary_sheet.write_row(['إلى تاريخ', end_date.isoformat() if end_date else 'غير محدد'])
+        summary_sheet.write_row(['إجمالي الإيرادات', major(summary['total_revenue'])])
+        summary_sheet.write_row(['إيرادات الاشتراكات', major(summary['subscription_revenue'])])
+        summary_sheet.write_row(['إيرادات المشاريع', major(summary['project_revenue'])])
+        summary_sheet.write_row(['إجمالي المصروفات', major(summary['total_expenses'])])
+        summary_sheet.write_row(['صافي الربح', major(summary['total_revenue'] - summary['total_expenses'])])
+        summary_sheet.write_row(['الإيرادات المتوقعة', float(point_in_time['expected_revenue'])])
+        summary_sheet.write_row(['المشاريع المكتملة', summary['completed_projects']])
+        summary_sheet.write_row(['الاشتراكات النشطة', point_in_time['active_subscriptions']])
+        summary_sheet.write_row(['المدفوعات المعلقة', float(point_in_time['pending_payments'])])
+        summary_sheet.write_row(['العملة', currency])
+        missing_rates = sorted(pack.missing_rates | set(point_in_time['missing_rates']))
+        if missing_rates:
+            summary_sheet.write_row(['عملات بدون سعر صرف (غير محتسبة)', '، '.join(missing_rates)])
+
+        # Every month of the period, including months without transactions
+        months = sorted(pack.months)
+        first = (start_date.year, start_date.month) if start_date else (months[0] if months else None)
+        last = (end_date.year, end_date.month) if end_date else (months[-1] if months else None)
+        if first and last:
+            for year, month in _month_range(first, last):
+                figures = pack.months.get((year, month), {})
+                revenue = figures.get('revenue', 0)
+                expenses = figures.get('expenses', 0)
+                monthly_sheet.write_row([
+                    f"{ARABIC_MONTHS[month]} {year}",
+                    major(revenue),
+                    major(expenses),
+                    major(revenue - expenses),
+                    major(figures.get('expected_revenue', 0))
+                ])
+
+        for client in sorted(pack.clients.values(), key=lambda c: c['paid'], reverse=True):
+            clients_sheet.write_row([
+                client['name'], major(client['paid']), major(client['expected']), major(client['pending']),
+                client['count']
+            ])
+
+        for project in sorted(pack.projects.values(), key=lambda p: p['paid'], reverse=True):
+            projects_sheet.write_row([
+                project['name'], major(project['paid']), major(project['expected']), major(project['pending']),
+                major(project['expenses']), major(project['paid'] - project['expenses'])
+            ])
+
+        for name, category in sorted(pack.categories.items(), key=lambda c: c[1]['approved'], reverse=True):
+            categories_sheet.write_row([
+                name, major(category['approved']), major(category['pending']), category['count']
+            ])
+
+        return workbook.close()
+    except Exception:
+        workbook.discard()
+        raise
@@ -0,0 +1,478 @@
+from datetime import date
+import numpy as np
+from sqlalchemy import select, and_, or_, func, case, null
+from extensions import db, cache
+from models.subscription import ClientSubscription, SubscriptionPayment, CYCLE_DAYS
+from services.money import DEFAULT_CURRENCY, minor_units
+from services.exchange_rates import get_rate, base_currency, rate_version, MissingExchangeRate
+
+# Months covered by one billing of each cycle
+CYCLE_MONTHS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'yearly': 12
+}
+
+PROJECTION_MONTHS = 12
+
+# Months of history averaged into the churn forecast
+CHURN_WINDOW = 6
+
+
+def is_revenue_generating(today):
+    """SQL criterion of the subscriptions that count towards MRR on a day.
+
+    Active, started, out of the trial and not ended. The analytics engine uses
+    the same rule, so every MRR figure in the app agrees.
+    """
+    return and_(
+        ClientSubscription.status == 'active',
+        ClientSubscription.start_date <= today,
+        or_(ClientSubscription.trial_end_date.is_(None), ClientSubscription.trial_end_date < today),
+        or_(ClientSubscription.end_date.is_(None), ClientSubscription.end_date >= today)
+    )
+
+
+def current_mrr_groups(today):
+    """MRR per currency as (currency, rate day, minor units) rows for convert_groups.
+
+    Rows have no rate day, so convert_groups(rows, today) converts them at
+    today's rate.
+    """
+    return select(
+        ClientSubscription.currency,
+        null(),
+        func.coalesce(func.sum(case(
+            (is_revenue_generating(today), minor_units(ClientSubscription.monthly_price, ClientSubscription.currency)),
+            else_=0
+        )), 0)
+    ).group_by(ClientSubscription.currency)
+
+
+def _days(values):
+    """Dates as a datetime64[D] array, NaT for missing values"""
+    return np.array(list(values), dtype='datetime64[D]')
+
+
+def _month_ends(first_month, count, today):
+    """Snapshot day of each month: its last day, or today for the current month"""
+    months = np.arange(first_month, first_month + count).astype('datetime64[M]')
+    ends = (months + 1).astype('datetime64[D]') - 1
+    return np.minimum(ends, np.datetime64(today, 'D'))
+
+
+def _load_subscriptions():
+    rows = db.session.execute(select(
+        ClientSubscription.id,
+        ClientSubscription.monthly_price,
+        ClientSubscription.currency,
+        ClientSubscription.status,
+        ClientSubscription.billing_cycle,
+        ClientSubscription.start_date,
+        ClientSubscription.end_date,
+        ClientSubscription.trial_end_date,
+        ClientSubscription.next_billing_date,
+        ClientSubscription.updated_at
+    ).order_by(ClientSubscription.id)).all()
+    if not rows:
+        return None
+
+    (ids, prices, currencies, statuses, cycles, starts, ends, trial_ends, next_billing, updated) = zip(*rows)
+    statuses = np.array(statuses)
+    active = statuses == 'active'
+    trial_ends = _days(trial_ends)
+    ends = _days(ends)
+
+    # First day counted: the start, or the day after the trial
+    signup = _days(starts)
+    after_trial = trial_ends + 1
+    start = np.where(~np.isnat(after_trial) & (after_trial > signup), after_trial, signup)
+
+    # Last day counted: the end date, or for inactive subscriptions the day
+    # before they ended (their end date or last update, whichever is first)
+    stopped = np.fmin(ends, _days([value.date() if value else None for value in updated]))
+    stop = np.where(active, ends, stopped - 1)
+
+    return {
+        'index': {subscription_id: i for i, subscription_id in enumerate(ids)},
+        'price': np.array([float(price or 0) for price in prices]),
+        'currency': [currency or DEFAULT_CURRENCY for currency in currencies],
+        'active': active,
+        'cycle': np.array(cycles),
+        'signup': signup,
+        'start': start,
+        'stop': stop,
+        'end': ends,
+        'trial_end': trial_ends,
+        'next_billing': _days(next_billing)
+    }
+
+
+def _counted(subscriptions, snapshots, start='start'):
+    """(subscriptions x snapshots) mask of the subscriptions counted on each day"""
+    start = subscriptions[start][:, None]
+    stop = subscriptions['stop'][:, None]
+    return (start <= snapshots[None, :]) & (np.isnat(stop) | (stop >= snapshots[None, :]))
+
+
+def _base_rates(today):
+    """Rate lookup in the base currency on a day, None for currencies without a rate, and the missing currencies"""
+    rates = {}
+    missing = set()
+
+    def rate(currency):
+        currency = currency or DEFAULT_CURRENCY
+        if currency not in rates:
+            try:
+                rates[currency] = float(get_rate(currency, today))
+            except MissingExchangeRate:
+                rates[currency] = None
+                missing.add(currency)
+        return rates[currency]
+
+    return rate, missing
+
+
+def _price_history(subscriptions, first_month, count, rate):
+    """(subscriptions x months) monthly price.
+
+    Past months take the monthly amount of the completed payments whose
+    billing period covers them, later payments winning. A payment's monthly
+    amount is its amount over the months of the subscription's billing
+    cycle, applied to every month its period touches, so a period running
+    from the 9th to the 9th is not split across two months. The current (last)
+    month always uses the subscription's price, so upgrades and downgrades
+    show up as expansion and contraction. Payments are converted with
+    `rate`; payments in a currency without a rate are skipped.
+    """
+    price = np.repeat(subscriptions['price'][:, None], count, axis=1)
+    rows = db.session.execute(
+        select(
+            SubscriptionPayment.subscription_id,
+            SubscriptionPayment.amount,
+            SubscriptionPayment.currency,
+            SubscriptionPayment.billing_period_start,
+            SubscriptionPayment.billing_period_end
+        )
+        .where(
+            SubscriptionPayment.status == 'completed',
+            SubscriptionPayment.billing_period_start.isnot(None),
+            SubscriptionPayment.billing_period_end.isnot(None)
+        )
+        .order_by(SubscriptionPayment.payment_date, SubscriptionPayment.id)
+    ).all()
+    if not rows:
+        return price
+
+    subscription_ids, amounts, currencies, period_starts, period_ends = zip(*rows)
+    index = subscriptions['index']
+    rows_index = np.array([index.get(subscription_id, -1) for subscription_id in subscription_ids])
+    factors = np.array([rate(currency) or 0 for currency in currencies])
+    known = (rows_index >= 0) & (factors > 0)
+
+    rows_index = rows_index[known]
+    first = _days(period_starts).astype('datetime64[M]').astype(int)[known]
+    last = _days(period_ends).astype('datetime64[M]').astype(int)[known]
+    covered = np.maximum(last - first + 1, 1)
+    cycle_months = np.array([CYCLE_MONTHS.get(cycle, 1) for cycle in subscriptions['cycle']])
+    monthly = (np.array([float(amount or 0) for amount in amounts]) * factors)[known] / cycle_months[rows_index]
+
+    # One cell per payment and covered month
+    repeat_rows = np.repeat(rows_index, covered)
+    offsets = np.arange(covered.sum()) - np.repeat(np.cumsum(covered) - covered, covered)
+    columns = np.repeat(first, covered) + offsets - first_month
+    values = np.repeat(monthly, covered)
+    inside = (columns >= 0) & (columns < count - 1)
+    price[repeat_rows[inside], columns[inside]] = values[inside]
+    return price
+
+
+def _movements(mrr):
+    """MRR movements of every month against the previous one, for a (subscriptions x months) matrix"""
+    previous, current = mrr[:, :-1], mrr[:, 1:]
+    paying_before = np.logical_or.accumulate(mrr > 0, axis=1)[:, :-1]
+    starts = (previous == 0) & (current > 0)
+    return {
+        'new': np.where(starts & ~paying_before, current, 0).sum(axis=0),
+        'reactivation': np.where(starts & paying_before, current, 0).sum(axis=0),
+        'expansion': np.where((previous > 0) & (current > previous), current - previous, 0).sum(axis=0),
+        'contraction': np.where((current > 0) & (current < previous), previous - current, 0).sum(axis=0),
+        'churn': np.where((previous > 0) & (current == 0), previous, 0).sum(axis=0),
+        'churned_subscriptions': ((previous > 0) & (current == 0)).sum(axis=0),
+        'previous_subscriptions': (previous > 0).sum(axis=0)
+    }
+
+
+def _projection(subscriptions, today, churn_rate):
+    """Contracted MRR and billings of the next PROJECTION_MONTHS months"""
+    this_month = np.datetime64(today, 'M').astype(int)
+    snapshots = _month_ends(this_month + 1, PROJECTION_MONTHS, date.max)
+    active = subscriptions['active']
+
+    contracted = np.where(_counted(subscriptions, snapshots) & active[:, None],
+                          subscriptions['price'][:, None], 0).sum(axis=0)
+
+    # Billing dates from the next billing date, skipping the trial and stopping at the end date
+    cycle_days = np.array([CYCLE_DAYS.get(cycle, 0) for cycle in subscriptions['cycle']])
+    cycle_months = np.array([CYCLE_MONTHS.get(cycle, 1) for cycle in subscriptions['cycle']])
+    horizon = snapshots[-1]
+    steps = np.arange(PROJECTION_MONTHS + 2)
+    billing_dates = subscriptions['next_billing'][:, None] + (cycle_days[:, None] * steps[None, :]).astype('timedelta64[D]')
+    trial_end = subscriptions['trial_end'][:, None]
+    end = subscriptions['end'][:, None]
+    billed = (
+        active[:, None] & (cycle_days[:, None] > 0)
+        & (billing_dates >= np.datetime64(today, 'D')) & (billing_dates <= horizon)
+        & (np.isnat(trial_end) | (billing_dates > trial_end))
+        & (np.isnat(end) | (billing_dates <= end))
+    )
+    months = billing_dates.astype('datetime64[M]').astype(int) - this_month - 1
+    amounts = np.broadcast_to((subscriptions['price'] * cycle_months)[:, None], billing_dates.shape)
+    in_range = billed & (months >= 0)
+    billings = np.bincount(months[in_range], weights=amounts[in_range], minlength=PROJECTION_MONTHS)[:PROJECTION_MONTHS]
+
+    overdue = active & (subscriptions['next_billing'] < np.datetime64(today, 'D'))
+    overdue_amount = float((subscriptions['price'] * cycle_months)[overdue].sum())
+
+    survival = (1 - churn_rate) ** np.arange(1, PROJECTION_MONTHS + 1)
+    projection = [{
+        'month': str(snapshots[i].astype('datetime64[M]')),
+        'contracted_mrr': round(float(contracted[i]), 2),
+        'expected_mrr': round(float(contracted[i] * survival[i]), 2),
+        'billings': round(float(billings[i]), 2),
+        'expected_billings': round(float(billings[i] * survival[i]), 2)
+    } for i in range(PROJECTION_MONTHS)]
+    return projection, overdue_amount
+
+
+def compute_subscription_analytics(today=None, months=12):
+    """MRR, ARR, movements of the last `months` months and a 12 month projection.
+
+    Every subscription is one row of (subscriptions x months) arrays: a month
+    counts the subscriptions that are running on its last day (today for the
+    current month), priced from their payments (see _price_history), so the
+    current MRR matches current_mrr_groups. Amounts are converted to the base
+    currency at today's rate, so movements are not moved by exchange rates;
+    subscriptions in a currency without a rate are left out and their
+    currencies listed in missing_rates. Movements
+    compare each month with the previous one. The projection prices the
+    contracted subscriptions and their billing dates by cycle, starting after
+    trial end dates, and discounts them by the average monthly churn rate of
+    the last CHURN_WINDOW months.
+    """
+    today = today or date.today()
+    this_month = np.datetime64(today, 'M').astype(int)
+    empty = {
+        'as_of': today.isoformat(),
+        'summary': {'mrr': 0, 'arr': 0, 'subscriptions': 0, 'average_mrr': 0,
+                    'churn_rate': 0, 'revenue_churn_rate': 0, 'overdue_amount': 0},
+        'movements': [],
+        'projection': [],
+        'currency': base_currency(),
+        'missing_rates': []
+    }
+    subscriptions = _load_subscriptions()
+    if subscriptions is None:
+        return empty
+
+    rate, missing_rates = _base_rates(today)
+    factor = np.array([rate(currency) or 0 for currency in subscriptions['currency']])
+    subscriptions = {**subscriptions, 'price': subscriptions['price'] * factor}
+
+    # One extra month so the first reported month has movements
+    first_month = this_month - months
+    snapshots = _month_ends(first_month, months + 1, today)
+    price = _price_history(subscriptions, first_month, months + 1, rate)
+    price[factor == 0] = 0
+    mrr = np.where(_counted(subscriptions, snapshots), price, 0)
+    mrr = np.round(mrr, 2)
+
+    totals = mrr.sum(axis=0)
+    counts = (mrr > 0).sum(axis=0)
+    movements = _movements(mrr)
+
+    churn_rates = np.divide(movements['churned_subscriptions'], movements['previous_subscriptions'],
+                            out=np.zeros(months), where=movements['previous_subscriptions'] > 0)
+    revenue_churn = np.divide(movements['churn'] + movements['contraction'], totals[:-1],
+                              out=np.zeros(months), where=totals[:-1] > 0)
+    churn_rate = float(churn_rates[-CHURN_WINDOW:].mean())
+
+    projection, overdue_amount = _projection(subscriptions, today, churn_rate)
+
+    history = []
+    for i in range(months):
+        new, expansion = movements['new'][i], movements['expansion'][i]
+        reactivation, contraction, churn = movements['reactivation'][i], movements['contraction'][i], movements['churn'][i]
+        history.append({
+            'month': str(snapshots[i + 1].astype('datetime64[M]')),
+            'mrr': round(float(totals[i + 1]), 2),
+            'arr': round(float(totals[i + 1]) * 12, 2),
+            'subscriptions': int(counts[i + 1]),
+            'new': round(float(new), 2),
+            'expansion': round(float(expansion), 2),
+            'reactivation': round(float(reactivation), 2),
+            'contraction': round(float(contraction), 2),
+            'churn': round(float(churn), 2),
+            'net_new': round(float(new + expansion + reactivation - contraction - churn), 2),
+            'churned_subscriptions': int(movements['churned_subscriptions'][i]),
+            'churn_rate': round(float(churn_rates[i]) * 100, 2)
+        })
+
+    current = float(totals[-1])
+    return {
+        'as_of': today.isoformat(),
+        'summary': {
+            'mrr': round(current, 2),
+            'arr': round(current * 12, 2),
+            'subscriptions': int(counts[-1]),
+            'average_mrr': round(current / int(counts[-1]), 2) if counts[-1] else 0,
+            'churn_rate': round(churn_rate * 100, 2),
+            'revenue_churn_rate': round(float(revenue_churn[-CHURN_WINDOW:].mean()) * 100, 2),
+            'overdue_amount': round(overdue_amount, 2)
+        },
+        'movements': history,
+        'projection': projection,
+        'currency': base_currency(),
+        'missing_rates': sorted(missing_rates)
+    }
+
+
+def get_subscription_analytics(today=None, months=12, timeout=3600):
+    """Subscription analytics cached per day and rate version"""
+    today = today or date.today()
+    cache_key = f'subscription_analytics:{today.isoformat()}:{months}:{rate_version()}'
+    analytics = cache.get(cache_key)
+    if analytics is None:
+        analytics = compute_subscription_analytics(today, months)
+        cache.set(cache_key, analytics, timeout=timeout)
+    return analytics
+
+
+def _paying(subscriptions, first_month, count, since=None):
+    """(subscriptions x months) mask of the months covered by a completed payment.
+
+    A payment covers its billing period, or one billing cycle from its
+    payment date when it has none.
+    """
+    paying = np.zeros((len(subscriptions['index']), count), dtype=bool)
+    query = select(
+        SubscriptionPayment.subscription_id,
+        func.coalesce(SubscriptionPayment.billing_period_start, SubscriptionPayment.payment_date),
+        SubscriptionPayment.billing_period_end
+    ).where(SubscriptionPayment.status == 'completed')
+    if since:
+        query = query.where(SubscriptionPayment.payment_date >= since)
+    rows = db.session.execute(query).all()
+    if not rows:
+        return paying
+
+    subscription_ids, period_starts, period_ends = zip(*rows)
+    index = subscriptions['index']
+    rows_index = np.array([index.get(subscription_id, -1) for subscription_id in subscription_ids])
+    known = rows_index >= 0
+    rows_index = rows_index[known]
+    cycle_months = np.array([CYCLE_MONTHS.get(cycle, 1) for cycle in subscriptions['cycle']])
+
+    period_ends = _days(period_ends)[known]
+    first = _days(period_starts)[known].astype('datetime64[M]').astype(int)
+    last = period_ends.astype('datetime64[M]').astype(int)
+    covered = np.where(np.isnat(period_ends), cycle_months[rows_index], np.maximum(last - first + 1, 1))
+
+    repeat_rows = np.repeat(rows_index, covered)
+    offsets = np.arange(covered.sum()) - np.repeat(np.cumsum(covered) - covered, covered)
+    columns = np.repeat(first, covered) + offsets - first_month
+    inside = (columns >= 0) & (columns < count)
+    paying[repeat_rows[inside], columns[inside]] = True
+    return paying
+
+
+def _cohort_counts(subscriptions, first_month, count, snapshots, paying):
+    """Cohort sizes and (cohorts x age) counts of active and paying subscriptions.
+
+    Cohorts are the `count` start months from first_month; `snapshots` and
+    `paying` hold the calendar months to count, which may be fewer.
+    """
+    cohort = subscriptions['signup'].astype('datetime64[M]').astype(int) - first_month
+    in_cohort = (cohort >= 0) & (cohort < count)
+    sizes = np.bincount(cohort[in_cohort], minlength=count)[:count]
+
+    columns = snapshots.astype('datetime64[M]').astype(int) - first_month
+    age = columns[None, :] - cohort[:, None]
+    valid = in_cohort[:, None] & (age >= 0)
+    cells = cohort[:, None] * count + age
+    active = _counted(subscriptions, snapshots, start='signup')
+
+    def matrix(mask):
+        return np.bincount(cells[valid & mask], minlength=count * count)[:count * count].reshape(count, count)
+
+    return sizes, matrix(active), matrix(paying)
+
+
+def _closed_cohorts(first_month, count, this_month):
+    """Counts of the months before the current one, which no longer change"""
+    subscriptions = _load_subscriptions()
+    closed = this_month - first_month
+    if subscriptions is None or closed <= 0:
+        return np.zeros(count, dtype=int), np.zeros((count, count), dtype=int), np.zeros((count, count), dtype=int)
+    snapshots = _month_ends(first_month, closed, date.max)
+    paying = _paying(subscriptions, first_month, closed)
+    return _cohort_counts(subscriptions, first_month, count, snapshots, paying)
+
+
+def get_subscription_cohorts(today=None, months=12, timeout=86400):
+    """Retention of the subscriptions started in each of the last `months` months.
+
+    Every cohort gets the share of its subscriptions that are active (running
+    on the last day of the month) and paying (covered by a completed payment)
+    at each month of age. Subscriptions and payments are loaded once into
+    arrays and counted into (cohorts x age) matrices with one bincount. The
+    closed months are cached for `timeout` seconds and only the current
+    month is counted again.
+    """
+    today = today or date.today()
+    this_month = np.datetime64(today, 'M').astype(int)
+    first_month = this_month - months + 1
+
+    cache_key = f'subscription_cohorts:{np.datetime64(int(first_month), "M")}:{months}'
+    closed = cache.get(cache_key)
+    if closed is None:
+        closed = [counts.tolist() for counts in _closed_cohorts(first_month, months, this_month)]
+        cache.set(cache_key, closed, timeout=timeout)
+    sizes, active, paying = (np.array(counts) for counts in closed)
+
+    # Current month: the new cohort and today's column of every cohort
+    subscriptions = _load_subscriptions()
+    if subscriptions is not None:
+        snapshot = np.array([np.datetime64(today, 'D')])
+        since = (np.datetime64(today, 'M') - 12).astype('datetime64[D]').astype(date)
+        current_paying = _paying(subscriptions, this_month, 1, since=since)
+        current_sizes, current_active, current_paying = _cohort_counts(
+            subscriptions, first_month, months, snapshot, current_paying
+        )
+        sizes[-1] = current_sizes[-1]
+        active = active + current_active
+        paying = paying + current_paying
+
+    cohorts = []
+    for i in range(months):
+        ages = months - i
+        size = int(sizes[i])
+        cohorts.append({
+            'cohort': str(np.datetime64(int(first_month + i), 'M')),
+            'size': size,
+            'active': [int(value) for value in active[i, :ages]],
+            'paying': [int(value) for value in paying[i, :ages]],
+            'active_rate': [round(int(value) * 100 / size, 2) if size else 0 for value in active[i, :ages]],
+            'paying_rate': [round(int(value) * 100 / size, 2) if size else 0 for value in paying[i, :ages]]
+        })
+
+    # Average retention by age, weighted by the cohorts that reached it
+    reached = [int(sizes[:months - age].sum()) for age in range(months)]
+    average = {
+        'active_rate': [round(int(active[:months - age, age].sum()) * 100 / reached[age], 2) if reached[age] else 0
+                        for age in range(months)],
+        'paying_rate': [round(int(paying[:months - age, age].sum()) * 100 / reached[age], 2) if reached[age] else 0
+                        for age in range(months)]
+    }
+
+    return {'as_of': today.isoformat(), 'cohorts': cohorts, 'average': average}
@@ -0,0 +1,183 @@
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, func, or_, and_, bindparam
+from extensions import db
+from models.subscription import ClientSubscription, CYCLE_DAYS
+from services.dashboard import FINANCIAL_ROLES
+from services.notifications import deliver_alert
+
+ENDING_STATUSES = ('active', 'paused')
+CLOSED_STATUSES = ('cancelled', 'expired')
+
+
+def _owes_nothing():
+    """Due date that needs no payment: a free plan or a date inside the trial"""
+    return or_(
+        ClientSubscription.monthly_price == 0,
+        ClientSubscription.trial_end_date >= ClientSubscription.next_billing_date
+    )
+
+
+def _id_ranges(chunk_size):
+    """Consecutive id ranges covering every subscription"""
+    low, high = db.session.execute(
+        select(func.min(ClientSubscription.id), func.max(ClientSubscription.id))
+    ).one()
+    if low is None:
+        return
+    for start in range(low, high + 1, chunk_size):
+        yield start, start + chunk_size
+
+
+def _update(chunk, *criteria, **values):
+    """Set-based UPDATE limited to an id range, returns the number of rows changed"""
+    start, stop = chunk
+    return db.session.execute(
+        update(ClientSubscription)
+        .where(ClientSubscription.id >= start, ClientSubscription.id < stop, *criteria)
+        .values(**values, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def _advance(chunk, run_date):
+    """Move due dates that need no payment forward, one UPDATE per cycle and date.
+
+    Free plans move past the run date. Dates that owe nothing only because of
+    the trial move past the run date or to the first billing date after the
+    trial ends, whichever comes first, so the dates after the trial are still
+    charged and flagged overdue.
+    """
+    start, stop = chunk
+    free = ClientSubscription.monthly_price == 0
+    due = and_(
+        ClientSubscription.id >= start,
+        ClientSubscription.id < stop,
+        ClientSubscription.status == 'active',
+        ClientSubscription.next_billing_date <= run_date,
+        _owes_nothing()
+    )
+    groups = db.session.execute(
+        select(ClientSubscription.billing_cycle, ClientSubscription.next_billing_date,
+               ClientSubscription.trial_end_date, free)
+        .where(due).distinct()
+    ).all()
+
+    free_params = {}
+    trial_params = []
+    for billing_cycle, billing_date, trial_end_date, is_free in groups:
+        if billing_cycle not in CYCLE_DAYS:
+            continue
+        cycle_days = CYCLE_DAYS[billing_cycle]
+        cycles = (run_date - billing_date).days // cycle_days + 1
+        if is_free:
+            free_params[billing_cycle, billing_date] = {
+                'cycle': billing_cycle,
+                'billing_date': billing_date,
+                'advanced_date': billing_date + timedelta(days=cycles * cycle_days)
+            }
+            continue
+        cycles = min(cycles, (trial_end_date - billing_date).days // cycle_days + 1)
+        trial_params.append({
+            'cycle': billing_cycle,
+            'billing_date': billing_date,
+            'trial_end': trial_end_date,
+            'advanced_date': billing_date + timedelta(days=cycles * cycle_days)
+        })
+
+    table = ClientSubscription.__table__
+    advanced = 0
+    # Free plans first, so the trial UPDATE only matches the paid plans left due
+    for criteria, params in (
+        ([free], list(free_params.values())),
+        ([table.c.trial_end_date == bindparam('trial_end')], trial_params)
+    ):
+        if not params:
+            continue
+        advanced += db.session.execute(
+            update(table)
+            .where(due, *criteria, table.c.billing_cycle == bindparam('cycle'),
+                   table.c.next_billing_date == bindparam('billing_date'))
+            .values(next_billing_date=bindparam('advanced_date'), renewal_reminder_sent=False,
+                    overdue_since=None, updated_at=datetime.utcnow()),
+            params
+        ).rowcount
+    return advanced
+
+
+def run_subscription_billing(run_date=None, grace_days=None, pause_after_days=None, reminder_days=None,
+                             chunk_size=None):
+    """Bring every subscription's billing state up to date for a day.
+
+    Works through the subscriptions in id ranges of `chunk_size`, each a few
+    set-based UPDATEs and one commit:
+      - active or paused subscriptions past their end date expire
+      - due dates that need no payment (free plan, inside the trial) advance
+      - unpaid due dates older than `grace_days` are flagged with overdue_since,
+        and the flag is cleared once the subscription is paid or closed
+      - active subscriptions with 3 failed payments, or overdue for more than
+        `pause_after_days`, are paused
+      - subscriptions billing within `reminder_days` get renewal_reminder_sent
+    Financial users get one notification per day about the reminders queued.
+    Running it again for the same day changes nothing. Settings that are not
+    given come from the SUBSCRIPTION_* config values. Returns the counts.
+    """
+    config = current_app.config
+    run_date = run_date or date.today()
+    grace_days = config.get('SUBSCRIPTION_GRACE_DAYS', 3) if grace_days is None else grace_days
+    pause_after_days = config.get('SUBSCRIPTION_PAUSE_AFTER_DAYS', 30) if pause_after_days is None else pause_after_days
+    reminder_days = config.get('SUBSCRIPTION_REMINDER_DAYS', 7) if reminder_days is None else reminder_days
+    chunk_size = chunk_size or config.get('SUBSCRIPTION_BILLING_CHUNK_SIZE', 5000)
+    overdue_before = run_date - timedelta(days=grace_days)
+    pause_before = run_date - timedelta(days=pause_after_days)
+    counts = {'expired': 0, 'advanced': 0, 'overdue': 0, 'cleared': 0, 'paused': 0, 'reminders': 0}
+
+    for chunk in _id_ranges(chunk_size):
+        counts['expired'] += _update(
+            chunk,
+            ClientSubscription.status.in_(ENDING_STATUSES),
+            ClientSubscription.end_date < run_date,
+            status='expired'
+        )
+        counts['advanced'] += _advance(chunk, run_date)
+        counts['overdue'] += _update(
+            chunk,
+            ClientSubscription.status == 'active',
+            ClientSubscription.overdue_since.is_(None),
+            ClientSubscription.next_billing_date < overdue_before,
+            overdue_since=ClientSubscription.next_billing_date
+        )
+        counts['cleared'] += _update(
+            chunk,
+            ClientSubscription.overdue_since.isnot(None),
+            or_(ClientSubscription.status.in_(CLOSED_STATUSES), ClientSubscription.next_billing_date >= overdue_before),
+            overdue_since=None
+        )
+        counts['paused'] += _update(
+            chunk,
+            ClientSubscription.status == 'active',
+            or_(ClientSubscription.failed_payment_count >= 3, ClientSubscription.overdue_since < pause_before),
+            status='paused'
+        )
+        counts['reminders'] += _update(
+            chunk,
+            ClientSubscription.status == 'active',
+            or_(ClientSubscription.renewal_reminder_sent.is_(False), ClientSubscription.renewal_reminder_sent.is_(None)),
+            ClientSubscription.next_billing_date >= run_date,
+            ClientSubscription.next_billing_date <= run_date + timedelta(days=reminder_days),
+            renewal_reminder_sent=True
+        )
+        db.session.commit()
+
+    if counts['reminders']:
+        deliver_alert({
+            'code': 'subscription_renewals',
+            'type': 'info',
+            'title': 'تجديد اشتراكات',
+            'message': f"{counts['reminders']} اشتراك يتجدد خلال {reminder_days} أيام",
+            'action_url': '/subscriptions',
+            'priority': 'medium'
+        }, run_date, roles=FINANCIAL_ROLES)
+        db.session.commit()
+
+    return counts
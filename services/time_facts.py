@@ -0,0 +1,267 @@
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from sqlalchemy import event, select, insert, update, delete, func, case, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+from models.timetrack import TimeTrack
+from models.timetrack_daily import TimeTrackDaily, NO_ID
+from models.employee import Employee
+from models.project import Project
+
+KEY_COLUMNS = ('date', 'employee_id', 'project_id', 'task_id')
+FACT_COLUMNS = ('billable_hours', 'non_billable_hours', 'entry_count')
+
+UPSERT_DIALECTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+# Set once the daily table is known to be filled, so readers stop checking
+_facts_ready = False
+
+
+def _facts(hours, is_billable, sign=1):
+    """Fact deltas of one entry (sign=-1 to remove it)"""
+    hours = (hours or 0) * sign
+    billable = is_billable is not False
+    return {
+        'billable_hours': hours if billable else 0,
+        'non_billable_hours': 0 if billable else hours,
+        'entry_count': sign
+    }
+
+
+def _key(date_value, employee_id, project_id, task_id):
+    return {
+        'date': date_value,
+        'employee_id': employee_id or NO_ID,
+        'project_id': project_id,
+        'task_id': task_id or NO_ID
+    }
+
+
+def _old_value(state, name):
+    """Value of an attribute before the pending flush"""
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.obj(), name)
+
+
+def _apply_delta(connection, key, facts):
+    """Add facts to the daily row of a key, creating or removing the row as needed"""
+    table = TimeTrackDaily.__table__
+    now = datetime.utcnow()
+    upsert = UPSERT_DIALECTS.get(connection.dialect.name)
+
+    if upsert is not None:
+        statement = upsert(table).values(**key, **facts, updated_at=now)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=list(KEY_COLUMNS),
+            set_={
+                **{name: table.c[name] + statement.excluded[name] for name in FACT_COLUMNS},
+                'updated_at': now
+            }
+        ))
+    else:
+        where = [table.c[name] == value for name, value in key.items()]
+        changed = connection.execute(update(table).where(*where).values(
+            **{name: table.c[name] + value for name, value in facts.items()},
+            updated_at=now
+        )).rowcount
+        if not changed:
+            connection.execute(insert(table).values(**key, **facts, updated_at=now))
+
+    if facts['entry_count'] < 0:
+        connection.execute(delete(table).where(
+            *[table.c[name] == value for name, value in key.items()],
+            table.c.entry_count <= 0
+        ))
+
+
+@event.listens_for(TimeTrack, 'after_insert')
+def _time_track_inserted(mapper, connection, target):
+    _apply_delta(
+        connection,
+        _key(target.date, target.employee_id, target.project_id, target.task_id),
+        _facts(target.hours, target.is_billable)
+    )
+
+
+@event.listens_for(TimeTrack, 'after_update')
+def _time_track_updated(mapper, connection, target):
+    state = inspect(target)
+    tracked = KEY_COLUMNS + ('hours', 'is_billable')
+    if not any(state.attrs[name].history.has_changes() for name in tracked):
+        return
+
+    # Move the entry out of its old daily row and into the new one
+    old = {name: _old_value(state, name) for name in tracked}
+    _apply_delta(
+        connection,
+        _key(old['date'], old['employee_id'], old['project_id'], old['task_id']),
+        _facts(old['hours'], old['is_billable'], sign=-1)
+    )
+    _time_track_inserted(mapper, connection, target)
+
+
+@event.listens_for(TimeTrack, 'after_delete')
+def _time_track_deleted(mapper, connection, target):
+    _apply_delta(
+        connection,
+        _key(target.date, target.employee_id, target.project_id, target.task_id),
+        _facts(target.hours, target.is_billable, sign=-1)
+    )
+
+
+def rebuild_time_facts(start_date=None, end_date=None):
+    """Recompute the daily rows of a date range (all dates by default) from time_tracks.
+
+    Needed once after the table is created and after bulk writes that bypass
+    the ORM. Returns the number of daily rows written.
+    """
+    criteria = []
+    fact_criteria = []
+    if start_date:
+        criteria.append(TimeTrack.date >= start_date)
+        fact_criteria.append(TimeTrackDaily.date >= start_date)
+    if end_date:
+        criteria.append(TimeTrack.date <= end_date)
+        fact_criteria.append(TimeTrackDaily.date <= end_date)
+
+    billable = TimeTrack.is_billable.isnot(False)
+    employee_id = func.coalesce(TimeTrack.employee_id, NO_ID)
+    task_id = func.coalesce(TimeTrack.task_id, NO_ID)
+    source = select(
+        TimeTrack.date,
+        employee_id,
+        TimeTrack.project_id,
+        task_id,
+        func.coalesce(func.sum(case((billable, TimeTrack.hours), else_=0)), 0),
+        func.coalesce(func.sum(case((billable, 0), else_=TimeTrack.hours)), 0),
+        func.count(TimeTrack.id),
+        func.max(TimeTrack.updated_at)
+    ).where(*criteria).group_by(TimeTrack.date, employee_id, TimeTrack.project_id, task_id)
+
+    db.session.execute(delete(TimeTrackDaily).where(*fact_criteria))
+    result = db.session.execute(insert(TimeTrackDaily.__table__).from_select(
+        list(KEY_COLUMNS) + list(FACT_COLUMNS) + ['updated_at'], source
+    ))
+    db.session.commit()
+    return result.rowcount
+
+
+def time_facts_missing():
+    """Whether time entries exist that the daily table has not been filled from yet"""
+    global _facts_ready
+    if _facts_ready:
+        return False
+    has_facts = db.session.execute(select(select(TimeTrackDaily.id).exists())).scalar()
+    if has_facts:
+        _facts_ready = True
+        return False
+    return db.session.execute(select(select(TimeTrack.id).exists())).scalar()
+
+
+def backfill_time_facts():
+    """Fill the daily table of a database that has time entries from before it existed.
+
+    Run by scripts/init_db.py and scripts/create_indexes.py. Returns the number
+    of daily rows written, 0 when the table was already filled or not created yet.
+    """
+    if not inspect(db.engine).has_table(TimeTrackDaily.__tablename__) or not time_facts_missing():
+        return 0
+    return rebuild_time_facts()
+
+
+def _period_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _hours_by(dimension, start_date, end_date, criteria=()):
+    """Daily totals per dimension value in a date range, one row per (value, day)"""
+    column = getattr(TimeTrackDaily, dimension)
+    return db.session.execute(
+        select(
+            column.label('key'),
+            TimeTrackDaily.date,
+            func.sum(TimeTrackDaily.billable_hours).label('billable_hours'),
+            func.sum(TimeTrackDaily.non_billable_hours).label('non_billable_hours'),
+            func.sum(TimeTrackDaily.entry_count).label('entry_count')
+        )
+        .where(TimeTrackDaily.date >= start_date, TimeTrackDaily.date <= end_date, *criteria)
+        .group_by(column, TimeTrackDaily.date)
+    ).all()
+
+
+def _rollup(rows, period):
+    """Sum daily rows into (key, period start) buckets"""
+    buckets = defaultdict(lambda: {'billable_hours': 0.0, 'non_billable_hours': 0.0, 'entry_count': 0})
+    for row in rows:
+        bucket = buckets[(row.key, _period_start(row.date, period))]
+        bucket['billable_hours'] += float(row.billable_hours or 0)
+        bucket['non_billable_hours'] += float(row.non_billable_hours or 0)
+        bucket['entry_count'] += int(row.entry_count or 0)
+    return buckets
+
+
+def _names(model, name, ids):
+    ids = [entity_id for entity_id in ids if entity_id and entity_id != NO_ID]
+    if not ids:
+        return {}
+    return dict(db.session.execute(select(model.id, name).where(model.id.in_(ids))).all())
+
+
+def get_project_hours(start_date, end_date, period='week', project_id=None):
+    """Hours per project and week (or day/month), oldest period first"""
+    criteria = [TimeTrackDaily.project_id == project_id] if project_id else []
+    buckets = _rollup(_hours_by('project_id', start_date, end_date, criteria), period)
+    names = _names(Project, Project.name, {key for key, _ in buckets})
+
+    return [{
+        'project_id': key,
+        'project_name': names.get(key),
+        'period_start': period_start.isoformat(),
+        'billable_hours': round(facts['billable_hours'], 2),
+        'non_billable_hours': round(facts['non_billable_hours'], 2),
+        'total_hours': round(facts['billable_hours'] + facts['non_billable_hours'], 2),
+        'entry_count': facts['entry_count']
+    } for (key, period_start), facts in sorted(buckets.items(), key=lambda item: (item[0][1], item[0][0]))]
+
+
+def get_monthly_hours(year, employee_id=None):
+    """Hours per employee and month of a year"""
+    criteria = [TimeTrackDaily.employee_id == employee_id] if employee_id else []
+    buckets = _rollup(_hours_by('employee_id', date(year, 1, 1), date(year, 12, 31), criteria), 'month')
+    names = _names(Employee, Employee.first_name + ' ' + Employee.last_name, {key for key, _ in buckets})
+
+    return [{
+        'employee_id': key if key != NO_ID else None,
+        'employee_name': names.get(key),
+        'month': period_start.strftime('%Y-%m'),
+        'billable_hours': round(facts['billable_hours'], 2),
+        'non_billable_hours': round(facts['non_billable_hours'], 2),
+        'total_hours': round(facts['billable_hours'] + facts['non_billable_hours'], 2),
+        'entry_count': facts['entry_count']
+    } for (key, period_start), facts in sorted(buckets.items(), key=lambda item: (item[0][1], item[0][0]))]
+
+
+def get_employee_hours(employee_id, start_date, end_date):
+    """Total hours of an employee in a date range (from time_tracks until the daily table is filled)"""
+    if time_facts_missing():
+        return db.session.execute(
+            select(func.coalesce(func.sum(TimeTrack.hours), 0))
+            .where(TimeTrack.employee_id == employee_id, TimeTrack.date >= start_date, TimeTrack.date <= end_date)
+        ).scalar() or 0
+    return db.session.execute(
+        select(func.coalesce(func.sum(TimeTrackDaily.billable_hours + TimeTrackDaily.non_billable_hours), 0))
+        .where(
+            TimeTrackDaily.employee_id == employee_id,
+            TimeTrackDaily.date >= start_date,
+            TimeTrackDaily.date <= end_date
+        )
+    ).scalar() or 0
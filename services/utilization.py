@@ -0,0 +1,157 @@
+import numpy as np
+from flask import current_app
+from sqlalchemy import select, or_, func, case, extract
+from extensions import db
+from models.employee import Employee
+from models.timetrack_daily import TimeTrackDaily
+
+INACTIVE_STATUSES = ('inactive', 'terminated')
+
+
+def _load_employees(start_date, end_date, department=None):
+    """Employees that were employed in the range or logged hours in it"""
+    logged = select(TimeTrackDaily.employee_id).where(
+        TimeTrackDaily.date >= start_date, TimeTrackDaily.date <= end_date
+    ).distinct()
+    query = select(
+        Employee.id, Employee.first_name, Employee.last_name, Employee.department,
+        Employee.employment_type, Employee.hire_date
+    ).where(or_(
+        Employee.status.notin_(INACTIVE_STATUSES) & (Employee.hire_date <= end_date),
+        Employee.id.in_(logged)
+    ))
+    if department:
+        query = query.where(Employee.department == department)
+    return db.session.execute(query.order_by(Employee.id)).all()
+
+
+def _load_hours(employee_index, start_date, end_date, weekdays, daily_hours):
+    """Logged and billable hours, days logged and overtime days per employee, aggregated in SQL.
+
+    The daily rows (projects, tasks) are first summed per employee and day,
+    then per employee, so one row per employee is read whatever the length
+    of the range. Weekdays are Python's (Monday is 0); SQL counts from Sunday.
+    """
+    size = len(employee_index)
+    daily = select(
+        TimeTrackDaily.employee_id,
+        TimeTrackDaily.date,
+        func.sum(TimeTrackDaily.billable_hours).label('billable'),
+        func.sum(TimeTrackDaily.non_billable_hours).label('non_billable')
+    ).where(
+        TimeTrackDaily.date >= start_date, TimeTrackDaily.date <= end_date
+    ).group_by(TimeTrackDaily.employee_id, TimeTrackDaily.date).subquery()
+
+    logged = daily.c.billable + daily.c.non_billable
+    per_day = case(
+        *((Employee.employment_type == employment_type, hours) for employment_type, hours in daily_hours.items()),
+        else_=daily_hours.get('full_time', 8)
+    )
+    working = extract('dow', daily.c.date).in_([(weekday + 1) % 7 for weekday in weekdays])
+    overtime = or_(working & (logged > per_day), ~working & (logged > 0))
+
+    rows = db.session.execute(
+        select(
+            daily.c.employee_id,
+            func.sum(logged),
+            func.sum(daily.c.billable),
+            func.count(case((logged > 0, 1))),
+            func.count(case((overtime, 1)))
+        ).join(Employee, Employee.id == daily.c.employee_id).group_by(daily.c.employee_id)
+    ).all()
+
+    logged_total, billable_total = np.zeros(size), np.zeros(size)
+    days_logged, overtime_days = np.zeros(size, dtype=np.int64), np.zeros(size, dtype=np.int64)
+    for employee_id, logged_hours, billable_hours, logged_days, overtime_count in rows:
+        i = employee_index.get(employee_id)
+        if i is None:
+            continue
+        logged_total[i] = logged_hours or 0
+        billable_total[i] = billable_hours or 0
+        days_logged[i] = logged_days
+        overtime_days[i] = overtime_count
+    return logged_total, billable_total, days_logged, overtime_days
+
+
+def _ratio(numerator, denominator):
+    """Element-wise percentage, 0 where the denominator is 0"""
+    return np.divide(numerator * 100, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+def compute_utilization(start_date, end_date, weekdays, daily_hours=None, department=None):
+    """Utilization of every employee in a date range.
+
+    Hours are aggregated per employee in SQL from the daily time facts.
+    Capacity is the employee's daily hours (EMPLOYMENT_DAILY_HOURS by
+    employment type) on each working day since their hire date. An overtime
+    day is a day with more hours than the daily capacity, or any hours on a
+    non-working day.
+    """
+    daily_hours = daily_hours or current_app.config['EMPLOYMENT_DAILY_HOURS']
+    employees = _load_employees(start_date, end_date, department)
+    days = (end_date - start_date).days + 1
+    if not employees or days <= 0:
+        return {'summary': _summary(0, 0, 0, 0, 0), 'employees': []}
+
+    employee_index = {employee.id: i for i, employee in enumerate(employees)}
+    logged_total, billable_total, days_logged, overtime_days = _load_hours(
+        employee_index, start_date, end_date, weekdays, daily_hours
+    )
+
+    # Working days of the range and the day each employee was hired
+    day_weekdays = (np.arange(days) + start_date.weekday()) % 7
+    working = np.isin(day_weekdays, list(weekdays))
+    hire_index = np.fromiter(
+        (min(max((employee.hire_date - start_date).days, 0), days) if employee.hire_date else 0 for employee in employees),
+        dtype=np.int64, count=len(employees)
+    )
+    # Working days from each day to the end of the range (last entry is 0)
+    working_from = np.concatenate([np.cumsum(working[::-1])[::-1], [0]])
+
+    per_day = np.fromiter(
+        (daily_hours.get(employee.employment_type, daily_hours.get('full_time', 8)) for employee in employees),
+        dtype=np.float64, count=len(employees)
+    )
+    capacity = per_day * working_from[hire_index]
+
+    utilization = _ratio(logged_total, capacity)
+    billable_utilization = _ratio(billable_total, capacity)
+    billable_share = _ratio(billable_total, logged_total)
+
+    result = [{
+        'employee_id': employee.id,
+        'employee_name': f'{employee.first_name} {employee.last_name}',
+        'department': employee.department,
+        'employment_type': employee.employment_type,
+        'capacity_hours': round(float(capacity[i]), 2),
+        'logged_hours': round(float(logged_total[i]), 2),
+        'billable_hours': round(float(billable_total[i]), 2),
+        'non_billable_hours': round(float(logged_total[i] - billable_total[i]), 2),
+        'utilization': round(float(utilization[i]), 2),
+        'billable_utilization': round(float(billable_utilization[i]), 2),
+        'billable_share': round(float(billable_share[i]), 2),
+        'days_logged': int(days_logged[i]),
+        'overtime_days': int(overtime_days[i])
+    } for i, employee in enumerate(employees)]
+    result.sort(key=lambda item: item['utilization'], reverse=True)
+
+    return {
+        'summary': _summary(
+            capacity.sum(), logged_total.sum(), billable_total.sum(),
+            int(working.sum()), int(overtime_days.sum())
+        ),
+        'employees': result
+    }
+
+
+def _summary(capacity, logged, billable, working_days, overtime_days):
+    return {
+        'working_days': working_days,
+        'capacity_hours': round(float(capacity), 2),
+        'logged_hours': round(float(logged), 2),
+        'billable_hours': round(float(billable), 2),
+        'utilization': round(float(logged) * 100 / float(capacity), 2) if capacity else 0,
+        'billable_utilization': round(float(billable) * 100 / float(capacity), 2) if capacity else 0,
+        'billable_share': round(float(billable) * 100 / float(logged), 2) if logged else 0,
+        'overtime_days': overtime_days
+    }
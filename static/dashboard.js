@@ -2,7 +2,14 @@
 
 // Cache configuration
 let cachedData = {};
+let revenueChart = null;
+let projectsChart = null;
+let eventSource = null;
+let recentActivities = [];
 const CACHE_DURATION = 5 * 60 * 1000; // 5 minutes
+const MAX_ACTIVITIES = 20;
+const STREAM_RETRY_DELAY = 5 * 60 * 1000; // Live updates unavailable, poll until then
+let streamingDisabled = false; // The server does not stream at all, stop asking
 
 // Initialize dashboard
 document.addEventListener("DOMContentLoaded", function () {
@@ -18,8 +25,9 @@ document.addEventListener("DOMContentLoaded", function () {
   document.getElementById("userName").textContent = user.email || "المستخدم";
 
   // Load dashboard data
-  loadDashboardData();
   initializeCharts();
+  loadDashboardData();
+  connectEventStream();
 
   // Setup logout handler
   document.querySelector(".btn-logout").addEventListener("click", logout);
@@ -42,31 +50,13 @@ async function loadDashboardData() {
   try {
     showLoadingState();
 
-    // Load data in parallel for better performance using correct API endpoints
-    const [projectsRes, employeesRes, tasksRes, clientsRes] = await Promise.all(
-      [
-        fetch("/api/v1/projects/", {
-          headers: { Authorization: `Bearer ${token}` },
-        }),
-        fetch("/api/v1/employees/", {
-          headers: { Authorization: `Bearer ${token}` },
-        }),
-        fetch("/api/v1/tasks/", {
-          headers: { Authorization: `Bearer ${token}` },
-        }),
-        fetch("/api/v1/clients/", {
-          headers: { Authorization: `Bearer ${token}` },
-        }),
-      ]
-    );
+    // One precomputed summary instead of downloading every table
+    const response = await fetch("/api/v1/dashboard/summary", {
+      headers: { Authorization: `Bearer ${token}` },
+    });
 
     // Check for unauthorized access
-    if (
-      projectsRes.status === 401 ||
-      employeesRes.status === 401 ||
-      tasksRes.status === 401 ||
-      clientsRes.status === 401
-    ) {
+    if (response.status === 401) {
       // Token expired or invalid, try to refresh
       const refreshed = await refreshToken();
       if (refreshed) {
@@ -80,39 +70,23 @@ async function loadDashboardData() {
       }
     }
 
-    // Process responses with better error handling
-    const results = await Promise.all([
-      projectsRes.ok ? projectsRes.json().catch(() => []) : [],
-      employeesRes.ok ? employeesRes.json().catch(() => []) : [],
-      tasksRes.ok ? tasksRes.json().catch(() => []) : [],
-      clientsRes.ok ? clientsRes.json().catch(() => []) : [],
-    ]);
-
-    const [projects, employees, tasks, clients] = results;
-
-    // Ensure arrays and handle different response formats
-    const projectsArray = Array.isArray(projects)
-      ? projects
-      : projects?.projects || [];
-    const employeesArray = Array.isArray(employees)
-      ? employees
-      : employees?.employees || [];
-    const tasksArray = Array.isArray(tasks) ? tasks : tasks?.tasks || [];
-    const clientsArray = Array.isArray(clients)
-      ? clients
-      : clients?.clients || [];
+    const data = response.ok ? await response.json().catch(() => ({})) : {};
+    const summary = data.summary || {};
+    const counts = summary.counts || {};
 
     // Cache data
     cachedData = {
-      projects: projectsArray.length,
-      employees: employeesArray.length,
-      tasks: tasksArray.filter((task) => task && task.status !== "completed")
-        .length,
-      clients: clientsArray.length,
+      projects: counts.projects || 0,
+      employees: counts.employees || 0,
+      tasks: counts.tasks || 0,
+      clients: counts.clients || 0,
       timestamp: now,
     };
 
     updateCountsFromCache();
+    recentActivities = summary.activities || [];
+    updateActivities(recentActivities);
+    updateCharts(summary);
   } catch (error) {
     console.error("Error loading dashboard data:", error);
     hideLoadingState();
@@ -128,6 +102,86 @@ async function loadDashboardData() {
   }
 }
 
+// Short-lived token that only opens the event stream (EventSource cannot send headers)
+async function fetchStreamToken(retry = true) {
+  const token = localStorage.getItem("access_token");
+  if (!token) return null;
+
+  try {
+    const response = await fetch("/api/v1/dashboard/stream-token", {
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    if (response.status === 401 && retry && (await refreshToken())) {
+      return fetchStreamToken(false);
+    }
+    const data = await response.json().catch(() => ({}));
+    // 503: no free stream on the server, the dashboard keeps polling
+    if (!response.ok) {
+      if (data.streaming_enabled === false) streamingDisabled = true;
+      return null;
+    }
+    return data.token;
+  } catch (error) {
+    console.error("Error getting stream token:", error);
+    return null;
+  }
+}
+
+// Live updates pushed by the server instead of polling
+async function connectEventStream() {
+  if (!window.EventSource || streamingDisabled) return;
+
+  const streamToken = await fetchStreamToken();
+  if (!streamToken) {
+    // Streaming is turned off on the server: poll for the page's lifetime
+    if (!streamingDisabled) setTimeout(connectEventStream, STREAM_RETRY_DELAY);
+    return;
+  }
+
+  eventSource = new EventSource(
+    `/api/v1/dashboard/stream?token=${encodeURIComponent(streamToken)}`
+  );
+
+  // The stream token expired, reconnect with a new one
+  eventSource.addEventListener("expired", () => {
+    eventSource.close();
+    eventSource = null;
+    connectEventStream();
+  });
+
+  eventSource.addEventListener("counts", (event) => {
+    const delta = JSON.parse(event.data).delta || {};
+    ["projects", "employees", "tasks", "clients"].forEach((key) => {
+      if (delta[key]) {
+        cachedData[key] = Math.max(0, (cachedData[key] || 0) + delta[key]);
+      }
+    });
+    updateCounts(cachedData);
+  });
+
+  eventSource.addEventListener("activity", (event) => {
+    const activity = JSON.parse(event.data).activity;
+    recentActivities = [activity, ...recentActivities].slice(0, MAX_ACTIVITIES);
+    updateActivities(recentActivities);
+  });
+
+  eventSource.addEventListener("notifications", () => {
+    // The inbox changed, summary alerts may be stale
+    cachedData.timestamp = 0;
+  });
+
+  eventSource.onerror = () => {
+    // The browser reconnects by itself unless the server rejected the stream
+    if (eventSource.readyState !== EventSource.CLOSED) return;
+    eventSource = null;
+    setTimeout(connectEventStream, 5000);
+  };
+}
+
+function isEventStreamOpen() {
+  return eventSource && eventSource.readyState === EventSource.OPEN;
+}
+
 // Token refresh function
 async function refreshToken() {
   const refreshToken = localStorage.getItem("refresh_token");
@@ -210,7 +264,7 @@ function updateCount(elementId, value) {
 function initializeCharts() {
   // Revenue Chart
   const revenueCtx = document.getElementById("revenueChart").getContext("2d");
-  new Chart(revenueCtx, {
+  revenueChart = new Chart(revenueCtx, {
     type: "line",
     data: {
       labels: ["يناير", "فبراير", "مارس", "أبريل", "مايو", "يونيو"],
@@ -242,7 +296,7 @@ function initializeCharts() {
 
   // Projects Chart
   const projectsCtx = document.getElementById("projectsChart").getContext("2d");
-  new Chart(projectsCtx, {
+  projectsChart = new Chart(projectsCtx, {
     type: "doughnut",
     data: {
       labels: ["نشط", "مكتمل", "متوقف"],
@@ -265,6 +319,27 @@ function initializeCharts() {
   });
 }
 
+// Update charts from the dashboard summary
+function updateCharts(summary) {
+  if (revenueChart && summary.monthly_revenue) {
+    revenueChart.data.labels = summary.monthly_revenue.map((item) => item.month);
+    revenueChart.data.datasets[0].data = summary.monthly_revenue.map(
+      (item) => item.amount
+    );
+    revenueChart.update();
+  }
+
+  if (projectsChart && summary.project_status) {
+    const status = summary.project_status;
+    projectsChart.data.datasets[0].data = [
+      status.active || 0,
+      status.completed || 0,
+      status.on_hold || 0,
+    ];
+    projectsChart.update();
+  }
+}
+
 // Update counts
 function updateCounts(counts) {
   document.getElementById("projectsCount").textContent = counts.projects || 0;
@@ -341,15 +416,18 @@ function formatDate(timestamp) {
 
 // Logout function
 function logout() {
+  if (eventSource) {
+    eventSource.close();
+  }
   localStorage.removeItem("access_token");
   localStorage.removeItem("refresh_token");
   localStorage.removeItem("user");
   window.location.href = "/login";
 }
 
-// Auto-refresh every 5 minutes (only when tab is visible)
+// Auto-refresh every 5 minutes (only when tab is visible and not receiving live updates)
 setInterval(() => {
-  if (document.visibilityState === "visible") {
+  if (document.visibilityState === "visible" && !isEventStreamOpen()) {
     cachedData.timestamp = 0; // Force refresh
     loadDashboardData();
   }